@@ -0,0 +1,206 @@
+"""
+Mock LLM Server
+
+A local, OpenAI/Groq-compatible chat completions endpoint for benchmarking the
+pipeline without spending API quota. Responses are generated from the JSON
+schema of the tool (or response format) in the request, so instructor can
+validate them like real model output. Latency, error rate and 429 behaviour
+are configurable.
+"""
+
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+def fake_value(schema: dict, defs: dict, rng: random.Random):
+    """Generate a value that satisfies a (pydantic-style) JSON schema."""
+    if "$ref" in schema:
+        return fake_value(defs[schema["$ref"].split("/")[-1]], defs, rng)
+    for combinator in ("allOf", "anyOf", "oneOf"):
+        if combinator in schema:
+            return fake_value(schema[combinator][0], defs, rng)
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fake_value(prop, defs, rng) for name, prop in schema.get("properties", {}).items()}
+    if kind == "integer":
+        return rng.randint(int(schema.get("minimum", 1)), int(schema.get("maximum", 10)))
+    if kind == "number":
+        return round(rng.uniform(schema.get("minimum", 0), schema.get("maximum", 10)), 1)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "array":
+        return [fake_value(schema.get("items", {}), defs, rng)]
+    if kind == "string":
+        return "synthetic review"
+    return None
+
+
+class MockLLMServer:
+    """
+    Threaded HTTP server answering POST .../chat/completions.
+
+    Args:
+        latency (float): Mean simulated model latency in seconds.
+        jitter (float): Uniform +/- jitter added to the latency.
+        error_rate (float): Probability of answering with a 500.
+        throttle_rate (float): Probability of answering with a 429 regardless of load.
+        requests_per_minute (int): Sliding-window quota; requests above it get a 429.
+        retry_after (float): Retry-After header sent with 429s.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, jitter: float = 0.2,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, requests_per_minute: int = None,
+                 retry_after: float = 1.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _admit(self) -> tuple:
+        """Decide a request's outcome ('ok', 'error' or 'throttled'), latency and response seed."""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self.window and now - self.window[0] > 60:
+                self.window.popleft()
+            roll = self.rng.random()
+            if self.requests_per_minute and len(self.window) >= self.requests_per_minute:
+                outcome = "throttled"
+            elif roll < self.throttle_rate:
+                outcome = "throttled"
+            elif roll < self.throttle_rate + self.error_rate:
+                outcome = "error"
+            else:
+                self.window.append(now)
+                outcome = "ok"
+            self.stats[{"ok": "ok", "error": "errors", "throttled": "throttled"}[outcome]] += 1
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            seed = self.rng.random()
+        return outcome, delay, seed
+
+    def _completion(self, body: dict, seed: float) -> dict:
+        rng = random.Random(seed)
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4
+        message = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+        if body.get("tools"):
+            function = body["tools"][0]["function"]
+            schema = function.get("parameters", {})
+            arguments = json.dumps(fake_value(schema, schema.get("$defs", {}), rng))
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": arguments},
+            }]
+            finish_reason = "tool_calls"
+            completion = arguments
+        else:
+            schema = (body.get("response_format") or {}).get("schema", {})
+            completion = json.dumps(fake_value(schema, schema.get("$defs", {}), rng)) if schema else "{}"
+            message["content"] = completion
+        completion_tokens = len(completion) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+                outcome, delay, seed = server._admit()
+                if outcome == "throttled":
+                    return self._send(429, {"error": {"message": "rate limit exceeded", "type": "tokens"}},
+                                      {"retry-after": str(server.retry_after)})
+                time.sleep(delay)
+                if outcome == "error":
+                    return self._send(500, {"error": {"message": "internal error"}})
+                self._send(200, server._completion(body, seed))
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Mock LLM server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI/Groq-compatible LLM server.")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    server = MockLLMServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           throttle_rate=args.throttle_rate, requests_per_minute=args.rpm)
+    server.start()
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,239 @@
+"""
+Pipeline Benchmark
+
+Runs the chunk -> review -> aggregate pipeline and presentation screening over
+synthetic submissions against a local mock LLM server, and reports throughput,
+request latency percentiles and peak memory (RSS) per stage.
+
+Example:
+    python benchmarks/run_benchmark.py --repos 20 --files 30 --latency 0.4 --rpm 600
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # no rusage outside Unix; peak memory is then only reported with --tracemalloc
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT / "src", ROOT / "src" / "code_review", ROOT / "src" / "presentation_screening", ROOT / "benchmarks"):
+    sys.path.insert(0, str(path))
+
+from llm_client import LLMClient
+from mock_llm_server import MockLLMServer
+from synthetic import generate_repos, generate_presentations
+
+logger = logging.getLogger(__name__)
+
+
+class TimedLLMClient(LLMClient):
+    """LLMClient that records the wall-clock latency of every request."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self.failures = 0
+
+    def _record(self, started, failed):
+        self.latencies.append(time.perf_counter() - started)
+        self.failures += failed
+
+    def create(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = super().create(*args, **kwargs)
+        except Exception:
+            self._record(started, 1)
+            raise
+        self._record(started, 0)
+        return result
+
+    async def acreate(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await super().acreate(*args, **kwargs)
+        except Exception:
+            self._record(started, 1)
+            raise
+        self._record(started, 0)
+        return result
+
+    def reset(self):
+        self.latencies = []
+        self.failures = 0
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb(who):
+    """High-water resident set size since start, of this process or of its largest reaped child."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+@contextmanager
+def measure(report, stage, client=None, trace_heap=False):
+    """
+    Record wall time and peak memory for a stage, plus request latencies if a client is given.
+
+    Memory is the peak RSS of this process and of the pool and parse workers it
+    has reaped. Both are high-water marks, so a stage also reports the peaks of
+    the stages before it. trace_heap adds the stage's own peak Python heap, at
+    the cost of slowing the stage down.
+    """
+    if client is not None:
+        client.reset()
+    if trace_heap:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = {}
+    try:
+        yield result
+    finally:
+        elapsed = time.perf_counter() - started
+        items = result.get("items", 0)
+        entry = {
+            "wall_time_s": round(elapsed, 3),
+            "items": items,
+            "throughput_per_s": round(items / elapsed, 3) if elapsed > 0 else None,
+            "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+            "peak_worker_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        }
+        if trace_heap:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            entry["peak_heap_mb"] = round(peak / (1024 * 1024), 2)
+        if client is not None:
+            latencies = [latency * 1000 for latency in client.latencies]
+            entry["requests"] = len(latencies)
+            entry["failed_requests"] = client.failures
+            entry["latency_ms"] = {f"p{q}": round(percentile(latencies, q), 1) if latencies else None for q in (50, 95, 99)}
+        report[stage] = entry
+        logger.info(f"{stage}: {entry}")
+
+
+def count_chunks(repos_root):
+    from chunk_store import ChunkStore
+
+    total = 0
+    for repo_path in Path(repos_root).iterdir():
+        chunk_folder = repo_path / "chunk_data"
+        if ChunkStore.exists(chunk_folder):
+            with ChunkStore(chunk_folder) as store:
+                total += len(store)
+    return total
+
+
+def run(args):
+    from chunker import ChunkExtractor
+    from code_analyser import CodeAnalyser
+    from cascade import CascadePolicy
+
+    report = {"config": vars(args)}
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="hackathon-bench-"))
+    repos_root = workdir / "cloned_repos"
+    decks_root = workdir / "team_presentations"
+
+    with measure(report, "generate", trace_heap=args.tracemalloc) as result:
+        language_mix = {ext: float(weight) for ext, weight in (item.split(":") for item in args.languages.split(","))}
+        generate_repos(repos_root, args.repos, args.files, args.lines, language_mix)
+        result["items"] = args.repos * args.files
+        if args.decks:
+            generate_presentations(decks_root, args.decks, args.slides)
+
+    with MockLLMServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       throttle_rate=args.throttle_rate, requests_per_minute=args.rpm) as server:
+        client = TimedLLMClient(api_key="mock", base_url=server.base_url, max_retries=0)
+
+        extractor = ChunkExtractor(token_budget=args.token_budget)
+        with measure(report, "chunk", trace_heap=args.tracemalloc) as result:
+            if args.parallel_chunking:
+                extractor.processReposParallel(repos_root)
+            else:
+                extractor.processRepos(repos_root)
+            result["items"] = count_chunks(repos_root)
+
+        analyser = CodeAnalyser(llm=client, weighting=args.weighting, cascade=CascadePolicy() if args.cascade else None,
+                                static_metrics=args.static_metrics)
+        with measure(report, "review", client, trace_heap=args.tracemalloc) as result:
+            analyser.processReposAsync(repos_root, concurrency=args.concurrency,
+                                       requests_per_minute=args.client_rpm, tokens_per_minute=args.client_tpm)
+            result["items"] = count_chunks(repos_root)
+        if args.cascade:
+            report["cascade"] = analyser.cascadeStats.report()
+
+        with measure(report, "aggregate", trace_heap=args.tracemalloc) as result:
+            for repo_path in repos_root.iterdir():
+                if repo_path.is_dir():
+                    analyser.finalScores(str(repo_path))
+            result["items"] = args.repos
+
+        if args.decks:
+            from evaluate_pitch import PresentationAnalyser
+
+            presentation_analyser = PresentationAnalyser(llm=client)
+            with measure(report, "presentations", client, trace_heap=args.tracemalloc) as result:
+                presentation_analyser.processPresentationsAsync(str(decks_root), concurrency=args.concurrency,
+                                                                requests_per_minute=args.client_rpm,
+                                                                tokens_per_minute=args.client_tpm)
+                result["items"] = args.decks
+
+        report["mock_server"] = dict(server.stats)
+
+    output = Path(args.output) if args.output else workdir / "benchmark_report.json"
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    logger.info(f"Benchmark report saved to: {output}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation pipeline against a mock LLM server.")
+    parser.add_argument("--workdir", help="Where to generate submissions (default: a new temp dir)")
+    parser.add_argument("--output", help="Where to write the JSON report")
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--files", type=int, default=20, help="Files per repo")
+    parser.add_argument("--lines", type=int, default=150, help="Lines per file")
+    parser.add_argument("--languages", default="py:2,js:1,java:1", help="Extension:weight pairs")
+    parser.add_argument("--decks", type=int, default=0, help="Number of pitch decks to screen")
+    parser.add_argument("--slides", type=int, default=12)
+    parser.add_argument("--parallel-chunking", action="store_true")
+    parser.add_argument("--token-budget", type=int, default=None, help="Pack and split chunks to this many tokens")
+    parser.add_argument("--cascade", action="store_true", help="Triage chunks with the small model first")
+    parser.add_argument("--static-metrics", action="store_true", help="Score deterministic categories from static analysis")
+    parser.add_argument("--weighting", default="chunk", choices=["chunk", "lines", "tokens"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--client-rpm", type=float, default=600, help="Client-side requests/minute budget")
+    parser.add_argument("--client-tpm", type=float, default=1_000_000, help="Client-side tokens/minute budget")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=None, help="Mock server requests/minute quota")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Also trace each stage's peak Python heap; slows allocation-heavy stages down")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    run(parse_args())
@@ -0,0 +1,128 @@
+"""
+Synthetic Submissions
+
+Generates fake team repositories and pitch decks of configurable size and
+language mix for benchmarking.
+"""
+
+import random
+from pathlib import Path
+
+LANGUAGE_TEMPLATES = {
+    "py": (
+        "def {name}(items, threshold={n}):\n"
+        "    \"\"\"Filter and score items for {name}.\"\"\"\n"
+        "    result = []\n"
+        "    for index, item in enumerate(items):\n"
+        "        if item > threshold:\n"
+        "            result.append(item * index)\n"
+        "    return result\n\n"
+    ),
+    "js": (
+        "function {name}(items, threshold = {n}) {{\n"
+        "  // filter and score items for {name}\n"
+        "  const result = [];\n"
+        "  items.forEach((item, index) => {{\n"
+        "    if (item > threshold) result.push(item * index);\n"
+        "  }});\n"
+        "  return result;\n"
+        "}}\n\n"
+    ),
+    "java": (
+        "    public static int {name}(int[] items) {{\n"
+        "        // sum items above {n}\n"
+        "        int total = 0;\n"
+        "        for (int item : items) {{\n"
+        "            if (item > {n}) total += item;\n"
+        "        }}\n"
+        "        return total;\n"
+        "    }}\n\n"
+    ),
+}
+
+
+def _source_file(language: str, lines: int, rng: random.Random) -> str:
+    template = LANGUAGE_TEMPLATES[language]
+    body = []
+    while sum(part.count("\n") for part in body) < lines:
+        body.append(template.format(name=f"step_{rng.randrange(1 << 30):x}", n=rng.randint(0, 100)))
+    if language == "java":
+        return "public class Generated {\n" + "".join(body) + "}\n"
+    return "".join(body)
+
+
+def generate_repos(root, repos: int = 10, files_per_repo: int = 20, lines_per_file: int = 150,
+                   language_mix: dict = None, seed: int = 0):
+    """
+    Write `repos` directories of source files under root.
+
+    Args:
+        language_mix (dict): Extension -> relative weight, e.g. {"py": 3, "js": 1}.
+    """
+    rng = random.Random(seed)
+    language_mix = language_mix or {"py": 2, "js": 1, "java": 1}
+    extensions, weights = zip(*language_mix.items())
+    root = Path(root)
+    for repo_index in range(repos):
+        repo_path = root / f"team_{repo_index:03d}"
+        for file_index in range(files_per_repo):
+            extension = rng.choices(extensions, weights)[0]
+            file_path = repo_path / f"pkg_{file_index % 5}" / f"module_{file_index}.{extension}"
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(_source_file(extension, lines_per_file, rng), encoding="utf-8")
+    return root
+
+
+def _pdf(pages) -> bytes:
+    """Build a minimal PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 14 Tf 72 720 Td ({escaped}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return output
+
+
+def generate_presentations(root, teams: int = 10, slides: int = 12, formats=("pptx", "pdf"), seed: int = 0):
+    """Write one pitch deck per team directory under root, alternating formats."""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    rng = random.Random(seed)
+    root = Path(root)
+    for team_index in range(teams):
+        team_path = root / f"team_{team_index:03d}"
+        team_path.mkdir(parents=True, exist_ok=True)
+        texts = [
+            f"Slide {i + 1}: AI for sustainable cities, reducing emissions by {rng.randint(5, 60)}% "
+            f"with model variant {rng.randrange(1 << 16):x}"
+            for i in range(slides)
+        ]
+        fmt = formats[team_index % len(formats)]
+        if fmt == "pdf":
+            (team_path / "pitch.pdf").write_bytes(_pdf(texts))
+        else:
+            deck = Presentation()
+            for text in texts:
+                slide = deck.slides.add_slide(deck.slide_layouts[5])
+                slide.shapes.title.text = text.split(":")[0]
+                box = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(8), Inches(3))
+                box.text_frame.text = text
+            deck.save(team_path / "pitch.pptx")
+    return root
@@ -0,0 +1,128 @@
+import re
+import json
+import fnmatch
+import hashlib
+from collections import Counter
+from chunk_packer import entry_sources
+from sampling import BRANCHES
+from score_aggregator import ScoreAggregator
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+
+# config, lock, generated and vendored files are never worth the large model
+ALWAYS_SMALL = (
+    "*.json", "*.yaml", "*.yml", "*.toml", "*.ini", "*.cfg", "*.xml", "*.lock", "*.min.js", "*.min.css",
+    "*.pb.go", "*_pb2.py", "*.g.dart", "*.generated.*", "*/migrations/*", "migrations/*",
+)
+GENERATED_MARKER = re.compile(r"(?i)(auto-?generated|generated by|do not edit)")
+
+
+class CascadePolicy:
+    """
+    Routes each chunk to a small model first and escalates it to the large model
+    only when the small model's review is close to a decision threshold,
+    internally inconsistent, or rates the code as complex. Chunks that are
+    plainly complex before review skip the small model.
+    """
+
+    def __init__(self, small_model: str = SMALL_MODEL, thresholds=(5.0,), band: float = 0.75,
+                 max_spread: int = 5, escalate_complexity: int = 8, max_branches: int = 40,
+                 max_small_tokens: int = 3000, always_small=ALWAYS_SMALL, always_large=()):
+        """
+        Args:
+            thresholds: Mean scores the judges cut at; a small-model mean within
+                band of one of them is escalated.
+            max_spread (int): Escalate when the small model's category scores span
+                at least this many points, a sign it could not make up its mind.
+            escalate_complexity (int): Escalate when the small model scores
+                complexity_score or technical_complexity at least this high.
+            max_branches (int): Chunks with this many branches go straight to the large model.
+            max_small_tokens (int): Chunks estimated above this many tokens go
+                straight to the large model.
+            always_small: Path globs reviewed by the small model only.
+            always_large: Path globs reviewed by the large model only.
+        """
+        self.small_model = small_model
+        self.thresholds = tuple(thresholds)
+        self.band = band
+        self.max_spread = max_spread
+        self.escalate_complexity = escalate_complexity
+        self.max_branches = max_branches
+        self.max_small_tokens = max_small_tokens
+        self.always_small = tuple(always_small)
+        self.always_large = tuple(always_large)
+
+    def fingerprint(self) -> str:
+        """Changes whenever a setting that decides which model reviews a chunk changes."""
+        return hashlib.sha256(json.dumps(vars(self), sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def matches(entry, patterns) -> bool:
+        return bool(patterns) and all(
+            any(fnmatch.fnmatch(source, pattern) for pattern in patterns) for source in entry_sources(entry)
+        )
+
+    def route(self, entry, code: str, tokens: int):
+        """
+        Returns:
+            tuple: (route, reason). route is "small" (small model only), "large"
+                (large model only) or "triage" (small model, escalated if needed).
+        """
+        if entry is not None and self.matches(entry, self.always_large):
+            return "large", "always_large"
+        if entry is not None and self.matches(entry, self.always_small):
+            return "small", "always_small"
+        if GENERATED_MARKER.search(code[:1000]):
+            return "small", "generated"
+        if tokens > self.max_small_tokens:
+            return "large", "long"
+        if len(BRANCHES.findall(code)) >= self.max_branches:
+            return "large", "complex"
+        return "triage", None
+
+    def escalation(self, review):
+        """Why the small model's review needs a second opinion, or None to keep it."""
+        scores = ScoreAggregator.extract_scores(review)
+        if not scores:
+            return "ambiguous"
+        mean = sum(scores.values()) / len(scores)
+        if any(abs(mean - threshold) <= self.band for threshold in self.thresholds):
+            return "near_threshold"
+        if max(scores.values()) - min(scores.values()) >= self.max_spread:
+            return "ambiguous"
+        if max(scores.get("complexity_score", 0), scores.get("technical_complexity", 0)) >= self.escalate_complexity:
+            return "complex"
+        return None
+
+
+class CascadeStats:
+    """Per-run counts of how chunks were routed and what the cascade saved."""
+
+    def __init__(self):
+        self.routes = Counter()
+        self.escalations = Counter()
+        self.tokens = Counter()
+        self.tokens_saved = 0
+        self.cost_saved = 0.0
+
+    def record(self, route: str, reason, escalation, tokens_by_model: dict, tokens_saved: int, cost_saved: float):
+        self.routes[route] += 1
+        if reason is not None:
+            self.routes[f"{route}:{reason}"] += 1
+        if escalation is not None:
+            self.escalations[escalation] += 1
+        self.tokens.update(tokens_by_model)
+        self.tokens_saved += tokens_saved
+        self.cost_saved += cost_saved
+
+    def report(self) -> dict:
+        triaged = self.routes["triage"]
+        escalated = sum(self.escalations.values())
+        return {
+            "routes": dict(self.routes),
+            "escalations": dict(self.escalations),
+            "escalation_rate": round(escalated / triaged, 4) if triaged else None,
+            "estimated_tokens_by_model": dict(self.tokens),
+            "estimated_large_model_tokens_saved": self.tokens_saved,
+            "estimated_cost_saved_usd": round(self.cost_saved, 6),
+        }
@@ -0,0 +1,69 @@
+import posixpath
+import tiktoken
+
+# close enough to the Llama tokenizers for budgeting; only relative sizes matter
+TOKEN_ENCODING = "cl100k_base"
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def entry_sources(entry: dict) -> set:
+    """Every file a chunk store entry covers, including the other files of a packed chunk."""
+    if "parts" in entry:
+        return {source for source, _, _ in entry["parts"]}
+    return {entry["source"]}
+
+
+class ChunkPacker:
+    """
+    Wraps a ChunkStoreWriter and packs consecutive small chunks from the same
+    directory into one chunk of up to target_tokens, so each review request
+    carries more code per copy of the system prompt.
+
+    A packed chunk takes the id, source and lines of its first piece and records
+    every piece as [source, start_line, end_line] in "parts".
+    """
+
+    def __init__(self, writer, target_tokens: int):
+        self.writer = writer
+        self.target_tokens = target_tokens
+        self.pending = []
+        self.pending_tokens = 0
+        self.directory = None
+
+    def append(self, chunk_id: int, text: str, source: str, language: str, start_line: int, end_line: int):
+        tokens = count_tokens(text)
+        directory = posixpath.dirname(source)
+        if self.pending and (directory != self.directory or self.pending_tokens + tokens > self.target_tokens):
+            self.flush()
+        self.pending.append((chunk_id, text, source, language, start_line, end_line))
+        self.pending_tokens += tokens
+        self.directory = directory
+
+    def flush(self):
+        if not self.pending:
+            return
+        if len(self.pending) == 1:
+            self.writer.append(*self.pending[0])
+        else:
+            chunk_id, _, source, language, start_line, end_line = self.pending[0]
+            self.writer.append(
+                chunk_id, "\n\n".join(piece[1] for piece in self.pending), source, language, start_line, end_line,
+                parts=[[piece[2], piece[4], piece[5]] for piece in self.pending],
+            )
+        self.pending = []
+        self.pending_tokens = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,166 @@
+import os
+import json
+import mmap
+import hashlib
+import logging
+from pathlib import Path
+
+RECORDS_FILE = "chunks.bin"
+INDEX_FILE = "chunks.idx"
+STATE_FILE = "state.json"
+STAGING_SUFFIX = ".tmp"
+
+
+def load_state(chunk_folder) -> dict:
+    state_path = Path(chunk_folder) / STATE_FILE
+    if not state_path.is_file():
+        return {}
+    return json.loads(state_path.read_text(encoding="utf-8"))
+
+
+def save_state(chunk_folder, state: dict):
+    Path(chunk_folder, STATE_FILE).write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+
+class ChunkStoreWriter:
+    """
+    Writes a repo's chunks to a single append-only record file plus a JSON-lines
+    index of (id, offset, length, hash, source, language, start_line, end_line),
+    plus the (source, start_line, end_line) parts of chunks packed from several files.
+
+    With staging=True the store is written next to the live one and only swapped
+    in on a clean close, so the previous store stays readable while it is rebuilt.
+    """
+
+    def __init__(self, chunk_folder, append: bool = False, staging: bool = False):
+        self.chunk_folder = Path(chunk_folder)
+        self.chunk_folder.mkdir(parents=True, exist_ok=True)
+        self.staging = staging and not append
+        suffix = STAGING_SUFFIX if self.staging else ""
+        mode = "ab" if append else "wb"
+        self.records = open(self.chunk_folder / (RECORDS_FILE + suffix), mode)
+        self.index = open(self.chunk_folder / (INDEX_FILE + suffix), mode)
+        self.offset = self.records.tell()
+
+    def append(self, chunk_id: int, text: str, source: str, language: str, start_line: int, end_line: int,
+               parts: list = None):
+        data = text.encode("utf-8")
+        self.records.write(data)
+        entry = {
+            "id": chunk_id,
+            "offset": self.offset,
+            "length": len(data),
+            "hash": hashlib.sha256(data).hexdigest(),
+            "source": source,
+            "language": language,
+            "start_line": start_line,
+            "end_line": end_line,
+        }
+        if parts:
+            entry["parts"] = parts
+        self.index.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self.offset += len(data)
+        return entry
+
+    def close(self):
+        self.records.close()
+        self.index.close()
+        if self.staging:
+            os.replace(self.chunk_folder / (RECORDS_FILE + STAGING_SUFFIX), self.chunk_folder / RECORDS_FILE)
+            os.replace(self.chunk_folder / (INDEX_FILE + STAGING_SUFFIX), self.chunk_folder / INDEX_FILE)
+
+    def abort(self):
+        self.records.close()
+        self.index.close()
+        if self.staging:
+            for name in (RECORDS_FILE, INDEX_FILE):
+                (self.chunk_folder / (name + STAGING_SUFFIX)).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChunkStore:
+    """
+    Read side of a repo's chunk store. Records are memory-mapped so chunks can be
+    read at random or streamed in order without holding them all in memory.
+
+    The index is only parsed when entries are listed or looked up; a reader that
+    already holds an entry from the same version of the store reads it directly.
+    """
+
+    def __init__(self, chunk_folder):
+        self.logger = logging.getLogger(__name__)
+        self.chunk_folder = Path(chunk_folder)
+        # the open handles keep reading this version of the store if it is swapped out meanwhile
+        self.index = open(self.chunk_folder / INDEX_FILE, "r", encoding="utf-8")
+        stat = os.fstat(self.index.fileno())
+        # changes whenever a writer replaces or rewrites the index
+        self.version = [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+        self._entries = None
+        self._ids = None
+        self.file = open(self.chunk_folder / RECORDS_FILE, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        # mmap refuses empty files
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    @property
+    def entries(self) -> list:
+        if self._entries is None:
+            self._entries = [json.loads(line) for line in self.index if line.strip()]
+            self.index.close()
+        return self._entries
+
+    def find(self, chunk_id: int, entry: dict = None, version=None):
+        """
+        The entry with chunk_id, or None. An entry read from this store at the
+        given version is returned as is, without parsing the index, as long as
+        the records still hold its bytes.
+        """
+        if entry is not None and version == self.version and self.holds(entry):
+            return entry
+        if self._ids is None:
+            self._ids = {entry["id"]: entry for entry in self.entries}
+        return self._ids.get(chunk_id)
+
+    def holds(self, entry: dict) -> bool:
+        start, end = entry["offset"], entry["offset"] + entry["length"]
+        if end > (len(self.mm) if self.mm is not None else 0):
+            return entry["length"] == 0 and entry["hash"] == hashlib.sha256(b"").hexdigest()
+        return hashlib.sha256(self.mm[start:end]).hexdigest() == entry["hash"]
+
+    @staticmethod
+    def exists(chunk_folder) -> bool:
+        chunk_folder = Path(chunk_folder)
+        return (chunk_folder / INDEX_FILE).is_file() and (chunk_folder / RECORDS_FILE).is_file()
+
+    def read(self, entry: dict) -> str:
+        start = entry["offset"]
+        return self.mm[start:start + entry["length"]].decode("utf-8")
+
+    def get(self, position: int) -> str:
+        return self.read(self.entries[position])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
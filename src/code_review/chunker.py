@@ -2,17 +2,120 @@ import os
 import json
 import logging
 from pathlib import Path
+from itertools import islice
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import pygit2
+from llama_index.core import Document
 from llama_index.core.node_parser import CodeSplitter
+from llama_index.core.schema import MetadataMode
 from llama_index.readers.file import FlatReader
 import languages
+from chunk_store import ChunkStore, ChunkStoreWriter, load_state, save_state
+from chunk_packer import ChunkPacker, count_tokens, entry_sources
+from git_handler import GitHandler
+from prefilter import Prefilter
+from similarity import SimilarityIndex
+from static_metrics import METRICS_FILE, file_metrics, load_metrics, save_metrics
+from telemetry import Telemetry, get_telemetry
+
+# one warmed splitter (and tree-sitter parser) per language and size, per process
+_splitters = {}
+# object database of the repo being chunked, released once the repo is done or
+# a pool worker moves on to the next repo, so at most one is held per process
+_repositories = {}
+
+# first guess at the character size of a token budget; chunks still over budget are split again
+CHARS_PER_TOKEN = 4
+MIN_SPLIT_CHARS = 256
+
+def getSplitter(language, max_chars=100000):
+    splitter = _splitters.get((language, max_chars))
+    if splitter is None:
+        splitter = CodeSplitter(chunk_lines=100, language=language, max_chars=max_chars)
+        _splitters[(language, max_chars)] = splitter
+    return splitter
+
+def loadDocuments(file_path, repo_path=None, blob_id=None):
+    if blob_id is None:
+        return FlatReader().load_data(Path(file_path))
+    # object-only clone: read the blob straight from the object database
+    repo = _repositories.get(str(repo_path))
+    if repo is None:
+        # pool workers never see a repo finish, so the previous one is released here
+        for previous in list(_repositories):
+            releaseRepository(previous)
+        repo = pygit2.Repository(str(repo_path))
+        _repositories[str(repo_path)] = repo
+    file_path = Path(file_path)
+    text = repo[blob_id].data.decode("utf-8")
+    return [Document(text=text, metadata={"filename": file_path.name, "extension": file_path.suffix})]
+
+def releaseRepository(repo_path):
+    # drops the open packfiles and mmaps, e.g. before the clone is deleted
+    repo = _repositories.pop(str(repo_path), None)
+    if repo is not None:
+        repo.free()
+
+def splitDocument(document, language, max_chars=100000):
+    chunks = []
+    text = document.text
+    for node in getSplitter(language, max_chars).get_nodes_from_documents([document]):
+        start = node.start_char_idx if node.start_char_idx is not None and node.start_char_idx >= 0 else 0
+        end = node.end_char_idx if node.end_char_idx is not None and node.end_char_idx >= 0 else len(text)
+        # filename header plus code only, so identical code always yields identical chunks
+        chunks.append((node.get_content(metadata_mode=MetadataMode.LLM), text.count("\n", 0, start) + 1, text.count("\n", 0, end) + 1))
+    return chunks
+
+def chunkFile(file_path, language, repo_path=None, blob_id=None, max_tokens=None, measure=False):
+    """
+    Split a file at AST boundaries. With max_tokens, every chunk is kept within
+    that many tokens by splitting at finer AST boundaries until it fits.
+
+    Returns:
+        tuple: (chunks, static metrics of the file, or None unless measure is set).
+    """
+    chunks = []
+    documents = loadDocuments(file_path, repo_path, blob_id)
+    for document in documents:
+        if max_tokens is None:
+            chunks.extend(splitDocument(document, language))
+            continue
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        while True:
+            pieces = splitDocument(document, language, max_chars)
+            if max_chars <= MIN_SPLIT_CHARS or all(count_tokens(piece[0]) <= max_tokens for piece in pieces):
+                break
+            max_chars //= 2
+        chunks.extend(pieces)
+    if not measure:
+        return chunks, None
+    source = Path(file_path).relative_to(repo_path).as_posix() if repo_path else Path(file_path).name
+    return chunks, file_metrics("".join(document.text for document in documents), language, source)
 
 class ChunkExtractor:
-    def __init__(self):
+    def __init__(self, similarity: SimilarityIndex = None, telemetry: Telemetry = None, token_budget: int = None,
+                 static_metrics: bool = True):
+        """
+        Args:
+            token_budget (int): Split files into chunks of at most this many tokens and
+                pack small chunks from the same directory together up to it. None keeps
+                one chunk per AST split of each file.
+            static_metrics (bool): Measure comments, complexity, function length and
+                naming of every chunked file into chunk_data/metrics.json.
+        """
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
         handler = logging.StreamHandler()
         handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
         self.logger.addHandler(handler)
+        self.git = GitHandler()
+        self.prefilter = Prefilter(detect_language=self.detectLanguage)
+        self.similarity = similarity
+        self.telemetry = telemetry or get_telemetry()
+        self.token_budget = token_budget
+        self.static_metrics = static_metrics
 
     def detectLanguage(self, filePath):
         extension = Path(filePath).suffix[1:].lower()
@@ -22,44 +125,256 @@ class ChunkExtractor:
         root_path = Path(root_folder)
         for repo_path in root_path.iterdir():
             if repo_path.is_dir():
-                self.processRepo(repo_path)
+                with self.telemetry.scope(repo=repo_path.name), self.telemetry.stage("chunk"):
+                    self.processRepo(repo_path)
+        self.reportOverlap(root_path)
+
+    def indexSimilarity(self, repo_path, chunk_folder):
+        if self.similarity is None or not ChunkStore.exists(chunk_folder):
+            return
+        with ChunkStore(chunk_folder) as store, self.telemetry.stage("similarity_index"):
+            self.similarity.add_repo(repo_path.name, store)
+
+    def reportOverlap(self, root_path):
+        if self.similarity is None:
+            return
+        report = self.similarity.overlap_report()
+        output_file = Path(root_path) / "overlap_report.json"
+        output_file.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        self.logger.info(f"Overlap report for {len(report['pairs'])} team pairs saved to: {output_file}")
+
+    def listFiles(self, repo_path, chunk_folder):
+        """
+        Return sorted (file path, blob id) pairs that pass the prefilter. Blob ids
+        are only set for object-only clones, whose files are read from the object
+        database. Sorted so chunk numbering is the same on every run and in every mode.
+        """
+        with self.telemetry.stage("prefilter"):
+            files, report = self.prefilter.scan(repo_path)
+        chunk_folder.mkdir(parents=True, exist_ok=True)
+        (chunk_folder / "prefilter.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        self.logger.info(f"Prefilter kept {report['kept']} files, skipped {report['skipped']}: {repo_path}")
+        return files
+
+    def packer(self, writer):
+        if self.token_budget is None:
+            return nullcontext(writer)
+        return ChunkPacker(writer, self.token_budget)
 
     def processRepo(self, repo_path):
         chunk_folder = repo_path / "chunk_data"
-        chunk_folder.mkdir(exist_ok=True)
         file_counter = 0
 
-        for file_path in repo_path.rglob('*'):
-            if file_path.is_file() and file_path.parent != chunk_folder:
-                file_counter = self.processFile(file_path, chunk_folder, file_counter)
+        metrics = {} if self.static_metrics else None
+
+        try:
+            # staged, so reviewers with the previous store open keep reading it until the new one is complete
+            with ChunkStoreWriter(chunk_folder, staging=True) as store_writer, self.packer(store_writer) as writer:
+                for file_path, blob_id in self.listFiles(repo_path, chunk_folder):
+                    file_counter = self.processFile(file_path, writer, file_counter, repo_path, blob_id, metrics)
+        finally:
+            releaseRepository(repo_path)
+        if metrics is not None:
+            save_metrics(chunk_folder, metrics)
+        self.saveCommit(repo_path, chunk_folder)
+        self.indexSimilarity(repo_path, chunk_folder)
 
-    def processFile(self, file_path, chunk_folder, file_counter):
+    def openRepo(self, repo_path):
+        try:
+            return pygit2.Repository(str(repo_path))
+        except pygit2.GitError:
+            return None
+
+    def headCommit(self, repo_path):
+        repo = self.openRepo(repo_path)
+        if repo is None or repo.head_is_unborn:
+            return None, None
+        return repo, str(self.git.get_latest_commit(repo).id)
+
+    def saveCommit(self, repo_path, chunk_folder):
+        _, commit = self.headCommit(repo_path)
+        if commit is not None:
+            save_state(chunk_folder, {"commit": commit, "token_budget": self.token_budget})
+
+    def processReposIncremental(self, root_folder):
+        root_path = Path(root_folder)
+        for repo_path in root_path.iterdir():
+            if repo_path.is_dir():
+                with self.telemetry.scope(repo=repo_path.name), self.telemetry.stage("chunk"):
+                    self.processRepoIncremental(repo_path)
+        self.reportOverlap(root_path)
+
+    def processRepoIncremental(self, repo_path):
+        """
+        Rechunk only the files that changed since the commit the store was built
+        from. Chunks of unchanged files keep their ids, so their reviews are reused.
+        """
+        chunk_folder = repo_path / "chunk_data"
+        state = load_state(chunk_folder)
+        previous = state.get("commit")
+        repo, commit = self.headCommit(repo_path)
+        if commit is None or previous is None or not ChunkStore.exists(chunk_folder):
+            return self.processRepo(repo_path)
+        if state.get("token_budget") != self.token_budget:
+            self.logger.info(f"Token budget changed, rechunking: {repo_path}")
+            return self.processRepo(repo_path)
+        if self.static_metrics and not (chunk_folder / METRICS_FILE).is_file():
+            self.logger.info(f"No static metrics yet, rechunking: {repo_path}")
+            return self.processRepo(repo_path)
+        if previous == commit:
+            self.logger.info(f"Chunks already up to date at {commit}: {repo_path}")
+            return
+
+        try:
+            changed, deleted = self.git.get_changed_files(repo, previous, commit)
+        except (pygit2.GitError, KeyError):
+            # the previous commit is no longer reachable (force push, shallow history)
+            return self.processRepo(repo_path)
+
+        stale = changed | deleted
+        rechunk = set(changed)
+        kept = 0
+        metrics = load_metrics(chunk_folder) if self.static_metrics else None
+        try:
+            with ChunkStoreWriter(chunk_folder, staging=True) as store_writer, self.packer(store_writer) as writer:
+                file_counter = 0
+                with ChunkStore(chunk_folder) as previous_store:
+                    for entry in previous_store:
+                        file_counter = max(file_counter, entry["id"] + 1)
+                        sources = entry_sources(entry)
+                        if sources & stale:
+                            # unchanged files packed with a changed one lose their chunk too
+                            rechunk |= sources - deleted
+                            continue
+                        store_writer.append(entry["id"], previous_store.read(entry), entry["source"], entry["language"],
+                                            entry["start_line"], entry["end_line"], parts=entry.get("parts"))
+                        kept += 1
+                if metrics is not None:
+                    # re-measured below if the file still exists and is still chunked
+                    for source in stale | rechunk:
+                        metrics.pop(source, None)
+                blobs = dict(self.git.walk_tree(repo)) if repo.is_bare else None
+                for source in sorted(rechunk):
+                    file_path = repo_path / source
+                    if blobs is not None:
+                        blob_id = blobs.get(source)
+                        if blob_id is None:
+                            continue
+                    elif not file_path.is_file():
+                        continue
+                    else:
+                        blob_id = None
+                    reason = self.prefilter.check_path(repo_path, source, repo, blob_id)
+                    if reason:
+                        self.logger.info(f"Skipping {reason} file: {file_path}")
+                        continue
+                    file_counter = self.processFile(file_path, writer, file_counter, repo_path, blob_id, metrics)
+        finally:
+            releaseRepository(repo_path)
+
+        if metrics is not None:
+            save_metrics(chunk_folder, metrics)
+        save_state(chunk_folder, {"commit": commit, "token_budget": self.token_budget})
+        self.indexSimilarity(repo_path, chunk_folder)
+        self.logger.info(f"Rechunked {len(rechunk)} changed and dropped {len(deleted)} deleted files, "
+                         f"kept {kept} chunks: {repo_path}")
+
+    def processReposParallel(self, root_folder, max_workers=None):
+        root_path = Path(root_folder)
+        repo_paths = sorted(repo_path for repo_path in root_path.iterdir() if repo_path.is_dir())
+
+        jobs = []
+        for repo_path in repo_paths:
+            chunk_folder = repo_path / "chunk_data"
+            chunk_folder.mkdir(exist_ok=True)
+            files = []
+            for file_path, blob_id in self.listFiles(repo_path, chunk_folder):
+                language = self.detectLanguage(file_path)
+                if language == 'unknown':
+                    self.logger.info(f"Skipping file with unknown language: {file_path}")
+                    continue
+                files.append((file_path, language, blob_id))
+            jobs.append((repo_path, chunk_folder, files))
+
+        # only a window of files is in flight, so finished chunks never pile up ahead of the writer;
+        # the window runs on into the next repo, so the pool does not idle between repos
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        tasks = ((repo_path, *task) for repo_path, _, files in jobs for task in files)
+        inflight = deque()
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            def fill():
+                for repo_path, file_path, language, blob_id in islice(tasks, window - len(inflight)):
+                    inflight.append(pool.submit(chunkFile, str(file_path), language, str(repo_path), blob_id,
+                                                self.token_budget, self.static_metrics))
+                    self.telemetry.add("chunk_queue_depth", 1)
+
+            # collected in submission order so numbering matches the serial path
+            for repo_path, chunk_folder, files in jobs:
+                file_counter = 0
+                metrics = {} if self.static_metrics else None
+                with self.telemetry.scope(repo=repo_path.name):
+                    with ChunkStoreWriter(chunk_folder, staging=True) as store_writer, self.packer(store_writer) as writer:
+                        for file_path, _, _ in files:
+                            fill()
+                            future = inflight.popleft()
+                            try:
+                                # time spent blocked here means the pool, not the writer, is the bottleneck
+                                with self.telemetry.stage("chunk_wait"):
+                                    chunks, fileMetrics = future.result()
+                                file_counter = self.writeChunks(chunks, writer, file_counter, repo_path, file_path)
+                                self.addMetrics(metrics, fileMetrics, repo_path, file_path)
+                                self.logger.info(f"Processed file: {file_path}")
+                            except Exception as e:
+                                self.telemetry.inc("files_failed_total", stage="chunk")
+                                self.logger.error(f"Error processing file {file_path}: {str(e)}", exc_info=True)
+                            finally:
+                                self.telemetry.add("chunk_queue_depth", -1)
+                    if metrics is not None:
+                        save_metrics(chunk_folder, metrics)
+                    self.saveCommit(repo_path, chunk_folder)
+                    self.indexSimilarity(repo_path, chunk_folder)
+        self.reportOverlap(root_path)
+
+    def processFile(self, file_path, writer, file_counter, repo_path, blob_id=None, metrics=None):
         try:
             language = self.detectLanguage(file_path)
             if language == 'unknown':
                 self.logger.info(f"Skipping file with unknown language: {file_path}")
                 return file_counter
             
-            document = FlatReader().load_data(file_path)
-            
-            code_splitter = CodeSplitter(chunk_lines=100, language=language, max_chars=100000)
-            nodes = code_splitter.get_nodes_from_documents(document)
-            
-            for node in nodes:
-                chunk_file_path = chunk_folder / f"{file_counter}.json"
-                chunk_file_path.write_text(node.to_json(), encoding="utf-8")
-                file_counter += 1
-            
+            with self.telemetry.stage("split"):
+                chunks, fileMetrics = chunkFile(file_path, language, repo_path, blob_id, self.token_budget, metrics is not None)
+            file_counter = self.writeChunks(chunks, writer, file_counter, repo_path, file_path)
+            self.addMetrics(metrics, fileMetrics, repo_path, file_path)
+
             self.logger.info(f"Processed file: {file_path}")
             return file_counter
                 
         except Exception as e:
+            self.telemetry.inc("files_failed_total", stage="chunk")
             self.logger.error(f"Error processing file {file_path}: {str(e)}", exc_info=True)
             return file_counter
 
+    def addMetrics(self, metrics, fileMetrics, repo_path, file_path):
+        if metrics is not None and fileMetrics is not None:
+            metrics[Path(file_path).relative_to(repo_path).as_posix()] = fileMetrics
+
+    def writeChunks(self, chunks, writer, file_counter, repo_path, file_path):
+        source = Path(file_path).relative_to(repo_path).as_posix()
+        language = self.detectLanguage(file_path)
+        for text, start_line, end_line in chunks:
+            writer.append(file_counter, text, source, language, start_line, end_line)
+            file_counter += 1
+        self.telemetry.inc("files_chunked_total", language=language)
+        self.telemetry.inc("chunks_written_total", len(chunks), language=language)
+        return file_counter
+
 if __name__ == "__main__":
     base_path = Path("./cloned_repos")
-    chunk_extractor = ChunkExtractor()
-    chunk_extractor.processRepos(base_path)
+    chunk_extractor = ChunkExtractor(similarity=SimilarityIndex(str(base_path / "similarity.sqlite3")), token_budget=2000)
+    chunk_extractor.processReposParallel(base_path)
+    chunk_extractor.telemetry.write_report(str(base_path / "chunk_run_report.json"))
+    chunk_extractor.telemetry.write_prometheus(str(base_path / "chunk_metrics.prom"))
 
     
\ No newline at end of file
@@ -1,27 +1,30 @@
 import os
+import re
 import json
 import time
+import asyncio
+import hashlib
 import logging
+from itertools import takewhile
 from collections import defaultdict
-from groq import Groq
-import instructor
-from code_file_eval_model import CodeReviewModel
+from code_file_eval_model import CodeReviewModel, SemanticCodeReviewModel
+from llm_client import LLMClient, get_client
+from score_aggregator import ScoreAggregator
+from rate_limiter import RateLimiter
+from review_cache import ReviewCache
+from chunk_store import ChunkStore, load_state
+from chunk_packer import entry_sources
+from similarity import SimilarityIndex
+from sampling import SamplingPolicy
+from cascade import CascadePolicy, CascadeStats
+from static_metrics import METRICS_FILE, STATIC_CATEGORIES, describe, load_metrics, repo_metrics, static_scores
+from telemetry import Telemetry, get_telemetry
 import languages
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
 
-class CodeAnalyser:
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-
-    def get_code(self, file_path: str):
-        with open(file_path, 'r') as f:
-            code = f.read()
-        return code
-
-    def getOutput(self, filePath: str):
-        sys_prompt = """
+SYS_PROMPT = """
 You are an expert code reviewer tasked with evaluating projects for a prestigious hackathon. Your mission is to provide comprehensive, insightful, and impartial reviews that will assist the judges in their final evaluation. Analyze the given code meticulously, considering the unique context of a hackathon environment.
 
 ## Core Evaluation Criteria:
@@ -79,26 +82,160 @@ Follow the provided model structure for your review. Ensure all fields are compl
 - Consider the project's originality and potential impact in the field.
 
 Remember, your evaluation could be the deciding factor in selecting groundbreaking projects. Approach this task with the utmost diligence and expertise.
+"""
+
+MODEL = "llama-3.1-70b-versatile" #"mixtral-8x7b-32768"
+
+# completion tokens also count against the tokens/minute quota
+COMPLETION_TOKENS_ESTIMATE = 512
+
+# records which chunk content each output file reviewed, so unchanged chunks are not re-reviewed
+REVIEW_MANIFEST = "reviewed.idx"
+# chunks whose review was copied from a duplicate in another team's repo
+DUPLICATES_REPORT = "duplicates.idx"
+# append-only log of per-chunk scores behind the running summary
+SCORES_LOG = "scores.log"
+PROMPT_FINGERPRINT = hashlib.sha256(f"{MODEL}\0{SYS_PROMPT}".encode("utf-8")).hexdigest()
+# sources described in the static analysis context of a packed chunk
+MAX_CONTEXT_SOURCES = 3
+
+
+def withoutCategories(prompt, categories):
+    """Drop the criteria of categories scored elsewhere, then rename and renumber the category headings."""
+    def scoredElsewhere(line):
+        return any(line.strip().startswith(f'- "{category}"') for category in categories)
+
+    names = {category.replace("_", " ") for category in categories}
+    lines = prompt.splitlines()
+    kept, number = [], 0
+    for i, line in enumerate(lines):
+        if scoredElsewhere(line):
+            continue
+        heading = re.match(r"^\d+\. (.+?)(?: \((.+)\))?$", line)
+        criteria = list(takewhile(lambda line: line.strip().startswith("- "), lines[i + 1:]))
+        if heading and criteria:
+            # a heading whose criteria are all scored elsewhere goes with them
+            if all(scoredElsewhere(criterion) for criterion in criteria):
+                continue
+            number += 1
+            title, listed = heading.groups()
+            listed = [name for name in (listed or "").split(", ") if name and name not in names]
+            line = f"{number}. {title}" + (f" ({', '.join(listed)})" if listed else "")
+        kept.append(line)
+    return "\n".join(kept) + f"""
+Static analysis scores {", ".join(categories)} separately. Its measurements for the files of each chunk precede the code; use them as context for the remaining categories.
+"""
+
+
+STATIC_SYS_PROMPT = withoutCategories(SYS_PROMPT, STATIC_CATEGORIES)
+
+class CodeAnalyser:
+    def __init__(self, cache: ReviewCache = None, llm: LLMClient = None, similarity: SimilarityIndex = None,
+                 weighting: str = "chunk", telemetry: Telemetry = None, sampling: SamplingPolicy = None,
+                 cascade: CascadePolicy = None, static_metrics: bool = False):
+        """
+        Args:
+            weighting (str): How much each chunk counts towards the repo scores:
+                "chunk" (equally), "lines" (by line count) or "tokens" (by size).
+            sampling (SamplingPolicy): Review only the most important chunks of each
+                repo, stopping once the scores converge or the budget runs out.
+            cascade (CascadePolicy): Review chunks with a small model first and
+                escalate only the ones it is unsure about to MODEL.
+            static_metrics (bool): Score commenting, consistency, test coverage and
+                complexity from the metrics the chunker measured instead of asking
+                the model, which gets a smaller schema, a shorter prompt and the
+                metrics of each chunk's files as context.
         """
+        self.logger = logging.getLogger(__name__)
+        self.cache = cache
+        self.llm = llm or get_client()
+        self.similarity = similarity
+        self.weighting = weighting
+        self.duplicates = defaultdict(list)
+        self.aggregators = {}
+        self.telemetry = telemetry or get_telemetry()
+        self.sampling = sampling
+        self.samplingReports = {}
+        self.cascade = cascade
+        self.cascadeStats = CascadeStats()
+        self.staticMetrics = static_metrics
+        self.staticMetricsCache = {}
+        self.sysPrompt = STATIC_SYS_PROMPT if static_metrics else SYS_PROMPT
+        self.reviewModel = SemanticCodeReviewModel if static_metrics else CodeReviewModel
+        # cascaded and single-model reviews of the same chunk are not interchangeable
+        self.promptFingerprint = PROMPT_FINGERPRINT
+        if static_metrics:
+            self.promptFingerprint = hashlib.sha256(f"{MODEL}\0{self.sysPrompt}".encode("utf-8")).hexdigest()
+        if cascade is not None:
+            self.promptFingerprint = hashlib.sha256(f"{self.promptFingerprint}\0{cascade.fingerprint()}".encode("utf-8")).hexdigest()
+        # job workers share score logs with other processes, so they only append
+        self.compactScores = True
+
+    def get_code(self, file_path: str):
+        with open(file_path, 'r') as f:
+            code = f.read()
+        return code
+
+    def cacheKey(self, code: str, model: str = MODEL) -> str:
+        return self.cache.make_key(code, self.sysPrompt, model, self.reviewModel)
+
+    def getOutput(self, code: str, entry=None):
+        if self.cascade is None:
+            return self.cachedReview(code, MODEL)
+        route, reason = self.cascade.route(entry, code, self.estimateTokens(code))
+        models = [MODEL if route == "large" else self.cascade.small_model]
+        review = self.cachedReview(code, models[0])
+        escalation = self.cascade.escalation(review) if route == "triage" else None
+        if escalation is not None:
+            models.append(MODEL)
+            review = self.cachedReview(code, MODEL)
+        self.recordCascade(code, route, reason, escalation, models)
+        return review
+
+    def cachedReview(self, code: str, model: str):
+        if self.cache is None:
+            return self.requestReview(code, model)
+
+        key = self.cacheKey(code, model)
+        review = self.cache.get(key, self.reviewModel)
+        if review is None:
+            review = self.requestReview(code, model)
+            self.cache.put(key, review, self.sysPrompt, model)
+        return review
 
-        client = Groq(api_key="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")
-        client = instructor.from_groq(client, mode=instructor.Mode.TOOLS)
-
-        output = client.chat.completions.create(
-            model="llama-3.1-70b-versatile",#"mixtral-8x7b-32768",
-            messages=[
-                {
-                    "role": "system",
-                    "content": sys_prompt
-                },
-                {
-                    "role": "user",
-                    "content": self.get_code(filePath),
-                }
-            ],
-            response_model=CodeReviewModel,
+    def recordCascade(self, code, route, reason, escalation, models):
+        tokens = self.estimateTokens(code)
+        self.cascadeStats.record(
+            route, reason, escalation,
+            tokens_by_model={model: tokens for model in models},
+            tokens_saved=0 if MODEL in models else tokens,
+            # negative for escalated chunks, which pay for both models
+            cost_saved=self.estimateCost(code) - sum(self.estimateCost(code, model) for model in models),
         )
-        return output
+        self.telemetry.inc("cascade_chunks_total", route=route, escalation=escalation or "none")
+
+    def saveCascadeReport(self, root_folder):
+        if self.cascade is None:
+            return
+        report = self.cascadeStats.report()
+        with open(os.path.join(root_folder, "cascade_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        self.logger.info(f"Model cascade stats: {report}")
+
+    def buildMessages(self, code: str):
+        return [
+            {
+                "role": "system",
+                "content": self.sysPrompt
+            },
+            {
+                "role": "user",
+                "content": code,
+            }
+        ]
+
+    def requestReview(self, code: str, model: str = MODEL):
+        return self.llm.create(model=model, messages=self.buildMessages(code), response_model=self.reviewModel)
 
     def processRepos(self, root_folder):
         mapping = {}
@@ -107,65 +244,365 @@ Remember, your evaluation could be the deciding factor in selecting groundbreaki
             repoPath = os.path.join(root_folder, repoName)
             if os.path.isdir(repoPath):
                 logging.info(f"Processing repo: {repoPath}")
-                self.processRepo(repoPath, mapping)
-                self.finalScores(repoPath)
+                with self.telemetry.scope(repo=repoName):
+                    with self.telemetry.stage("review"):
+                        self.processRepo(repoPath, mapping)
+                    self.finalScores(repoPath)
 
         with open(os.path.join(repoPath, "file_output_mapping.json"), "w") as f:
             json.dump(mapping, f, indent=2)
 
+        if self.cache is not None:
+            self.logger.info(f"Review cache stats: {self.cache.stats()}")
+        self.saveCascadeReport(root_folder)
+
     def processRepo(self, repoPath, mapping):
         outputFolder = os.path.join(repoPath, "output_data")
         os.makedirs(outputFolder, exist_ok=True)
         chunkFolderPath = os.path.join(repoPath, "chunk_data")
-        for file in os.listdir(chunkFolderPath):
-            filePath = os.path.join(chunkFolderPath, file)
-            if os.path.isfile(filePath):
-                logging.info(f"\tProcessing chunk: {filePath}")
-                self.processChunk(filePath, outputFolder, mapping)
-            time.sleep(0.75)
-
-    def processChunk(self, filePath, outputFolder, mapping):
+        with ChunkStore(chunkFolderPath) as store:
+            manifest = self.loadManifest(store, outputFolder)
+            if self.sampling is not None:
+                self.processRepoSampled(store, repoPath, outputFolder, mapping, manifest)
+            else:
+                for entry in store:
+                    if self.reuseReview(entry, repoPath, outputFolder, manifest, mapping):
+                        continue
+                    logging.info(f"\tProcessing chunk: {self.chunkRef(repoPath, entry)}")
+                    if self.reuseDuplicate(entry, repoPath, outputFolder, mapping, manifest):
+                        continue
+                    self.processChunk(self.reviewInput(store, entry, repoPath), entry, repoPath, outputFolder, mapping, manifest)
+                    with self.telemetry.stage("throttle_sleep"):
+                        time.sleep(0.75)
+        self.saveManifest(repoPath, outputFolder, manifest)
+        self.saveDuplicates(repoPath, outputFolder)
+
+    def pendingChunks(self, store, repoPath, outputFolder, mapping, manifest):
+        """Chunks that still need a review once earlier and duplicate reviews are reused."""
+        return [
+            entry for entry in store
+            if not self.reuseReview(entry, repoPath, outputFolder, manifest, mapping)
+            and not self.reuseDuplicate(entry, repoPath, outputFolder, mapping, manifest)
+        ]
+
+    def processRepoSampled(self, store, repoPath, outputFolder, mapping, manifest):
+        aggregator = self.aggregator(outputFolder)
+        run = self.sampling.start(len(store))
+        for entry in self.sampling.order(store, self.pendingChunks(store, repoPath, outputFolder, mapping, manifest)):
+            if run.converged(aggregator):
+                break
+            code = self.reviewInput(store, entry, repoPath)
+            if not run.admit(self.estimateTokens(code), self.estimateCost(code)):
+                break
+            logging.info(f"\tProcessing chunk: {self.chunkRef(repoPath, entry)}")
+            self.processChunk(code, entry, repoPath, outputFolder, mapping, manifest)
+            with self.telemetry.stage("throttle_sleep"):
+                time.sleep(0.75)
+        report = self.samplingReports[os.path.normpath(outputFolder)] = run.report(aggregator)
+        logging.info(f"Sampled review of {repoPath}: {report}")
+
+    def reviewInput(self, store, entry, repoPath):
+        code = store.read(entry)
+        if not self.staticMetrics:
+            return code
+        metrics = self.repoStaticMetrics(repoPath)
+        lines = [describe(source, metrics[source]) for source in sorted(entry_sources(entry))[:MAX_CONTEXT_SOURCES] if source in metrics]
+        if not lines:
+            return code
+        return "Static analysis:\n" + "\n".join(lines) + "\n\n" + code
+
+    def repoStaticMetrics(self, repoPath):
+        """Per-file metrics the chunker saved, reloaded whenever the repo is rechunked."""
+        metricsPath = os.path.join(repoPath, "chunk_data", METRICS_FILE)
         try:
-            output = self.getOutput(filePath).model_dump_json(indent=2)
-            # get the filename without extension
-            outputFilePath = os.path.join(outputFolder, f"{os.path.splitext(os.path.basename(filePath))[0]}.json")
-            
-            with open(outputFilePath, "w", encoding="utf-8") as f:
-                f.write(output)
-            
-            mapping[filePath] = outputFilePath
-        except Exception as e:
-            self.logger.info(f"Error processing file {filePath}: {str(e)}")
+            mtime = os.stat(metricsPath).st_mtime_ns
+        except OSError:
+            return {}
+        cached = self.staticMetricsCache.get(metricsPath)
+        if cached is None or cached[0] != mtime:
+            cached = self.staticMetricsCache[metricsPath] = (mtime, load_metrics(os.path.dirname(metricsPath)))
+        return cached[1]
 
-    def finalScores(self, repoPath):
-        directory = os.path.join(repoPath, "output_data")
-        score_aggregation = defaultdict(int)
-        files = 0
+    def chunkRef(self, repoPath, entry):
+        if "parts" in entry:
+            return " + ".join(f"{os.path.join(repoPath, source)}#L{start}-L{end}" for source, start, end in entry["parts"])
+        return f"{os.path.join(repoPath, entry['source'])}#L{entry['start_line']}-L{entry['end_line']}"
+
+    def reviewFingerprint(self, entry):
+        if "hash" not in entry:
+            return None
+        return hashlib.sha256(f"{entry['hash']}\0{self.promptFingerprint}".encode("utf-8")).hexdigest()
 
-        for filename in os.listdir(directory):
-            if filename.endswith('.json'):
-                with open(os.path.join(directory, filename), 'r') as file:
-                    data = json.load(file)
+    def readManifest(self, outputFolder):
+        manifestPath = os.path.join(outputFolder, REVIEW_MANIFEST)
+        if not os.path.exists(manifestPath):
+            return {}
+        with open(manifestPath, "r") as f:
+            return json.load(f).get("chunks", {})
 
-                for key, value in data.items():
-                    if isinstance(value, dict) and 'score' in value:
-                        score_aggregation[key] += value['score']
-            files += 1
+    def loadManifest(self, store, outputFolder):
+        manifest = self.readManifest(outputFolder)
+        if not manifest:
+            return manifest
 
-        for category in score_aggregation:
-            score_aggregation[category] = round(score_aggregation[category]/files)
+        # drop reviews of chunks that no longer exist (e.g. from deleted files) or whose content changed
+        current = {str(entry["id"]): self.reviewFingerprint(entry) for entry in store}
+        aggregator = self.aggregator(outputFolder)
+        for chunkId in [chunkId for chunkId in manifest if current.get(chunkId) != manifest[chunkId]]:
+            outputFilePath = os.path.join(outputFolder, f"{chunkId}.json")
+            if os.path.exists(outputFilePath):
+                os.remove(outputFilePath)
+            aggregator.remove(chunkId)
+            del manifest[chunkId]
+        return manifest
 
-        output_data = {
-            "scores_by_category": dict(score_aggregation)
+    def saveManifest(self, repoPath, outputFolder, manifest):
+        state = {
+            "commit": load_state(os.path.join(repoPath, "chunk_data")).get("commit"),
+            "chunks": manifest,
         }
+        with open(os.path.join(outputFolder, REVIEW_MANIFEST), "w") as f:
+            json.dump(state, f)
+
+    def reuseReview(self, entry, repoPath, outputFolder, manifest, mapping):
+        fingerprint = self.reviewFingerprint(entry)
+        outputFilePath = os.path.join(outputFolder, f"{entry['id']}.json")
+        if fingerprint is None or manifest.get(str(entry["id"])) != fingerprint or not os.path.exists(outputFilePath):
+            return False
+        aggregator = self.aggregator(outputFolder)
+        if str(entry["id"]) not in aggregator:
+            # reviewed before scores were aggregated incrementally
+            with open(outputFilePath, "r", encoding="utf-8") as f:
+                aggregator.add(str(entry["id"]), json.load(f), self.chunkWeight(entry))
+        mapping[self.chunkRef(repoPath, entry)] = outputFilePath
+        self.telemetry.inc("chunks_total", outcome="unchanged")
+        return True
+
+    def reuseDuplicate(self, entry, repoPath, outputFolder, mapping, manifest):
+        """Copy the review of an exact or near duplicate chunk from another team's repo."""
+        if self.similarity is None:
+            return False
+        rootFolder, repoName = os.path.split(os.path.normpath(repoPath))
+        for otherRepo, chunkId, similarity in self.similarity.find_duplicates(repoName, entry):
+            reviewPath = os.path.join(rootFolder, otherRepo, "output_data", f"{chunkId}.json")
+            if not os.path.exists(reviewPath):
+                continue
+            try:
+                with open(reviewPath, "r", encoding="utf-8") as f:
+                    review = self.reviewModel.model_validate_json(f.read())
+            except (OSError, ValueError):
+                continue
+            self.saveOutput(entry, repoPath, review, outputFolder, mapping, manifest)
+            self.telemetry.inc("chunks_total", outcome="duplicate")
+            self.duplicates[os.path.normpath(repoPath)].append({
+                "chunk": self.chunkRef(repoPath, entry),
+                "duplicate_of": f"{otherRepo}#{chunkId}",
+                "similarity": similarity,
+            })
+            logging.info(f"\tReused review of {otherRepo}#{chunkId} ({similarity:.2f} similar): {self.chunkRef(repoPath, entry)}")
+            return True
+        return False
+
+    def saveDuplicates(self, repoPath, outputFolder):
+        if self.similarity is None:
+            return
+        with open(os.path.join(outputFolder, DUPLICATES_REPORT), "w") as f:
+            json.dump(self.duplicates.pop(os.path.normpath(repoPath), []), f, indent=2)
+
+    def processChunk(self, code, entry, repoPath, outputFolder, mapping, manifest):
+        try:
+            self.saveOutput(entry, repoPath, self.getOutput(code, entry), outputFolder, mapping, manifest)
+            self.telemetry.inc("chunks_total", outcome="reviewed")
+        except Exception as e:
+            self.telemetry.inc("chunks_total", outcome="failed")
+            self.logger.info(f"Error processing chunk {self.chunkRef(repoPath, entry)}: {str(e)}")
+
+    def saveOutput(self, entry, repoPath, review, outputFolder, mapping, manifest):
+        output = review.model_dump_json(indent=2)
+        outputFilePath = os.path.join(outputFolder, f"{entry['id']}.json")
 
-        output_file = os.path.join(repoPath, "output_data/scores_summary.json")
-        with open(output_file, 'w') as file:
-            json.dump(output_data, file, indent=2)
+        with open(outputFilePath, "w", encoding="utf-8") as f:
+            f.write(output)
+
+        mapping[self.chunkRef(repoPath, entry)] = outputFilePath
+        manifest[str(entry["id"])] = self.reviewFingerprint(entry)
+        self.aggregator(outputFolder).add(str(entry["id"]), review, self.chunkWeight(entry))
+
+    def aggregator(self, outputFolder) -> ScoreAggregator:
+        outputFolder = os.path.normpath(outputFolder)
+        if outputFolder not in self.aggregators:
+            self.aggregators[outputFolder] = ScoreAggregator(os.path.join(outputFolder, SCORES_LOG), compact=self.compactScores)
+        return self.aggregators[outputFolder]
+
+    def chunkWeight(self, entry) -> float:
+        if self.weighting == "lines":
+            if "parts" in entry:
+                return sum(end - start + 1 for _, start, end in entry["parts"])
+            return entry["end_line"] - entry["start_line"] + 1
+        if self.weighting == "tokens":
+            # ~4 characters per token
+            return max(1, entry["length"] // 4)
+        return 1
+
+    def estimateTokens(self, code: str) -> int:
+        # ~4 characters per token is close enough to pace the tokens/minute bucket
+        return (len(self.sysPrompt) + len(code)) // 4 + COMPLETION_TOKENS_ESTIMATE
+
+    def estimateCost(self, code: str, model: str = MODEL) -> float:
+        return self.telemetry.cost(model, self.estimateTokens(code) - COMPLETION_TOKENS_ESTIMATE, COMPLETION_TOKENS_ESTIMATE)
+
+    isThrottleError = staticmethod(LLMClient.is_throttle_error)
+    retryAfter = staticmethod(LLMClient.retry_after)
+
+    def processReposAsync(self, root_folder, concurrency=8, requests_per_minute=30, tokens_per_minute=6000, max_retries=5):
+        limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+        return asyncio.run(self._processReposAsync(root_folder, limiter, concurrency, max_retries))
+
+    async def _processReposAsync(self, root_folder, limiter, concurrency, max_retries):
+        mapping = {}
+        semaphore = asyncio.Semaphore(concurrency)
 
-        self.logger.info(f"Scores summary saved to: {output_file}")
+        async def reviewRepo(repoPath):
+            logging.info(f"Processing repo: {repoPath}")
+            # each repo runs in its own task, so the scope covers only its chunks
+            with self.telemetry.scope(repo=os.path.basename(repoPath)):
+                with self.telemetry.stage("review"):
+                    await self.processRepoAsync(repoPath, mapping, limiter, semaphore, max_retries)
+                self.finalScores(repoPath)
+
+        repoPaths = [os.path.join(root_folder, repoName) for repoName in os.listdir(root_folder)]
+        await asyncio.gather(*(reviewRepo(repoPath) for repoPath in repoPaths if os.path.isdir(repoPath)))
+        await self.llm.aclose()
+
+        with open(os.path.join(root_folder, "file_output_mapping.json"), "w") as f:
+            json.dump(mapping, f, indent=2)
+
+        if self.cache is not None:
+            self.logger.info(f"Review cache stats: {self.cache.stats()}")
+        self.saveCascadeReport(root_folder)
+
+    async def processRepoAsync(self, repoPath, mapping, limiter, semaphore, max_retries=5):
+        outputFolder = os.path.join(repoPath, "output_data")
+        os.makedirs(outputFolder, exist_ok=True)
+        chunkFolderPath = os.path.join(repoPath, "chunk_data")
+        with ChunkStore(chunkFolderPath) as store:
+            manifest = self.loadManifest(store, outputFolder)
+            if self.sampling is not None:
+                await self.processRepoSampledAsync(store, repoPath, outputFolder, mapping, manifest, limiter, semaphore, max_retries)
+            else:
+                await asyncio.gather(*(
+                    self.processChunkAsync(store, entry, repoPath, outputFolder, mapping, manifest, limiter, semaphore, max_retries)
+                    for entry in self.pendingChunks(store, repoPath, outputFolder, mapping, manifest)
+                ))
+        self.saveManifest(repoPath, outputFolder, manifest)
+        self.saveDuplicates(repoPath, outputFolder)
+
+    async def processRepoSampledAsync(self, store, repoPath, outputFolder, mapping, manifest, limiter, semaphore, max_retries=5):
+        # reviews go out in batches so convergence is checked between them
+        aggregator = self.aggregator(outputFolder)
+        run = self.sampling.start(len(store))
+        ordered = self.sampling.order(store, self.pendingChunks(store, repoPath, outputFolder, mapping, manifest))
+        position = 0
+        while position < len(ordered) and not run.converged(aggregator):
+            batch = []
+            for entry in ordered[position:position + self.sampling.batch_size]:
+                code = self.reviewInput(store, entry, repoPath)
+                if not run.admit(self.estimateTokens(code), self.estimateCost(code)):
+                    break
+                batch.append(entry)
+            position += len(batch)
+            await asyncio.gather(*(
+                self.processChunkAsync(store, entry, repoPath, outputFolder, mapping, manifest, limiter, semaphore, max_retries)
+                for entry in batch
+            ))
+            if run.stop_reason is not None:
+                break
+        report = self.samplingReports[os.path.normpath(outputFolder)] = run.report(aggregator)
+        logging.info(f"Sampled review of {repoPath}: {report}")
+
+    async def processChunkAsync(self, store, entry, repoPath, outputFolder, mapping, manifest, limiter, semaphore, max_retries=5):
+        self.telemetry.add("review_queue_depth", 1)
+        async with semaphore:
+            self.telemetry.add("review_queue_depth", -1)
+            logging.info(f"\tProcessing chunk: {self.chunkRef(repoPath, entry)}")
+            try:
+                # chunks are only read from the store once a slot is free
+                code = self.reviewInput(store, entry, repoPath)
+                review = await self.getOutputAsync(code, entry, limiter, max_retries)
+                self.saveOutput(entry, repoPath, review, outputFolder, mapping, manifest)
+                self.telemetry.inc("chunks_total", outcome="reviewed")
+            except Exception as e:
+                self.telemetry.inc("chunks_total", outcome="failed")
+                self.logger.info(f"Error processing chunk {self.chunkRef(repoPath, entry)}: {str(e)}")
+
+    async def getOutputAsync(self, code, entry, limiter, max_retries=5):
+        if self.cascade is None:
+            return await self.cachedReviewAsync(code, MODEL, limiter, max_retries)
+        route, reason = self.cascade.route(entry, code, self.estimateTokens(code))
+        models = [MODEL if route == "large" else self.cascade.small_model]
+        review = await self.cachedReviewAsync(code, models[0], limiter, max_retries)
+        escalation = self.cascade.escalation(review) if route == "triage" else None
+        if escalation is not None:
+            models.append(MODEL)
+            review = await self.cachedReviewAsync(code, MODEL, limiter, max_retries)
+        self.recordCascade(code, route, reason, escalation, models)
+        return review
+
+    async def cachedReviewAsync(self, code, model, limiter, max_retries=5):
+        key = self.cacheKey(code, model) if self.cache is not None else None
+        # cache hits never touch the rate limiter; the SQLite work stays off the event loop
+        review = await asyncio.to_thread(self.cache.get, key, self.reviewModel) if key else None
+        if review is None:
+            review = await self.requestReviewAsync(code, limiter, max_retries, model)
+            if key:
+                await asyncio.to_thread(self.cache.put, key, review, self.sysPrompt, model)
+        return review
+
+    async def requestReviewAsync(self, code, limiter, max_retries=5, model=MODEL):
+        for attempt in range(max_retries + 1):
+            with self.telemetry.stage("rate_limit_wait"):
+                await limiter.acquire(self.estimateTokens(code))
+            try:
+                with self.telemetry.inflight("llm_requests_in_flight"):
+                    review = await self.llm.acreate(model=model, messages=self.buildMessages(code), response_model=self.reviewModel)
+            except Exception as e:
+                if self.isThrottleError(e) and attempt < max_retries:
+                    limiter.on_throttle(self.retryAfter(e))
+                    continue
+                raise
+            limiter.on_success()
+            return review
+
+    def finalScores(self, repoPath):
+        outputFolder = os.path.join(repoPath, "output_data")
+        os.makedirs(outputFolder, exist_ok=True)
+        extra = {"weighting": self.weighting}
+        sampling = self.samplingReports.get(os.path.normpath(outputFolder))
+        if sampling is not None:
+            extra["sampling"] = sampling
+        fixedScores = None
+        metrics = self.repoStaticMetrics(repoPath) if self.staticMetrics else {}
+        if metrics:
+            extra["static_metrics"] = repo_metrics(metrics)
+            fixedScores = static_scores(extra["static_metrics"])
+        with self.telemetry.stage("aggregate"):
+            self.aggregator(outputFolder).write_summary(
+                os.path.join(outputFolder, "scores_summary.json"),
+                population=sampling["population"] if sampling else None, fixed_scores=fixedScores, **extra
+            )
+        # the repo is done; a later review of it replays the score log again
+        self.aggregators.pop(os.path.normpath(outputFolder)).close()
+        self.samplingReports.pop(os.path.normpath(outputFolder), None)
 
 if __name__ == "__main__":
     base_path = "./cloned_repos"
-    code_analyser = CodeAnalyser()
-    code_analyser.processRepos(base_path)
\ No newline at end of file
+    code_analyser = CodeAnalyser(
+        cache=ReviewCache("./review_cache.sqlite3"),
+        similarity=SimilarityIndex(os.path.join(base_path, "similarity.sqlite3")),
+        static_metrics=True,
+    )
+    # drop reviews produced by earlier versions of the system prompt
+    code_analyser.cache.invalidate(code_analyser.sysPrompt, keep_current=True)
+    code_analyser.processReposAsync(base_path)
+    code_analyser.telemetry.write_report(os.path.join(base_path, "review_run_report.json"))
+    code_analyser.telemetry.write_prometheus(os.path.join(base_path, "review_metrics.prom"))
\ No newline at end of file
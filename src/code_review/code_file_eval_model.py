@@ -41,4 +41,24 @@ class CodeReviewModel(BaseModel):
     technical_complexity: CodeReviewCategory
 
     # Final Evaluation
-    # final_remarks: str = Field(..., description="Final remarks summarizing the review")
\ No newline at end of file
+    # final_remarks: str = Field(..., description="Final remarks summarizing the review")
+
+class SemanticCodeReviewModel(BaseModel):
+    # CodeReviewModel without the categories static analysis measures
+    # (commenting, consistency, test_coverage, complexity_score)
+    readability: CodeReviewCategory
+    maintainability: CodeReviewCategory
+
+    correctness: CodeReviewCategory
+    completeness: CodeReviewCategory
+    error_handling: CodeReviewCategory
+
+    efficiency: CodeReviewCategory
+    scalability: CodeReviewCategory
+
+    security: CodeReviewCategory
+
+    innovation: CodeReviewCategory
+    creativity: CodeReviewCategory
+
+    technical_complexity: CodeReviewCategory
\ No newline at end of file
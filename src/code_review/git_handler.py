@@ -1,31 +1,152 @@
 import pygit2
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import time
 import shutil
+from telemetry import Telemetry, get_telemetry
+
+
+class FetchAborted(Exception):
+    """Raised when a clone or fetch exceeds its size or time cap."""
+
+
+class CappedCallbacks(pygit2.RemoteCallbacks):
+    """Aborts a transfer once it has received too many bytes or run for too long."""
+
+    def __init__(self, max_bytes: int = None, timeout: float = None):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def transfer_progress(self, stats):
+        if self.max_bytes and stats.received_bytes > self.max_bytes:
+            raise FetchAborted(f"exceeded size cap of {self.max_bytes} bytes")
+        if self.deadline and time.monotonic() > self.deadline:
+            raise FetchAborted("exceeded time cap")
+
 
 class GitHandler:
-    def __init__(self):
+    def __init__(self, bare: bool = False, depth: int = 0, branch: str = None,
+                 max_bytes: int = None, timeout: float = None, telemetry: Telemetry = None):
+        """
+        Args:
+            bare (bool): Clone into an object-only store (no working tree) at <repo>/.git.
+            depth (int): Shallow clone/fetch depth, 0 for full history.
+            branch (str): Only fetch this branch instead of every branch.
+            max_bytes (int): Abort a clone or fetch that transfers more than this.
+            timeout (float): Abort a clone or fetch that runs longer than this many seconds.
+        """
         self.logger = logging.getLogger(__name__)
+        self.bare = bare
+        self.depth = depth
+        self.branch = branch
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.telemetry = telemetry or get_telemetry()
+
+    def _callbacks(self):
+        if self.max_bytes or self.timeout:
+            return CappedCallbacks(self.max_bytes, self.timeout)
+        return None
+
+    def _create_remote(self, repo, name, url):
+        if self.branch:
+            return repo.remotes.create(name, url, f"+refs/heads/{self.branch}:refs/remotes/{name}/{self.branch}")
+        return repo.remotes.create(name, url)
 
     def clone_repository(self, url: str, base_path: str) -> pygit2.Repository:
         path = os.path.join(base_path, url.split("/")[-1])
+        with self.telemetry.scope(repo=os.path.basename(path)):
+            return self._clone_repository(url, path)
+
+    def _clone_repository(self, url: str, path: str) -> pygit2.Repository:
+        if os.path.exists(path):
+            if os.path.exists(os.path.join(path, '.git')):
+                self.logger.info(f"Repository already exists at path: {path}")
+                return self.update_repository(path)
+            else:
+                self.logger.warning(f"Directory exists but is not a Git repository: {path}")
+                shutil.rmtree(path)
+
         try:
-            if os.path.exists(path):
-                if os.path.exists(os.path.join(path, '.git')):
-                    self.logger.info(f"Repository already exists at path: {path}")
-                    # return pygit2.Repository(path)
-                else:
-                    self.logger.warning(f"Directory exists but is not a Git repository: {path}")
-                    shutil.rmtree(path)
-            
             self.logger.info(f"Cloning repository to: {path}")
-            pygit2.clone_repository(url, path)
+            with self.telemetry.stage("clone"):
+                return pygit2.clone_repository(
+                    url,
+                    os.path.join(path, '.git') if self.bare else path,
+                    bare=self.bare,
+                    remote=self._create_remote,
+                    checkout_branch=self.branch,
+                    callbacks=self._callbacks(),
+                    depth=self.depth,
+                )
 
-        except pygit2.GitError as e:
+        except (pygit2.GitError, FetchAborted) as e:
+            self.telemetry.inc("clones_failed_total", reason=type(e).__name__)
             self.logger.error(f"Error while cloning repository: {e}")
+            # never leave a half-written clone behind for the next run to trip over
+            shutil.rmtree(path, ignore_errors=True)
             raise e
-        
+
+    def clone_repositories(self, urls: List[str], base_path: str, max_workers: int = 4) -> dict:
+        """
+        Clone or fetch many repositories with at most max_workers transfers in flight.
+
+        Returns:
+            dict: url -> pygit2.Repository, or the exception that aborted it.
+        """
+        def clone(url):
+            try:
+                return self.clone_repository(url, base_path)
+            except Exception as e:
+                return e
+            finally:
+                self.telemetry.add("clone_queue_depth", -1)
+
+        self.telemetry.add("clone_queue_depth", len(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(urls, pool.map(clone, urls)))
+
+    def update_repository(self, path: str) -> pygit2.Repository:
+        try:
+            repo = pygit2.Repository(path)
+            with self.telemetry.stage("fetch"):
+                repo.remotes["origin"].fetch(callbacks=self._callbacks(), depth=self.depth)
+            remote_ref = repo.lookup_reference(f"refs/remotes/origin/{repo.head.shorthand}")
+            if not repo.is_bare:
+                repo.checkout_tree(repo.get(remote_ref.target), strategy=pygit2.GIT_CHECKOUT_FORCE)
+            repo.lookup_reference(repo.head.name).set_target(remote_ref.target)
+            self.logger.info(f"Updated repository at {path} to {remote_ref.target}")
+            return repo
+        except (pygit2.GitError, KeyError, FetchAborted) as e:
+            self.telemetry.inc("fetches_failed_total", reason=type(e).__name__)
+            self.logger.error(f"Error while updating repository: {e}")
+            raise e
+
+    def get_changed_files(self, repo: pygit2.Repository, old_sha: str, new_sha: str):
+        """Return the (added or modified, deleted) file paths between two commits."""
+        try:
+            old_tree = repo.revparse_single(old_sha).peel(pygit2.Tree)
+            new_tree = repo.revparse_single(new_sha).peel(pygit2.Tree)
+            diff = repo.diff(old_tree, new_tree)
+            diff.find_similar()
+        except (pygit2.GitError, KeyError) as e:
+            self.logger.error(f"Error while diffing {old_sha}..{new_sha}: {e}")
+            raise e
+
+        changed, deleted = set(), set()
+        for delta in diff.deltas:
+            if delta.status == pygit2.GIT_DELTA_DELETED:
+                deleted.add(delta.old_file.path)
+            elif delta.status == pygit2.GIT_DELTA_RENAMED:
+                deleted.add(delta.old_file.path)
+                changed.add(delta.new_file.path)
+            else:
+                changed.add(delta.new_file.path)
+        return changed, deleted
+
     def get_latest_commit(self, repo: pygit2.Repository) -> pygit2.Commit:
         try:
             return repo.head.peel(pygit2.Commit)
@@ -33,16 +154,28 @@ class GitHandler:
             self.logger.error(f"Error while getting latest commit: {e}")
             raise e
 
+    def walk_tree(self, repo: pygit2.Repository, tree: pygit2.Tree = None, prefix: str = ""):
+        """Yield (path, blob id) for every file in a tree, HEAD's by default."""
+        if tree is None:
+            tree = self.get_latest_commit(repo).tree
+        for entry in tree:
+            path = f"{prefix}{entry.name}"
+            if entry.type_str == "tree":
+                yield from self.walk_tree(repo, repo[entry.id], f"{path}/")
+            elif entry.type_str == "blob":
+                yield path, str(entry.id)
+
     def get_file_content(self, repo: pygit2.Repository, file_path: str) -> str:
+        """Read a file from HEAD straight out of the object database."""
         try:
-            file = repo[file_path]
-            return file.data.decode("utf-8")
-        except pygit2.GitError as e:
+            entry = self.get_latest_commit(repo).tree[file_path]
+            return repo[entry.id].data.decode("utf-8")
+        except (pygit2.GitError, KeyError) as e:
             self.logger.error(f"Error while getting file content: {e}")
             raise e
 
 if __name__ == "__main__":
     url = "https://github.com/woaitsAryan/regit"
     base_path = "./cloned_repos"
-    git_handler = GitHandler()
-    repo = git_handler.clone_repository(url, base_path)
\ No newline at end of file
+    git_handler = GitHandler(bare=True, depth=1, max_bytes=200 * 1024 * 1024, timeout=120)
+    repo = git_handler.clone_repository(url, base_path)
@@ -0,0 +1,203 @@
+"""
+Review Pipeline
+
+Clones, chunks and reviews repos as overlapping stages joined by bounded
+queues: while one repo is under review the next is chunking and the one after
+that is cloning. A full queue blocks the stage feeding it, so at most a fixed
+number of repos are in flight however many submissions there are.
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from git_handler import GitHandler
+from chunker import ChunkExtractor
+from code_analyser import CodeAnalyser
+from cascade import CascadePolicy
+from rate_limiter import RateLimiter
+from review_cache import ReviewCache
+from similarity import SimilarityIndex
+from telemetry import get_telemetry
+
+# kept when a clone is cleaned up; a later run re-clones and rechunks, but the
+# review cache still answers for every unchanged chunk
+KEEP_AFTER_REVIEW = {"output_data"}
+
+
+class ReviewPipeline:
+    def __init__(self, git: GitHandler = None, extractor: ChunkExtractor = None, analyser: CodeAnalyser = None,
+                 clone_workers: int = 4, chunk_workers: int = 2, review_workers: int = 2, queue_size: int = 2,
+                 concurrency: int = 8, requests_per_minute: int = 30, tokens_per_minute: int = 6000,
+                 max_retries: int = 5, cleanup: bool = False):
+        """
+        Args:
+            clone_workers (int): Clones or fetches in flight.
+            chunk_workers (int): Repos chunked at once.
+            review_workers (int): Repos under review at once. They share the
+                concurrency slots and the rate limit, so one repo's last few
+                chunks never leave the LLM idle.
+            queue_size (int): Repos waiting between two stages before the
+                upstream stage blocks.
+            cleanup (bool): Delete each clone once it is reviewed, keeping only its
+                reviews and scores, so disk use stays bounded by the repos in flight.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.git = git or GitHandler()
+        self.extractor = extractor or ChunkExtractor()
+        self.analyser = analyser or CodeAnalyser()
+        self.clone_workers = clone_workers
+        self.chunk_workers = chunk_workers
+        self.review_workers = review_workers
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.cleanup = cleanup
+        self.telemetry = get_telemetry()
+
+    def run(self, base_path: str, urls=None):
+        """
+        Review every repo in urls, cloned under base_path. Without urls, review
+        the repos already under base_path, starting at the chunk stage.
+        """
+        return asyncio.run(self._run(base_path, urls))
+
+    async def _run(self, base_path, urls):
+        os.makedirs(base_path, exist_ok=True)
+        mapping = {}
+        limiter = RateLimiter(requests_per_minute=self.requests_per_minute, tokens_per_minute=self.tokens_per_minute)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        clone_queue = asyncio.Queue(self.queue_size)
+        chunk_queue = asyncio.Queue(self.queue_size)
+        review_queue = asyncio.Queue(self.queue_size)
+
+        async def clone(url):
+            return await asyncio.to_thread(self.cloneRepo, url, base_path)
+
+        async def chunk(repo_path):
+            return await asyncio.to_thread(self.chunkRepo, repo_path)
+
+        async def review(repo_path):
+            await self.reviewRepo(repo_path, mapping, limiter, semaphore)
+
+        stages = [
+            self.stage("chunk", chunk, chunk_queue, self.chunk_workers, review_queue, "review", self.review_workers),
+            self.stage("review", review, review_queue, self.review_workers),
+        ]
+        if urls is None:
+            repo_paths = sorted(path for path in Path(base_path).iterdir() if path.is_dir())
+            stages.append(self.feed(chunk_queue, repo_paths, "chunk", self.chunk_workers))
+        else:
+            stages.append(self.stage("clone", clone, clone_queue, self.clone_workers, chunk_queue, "chunk", self.chunk_workers))
+            stages.append(self.feed(clone_queue, urls, "clone", self.clone_workers))
+        await asyncio.gather(*stages)
+        await self.analyser.llm.aclose()
+
+        self.extractor.reportOverlap(Path(base_path))
+        with open(os.path.join(base_path, "file_output_mapping.json"), "w") as f:
+            json.dump(mapping, f, indent=2)
+        if self.analyser.cache is not None:
+            self.logger.info(f"Review cache stats: {self.analyser.cache.stats()}")
+        self.analyser.saveCascadeReport(base_path)
+
+    async def feed(self, queue, items, name, workers):
+        for item in items:
+            await self.put(queue, item, name)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def put(self, queue, item, name):
+        # blocks while the next stage is behind; this is the backpressure
+        await queue.put(item)
+        self.telemetry.set("pipeline_queue_depth", queue.qsize(), stage=name)
+
+    async def stage(self, name, handle, inbox, workers, outbox=None, next_stage=None, next_workers=0):
+        """
+        Run workers that take items from inbox until they receive None, passing
+        every result that is not None on to outbox. Once all workers are done,
+        each of the next stage's workers gets a None.
+        """
+        async def worker():
+            while True:
+                item = await inbox.get()
+                self.telemetry.set("pipeline_queue_depth", inbox.qsize(), stage=name)
+                if item is None:
+                    return
+                try:
+                    result = await handle(item)
+                except Exception as e:
+                    self.telemetry.inc("pipeline_failures_total", stage=name)
+                    self.logger.error(f"Pipeline {name} stage failed for {item}: {str(e)}")
+                    continue
+                if result is not None and outbox is not None:
+                    await self.put(outbox, result, next_stage)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            for _ in range(next_workers):
+                await outbox.put(None)
+
+    def cloneRepo(self, url, base_path):
+        self.git.clone_repository(url, base_path)
+        return Path(base_path) / url.split("/")[-1]
+
+    def chunkRepo(self, repo_path):
+        with self.telemetry.scope(repo=repo_path.name), self.telemetry.stage("chunk"):
+            self.extractor.processRepoIncremental(repo_path)
+        return repo_path
+
+    async def reviewRepo(self, repo_path, mapping, limiter, semaphore):
+        logging.info(f"Processing repo: {repo_path}")
+        with self.telemetry.scope(repo=repo_path.name):
+            with self.telemetry.stage("review"):
+                await self.analyser.processRepoAsync(str(repo_path), mapping, limiter, semaphore, self.max_retries)
+            self.analyser.finalScores(str(repo_path))
+        if self.cleanup:
+            self.removeClone(repo_path)
+
+    def removeClone(self, repo_path):
+        for path in repo_path.iterdir():
+            if path.name in KEEP_AFTER_REVIEW:
+                continue
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clone, chunk and review repos as one overlapping pipeline.")
+    parser.add_argument("--base-path", default="./cloned_repos")
+    parser.add_argument("--urls", help="File with one repo URL per line; reviews the repos under --base-path if omitted")
+    parser.add_argument("--clone-workers", type=int, default=4)
+    parser.add_argument("--chunk-workers", type=int, default=2)
+    parser.add_argument("--review-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--cascade", action="store_true", help="Triage chunks with a small model before the large one")
+    parser.add_argument("--cleanup", action="store_true", help="Delete each clone once it is reviewed")
+    args = parser.parse_args()
+
+    urls = None
+    similarity = SimilarityIndex(os.path.join(args.base_path, "similarity.sqlite3"))
+    if args.urls:
+        with open(args.urls) as f:
+            urls = [line.strip() for line in f if line.strip()]
+    pipeline = ReviewPipeline(
+        git=GitHandler(bare=True, depth=1, max_bytes=200 * 1024 * 1024, timeout=120),
+        extractor=ChunkExtractor(similarity=similarity, token_budget=2000),
+        analyser=CodeAnalyser(cache=ReviewCache("./review_cache.sqlite3"), similarity=similarity,
+                              cascade=CascadePolicy() if args.cascade else None, static_metrics=True),
+        clone_workers=args.clone_workers,
+        chunk_workers=args.chunk_workers,
+        review_workers=args.review_workers,
+        queue_size=args.queue_size,
+        cleanup=args.cleanup,
+    )
+    pipeline.run(args.base_path, urls)
+    pipeline.telemetry.write_report(os.path.join(args.base_path, "pipeline_run_report.json"))
+    pipeline.telemetry.write_prometheus(os.path.join(args.base_path, "pipeline_metrics.prom"))
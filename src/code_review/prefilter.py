@@ -0,0 +1,311 @@
+import os
+import re
+import logging
+from pathlib import Path
+from collections import defaultdict
+import pygit2
+
+# directories that hold dependencies, environments, build output or our own pipeline state
+SKIPPED_DIRS = {
+    ".git", ".hg", ".svn",
+    "node_modules", "bower_components", "jspm_packages", "vendor", "third_party", "Pods", "Carthage",
+    "venv", ".venv", "virtualenv", "site-packages", "__pycache__", ".tox", ".nox",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".gradle", ".idea", ".vscode",
+    "build", "dist", "target", "out", "obj", ".next", ".nuxt", ".svelte-kit", ".angular",
+    "coverage", "htmlcov", ".terraform",
+    "chunk_data", "output_data",
+}
+
+GENERATED_FILES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "npm-shrinkwrap.json", "bun.lockb",
+    "poetry.lock", "Pipfile.lock", "pdm.lock", "uv.lock", "Cargo.lock", "composer.lock",
+    "Gemfile.lock", "go.sum", "mix.lock", "pubspec.lock", "Podfile.lock",
+}
+
+GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".map", ".bundle.js", ".chunk.js",
+    "_pb2.py", "_pb2_grpc.py", ".pb.go", ".pb.cc", ".pb.h", ".g.dart", ".freezed.dart", ".designer.cs",
+)
+
+
+def blob_size(repo: pygit2.Repository, blob_id) -> int:
+    # pygit2 1.19.2+ reads only the object header; before that the blob is loaded
+    read_header = getattr(repo.odb, "read_header", None)
+    if read_header is not None:
+        return read_header(blob_id)[1]
+    return repo[blob_id].size
+
+
+def translate_glob(pattern: str) -> str:
+    """Regex for a .gitignore glob: * and ? stop at /, ** spans directories."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern == "**":
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    The .gitignore patterns of a tree, for object-only clones, which have no
+    worktree for pygit2 to match paths against. Patterns of deeper .gitignore
+    files come later, and the last pattern that matches a path decides.
+    info/exclude and core.excludesFile are not read.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rules)
+
+    def extend(self, base: str, text: str):
+        """Rules with the patterns of the .gitignore file in directory base ("" or "dir/") added."""
+        rules = list(self.rules)
+        for line in text.splitlines():
+            rule = self.compile(base, line)
+            if rule is not None:
+                rules.append(rule)
+        return IgnoreRules(rules)
+
+    @staticmethod
+    def compile(base: str, line: str):
+        line = line.rstrip("\r")
+        if not line.strip() or line.startswith("#"):
+            return None
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        negated = line.startswith("!")
+        if negated or line.startswith(("\\#", "\\!")):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # a slash anywhere but the end anchors the pattern to its .gitignore's directory
+        anchored = "/" in line
+        regex = re.escape(base) + ("" if anchored else "(?:.*/)?") + translate_glob(line.lstrip("/"))
+        return re.compile(regex + "$"), negated, dir_only
+
+    def ignored(self, rel_path: str) -> bool:
+        """Whether a path is ignored; directories are given with a trailing slash."""
+        is_dir = rel_path.endswith("/")
+        rel_path = rel_path.rstrip("/")
+        ignored = False
+        for regex, negated, dir_only in self.rules:
+            if (is_dir or not dir_only) and regex.match(rel_path):
+                ignored = not negated
+        return ignored
+
+
+class Prefilter:
+    """
+    Decides which repository files are worth chunking before any are read in full.
+
+    Directories are pruned as a whole, so vendored and ignored trees are never
+    walked. Files are then rejected by name, .gitignore, size and finally by
+    sampling their head for binary or minified content. Every skip is recorded
+    with its reason. Object-only clones are matched against the .gitignore
+    files of HEAD's tree, and a blob is only loaded once its path has passed.
+    """
+
+    def __init__(self, detect_language=None, max_file_bytes: int = 512 * 1024, sample_bytes: int = 8192,
+                 max_line_length: int = 1000, skipped_dirs=SKIPPED_DIRS):
+        self.logger = logging.getLogger(__name__)
+        self.detect_language = detect_language
+        self.max_file_bytes = max_file_bytes
+        self.sample_bytes = sample_bytes
+        self.max_line_length = max_line_length
+        self.skipped_dirs = set(skipped_dirs)
+
+    def check_dir(self, repo_path: Path, rel_dir: str, repo: pygit2.Repository = None, rules: IgnoreRules = None):
+        name = rel_dir.rsplit("/", 1)[-1]
+        if name in self.skipped_dirs:
+            return "vendored"
+        if (repo_path / rel_dir / "pyvenv.cfg").is_file():
+            return "vendored"
+        if self.is_ignored(repo, rel_dir + "/", rules):
+            return "gitignored"
+        return None
+
+    def check_file(self, rel_path: str, read_size, read_sample, repo: pygit2.Repository = None,
+                   rules: IgnoreRules = None):
+        """read_size and read_sample are only called for files not already rejected by path."""
+        name = rel_path.rsplit("/", 1)[-1]
+        if name in GENERATED_FILES or name.endswith(GENERATED_SUFFIXES):
+            return "generated"
+        if self.detect_language is not None and self.detect_language(rel_path) == 'unknown':
+            return "unsupported_language"
+        if self.is_ignored(repo, rel_path, rules):
+            return "gitignored"
+        if read_size() > self.max_file_bytes:
+            return "too_large"
+        return self.check_sample(read_sample())
+
+    def check_sample(self, sample: bytes):
+        if b"\0" in sample:
+            return "binary"
+        try:
+            text = sample.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # a multi-byte character cut off at the end of the sample is fine
+            if e.start < len(sample) - 4:
+                return "binary"
+            text = sample[:e.start].decode("utf-8")
+        lines = text.splitlines() or [""]
+        # minified bundles are a handful of enormous lines
+        if max(len(line) for line in lines) > self.max_line_length and len(text) / len(lines) > self.max_line_length / 4:
+            return "minified"
+        if "@generated" in text[:1024] or "DO NOT EDIT" in text[:1024]:
+            return "generated"
+        return None
+
+    def is_ignored(self, repo: pygit2.Repository, rel_path: str, rules: IgnoreRules = None) -> bool:
+        if rules is not None:
+            # object-only clone, matched against the .gitignore files of its tree
+            return rules.ignored(rel_path)
+        if repo is None or repo.is_bare:
+            return False
+        try:
+            return repo.path_is_ignored(rel_path)
+        except pygit2.GitError:
+            return False
+
+    def open_repo(self, repo_path: Path):
+        try:
+            return pygit2.Repository(str(repo_path))
+        except pygit2.GitError:
+            return None
+
+    def scan(self, repo_path):
+        """
+        Walk a repository and return (kept files, report).
+
+        Kept files are sorted (file path, blob id) pairs; blob ids are only set
+        for object-only clones, which are walked through HEAD's tree.
+        """
+        repo_path = Path(repo_path)
+        repo = self.open_repo(repo_path)
+        skipped = defaultdict(list)
+        if repo is not None and repo.is_bare:
+            kept = [] if repo.head_is_unborn else self._scan_tree(repo_path, repo, repo.head.peel(pygit2.Commit).tree, "",
+                                                                  skipped, IgnoreRules())
+        else:
+            kept = self._scan_worktree(repo_path, repo, skipped)
+        kept.sort()
+        report = {
+            "kept": len(kept),
+            "skipped": {reason: len(paths) for reason, paths in skipped.items()},
+            "skipped_paths": dict(skipped),
+        }
+        return kept, report
+
+    def _scan_worktree(self, repo_path: Path, repo, skipped):
+        kept = []
+        for dirpath, dirnames, filenames in os.walk(repo_path):
+            rel_dir = Path(dirpath).relative_to(repo_path).as_posix()
+            rel_dir = "" if rel_dir == "." else rel_dir + "/"
+            # prune in place so os.walk never descends into skipped trees
+            for dirname in list(dirnames):
+                reason = self.check_dir(repo_path, rel_dir + dirname, repo)
+                if reason:
+                    skipped[reason].append(rel_dir + dirname + "/")
+                    dirnames.remove(dirname)
+            for filename in filenames:
+                file_path = Path(dirpath) / filename
+                rel_path = rel_dir + filename
+                try:
+                    reason = self.check_file(rel_path, lambda: file_path.stat().st_size,
+                                             lambda: self._read_head(file_path), repo)
+                except OSError:
+                    reason = "unreadable"
+                if reason:
+                    skipped[reason].append(rel_path)
+                else:
+                    kept.append((file_path, None))
+        return kept
+
+    def _scan_tree(self, repo_path: Path, repo, tree, prefix, skipped, rules):
+        kept = []
+        rules = self.gitignore_rules(repo, tree, prefix, rules)
+        for entry in tree:
+            rel_path = f"{prefix}{entry.name}"
+            if entry.type_str == "tree":
+                reason = self.check_dir(repo_path, rel_path, repo, rules)
+                if reason:
+                    skipped[reason].append(rel_path + "/")
+                else:
+                    kept.extend(self._scan_tree(repo_path, repo, repo[entry.id], rel_path + "/", skipped, rules))
+            elif entry.type_str == "blob":
+                # only files that pass the path checks are looked up, and only those under the size cap loaded
+                reason = self.check_file(rel_path, lambda: blob_size(repo, entry.id),
+                                         lambda: repo[entry.id].data[:self.sample_bytes], repo, rules)
+                if reason:
+                    skipped[reason].append(rel_path)
+                else:
+                    kept.append((repo_path / rel_path, str(entry.id)))
+        return kept
+
+    @staticmethod
+    def gitignore_rules(repo, tree, prefix: str, rules: IgnoreRules) -> IgnoreRules:
+        """rules plus the patterns of the tree's own .gitignore, if it has one."""
+        if ".gitignore" not in tree:
+            return rules
+        entry = tree[".gitignore"]
+        if entry.type_str != "blob":
+            return rules
+        return rules.extend(prefix, repo[entry.id].data.decode("utf-8", errors="replace"))
+
+    def _read_head(self, file_path: Path) -> bytes:
+        with open(file_path, "rb") as f:
+            return f.read(self.sample_bytes)
+
+    def check_path(self, repo_path, rel_path: str, repo=None, blob_id: str = None):
+        """Check a single file and all of its parent directories, e.g. for files from a diff."""
+        repo_path = Path(repo_path)
+        parts = rel_path.split("/")
+        tree = rules = None
+        if blob_id is not None:
+            # object-only clone: the .gitignore files come from HEAD's tree, read along the path
+            tree = repo.head.peel(pygit2.Commit).tree
+            rules = self.gitignore_rules(repo, tree, "", IgnoreRules())
+        for depth in range(1, len(parts)):
+            rel_dir = "/".join(parts[:depth])
+            reason = self.check_dir(repo_path, rel_dir, repo, rules)
+            if reason:
+                return reason
+            if tree is not None:
+                name = parts[depth - 1]
+                tree = repo[tree[name].id] if name in tree and tree[name].type_str == "tree" else None
+                if tree is not None:
+                    rules = self.gitignore_rules(repo, tree, rel_dir + "/", rules)
+        if blob_id is not None:
+            return self.check_file(rel_path, lambda: blob_size(repo, blob_id),
+                                   lambda: repo[blob_id].data[:self.sample_bytes], repo, rules)
+        file_path = repo_path / rel_path
+        return self.check_file(rel_path, lambda: file_path.stat().st_size, lambda: self._read_head(file_path), repo)
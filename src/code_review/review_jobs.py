@@ -0,0 +1,234 @@
+"""
+Review Jobs
+
+Runs the code review pipeline (clone -> chunk -> review -> aggregate) through
+the durable JobQueue, so several worker processes can drain one run and a
+restart resumes where the previous run stopped without repeating API calls.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from pathlib import Path
+from job_queue import JobQueue, DONE, PENDING
+from git_handler import GitHandler
+from chunker import ChunkExtractor
+from chunk_store import ChunkStore
+from code_analyser import CodeAnalyser, SCORES_LOG
+from review_cache import ReviewCache
+from score_aggregator import ScoreAggregator
+from telemetry import get_telemetry
+
+CLONE = "clone"
+CHUNK = "chunk"
+REVIEW = "review"
+AGGREGATE = "aggregate"
+
+
+def repo_name(url: str) -> str:
+    return url.rstrip("/").split("/")[-1]
+
+
+def review_key(repo: str, entry: dict) -> str:
+    # keyed by content, so a rechunked chunk gets a new job and an unchanged one keeps its done job
+    return f"{repo}#{entry['id']}@{entry['hash'][:16]}"
+
+
+class ReviewJobs:
+    """
+    Job handlers for one repo at a time per stage. Reviews of the same repo run
+    in parallel across workers; a repo's aggregate job waits until none of its
+    reviews are pending or leased.
+    """
+
+    def __init__(self, queue: JobQueue, base_path: str, git: GitHandler = None, extractor: ChunkExtractor = None,
+                 analyser: CodeAnalyser = None, throttle: float = 0.75):
+        """
+        Args:
+            base_path (str): Folder repos are cloned into.
+            throttle (float): Pause after each review request, as the serial pipeline does.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue
+        self.base_path = base_path
+        self.git = git or GitHandler()
+        self.extractor = extractor or ChunkExtractor()
+        self.analyser = analyser or CodeAnalyser()
+        self.analyser.compactScores = False
+        self.throttle = throttle
+        self.telemetry = get_telemetry()
+
+    def handlers(self) -> dict:
+        if self.analyser.cache is None:
+            # a review job can crash after its API call; only the cache keeps the retry from repeating it
+            raise ValueError("Review jobs need a CodeAnalyser with a review cache")
+        return {CLONE: self.clone, CHUNK: self.chunk, REVIEW: self.review, AGGREGATE: self.aggregate}
+
+    def enqueue_urls(self, urls):
+        for url in urls:
+            self.queue.enqueue(CLONE, url, {"url": url}, group=repo_name(url))
+
+    def enqueue_local(self, root_folder):
+        """Queue repos that are already cloned (or unpacked) under root_folder for chunking."""
+        for repo_path in sorted(Path(root_folder).iterdir()):
+            if repo_path.is_dir():
+                self.enqueue_chunk(repo_path)
+
+    def enqueue_chunk(self, repo_path: Path):
+        _, commit = self.extractor.headCommit(repo_path)
+        key = f"{repo_path.name}@{commit or 'worktree'}"
+        # chunk jobs of one repo never run at once, since they rewrite the same chunk store
+        if self.queue.enqueue(CHUNK, key, {"repo_path": str(repo_path)}, group=repo_path.name, after=CHUNK):
+            # a newer commit supersedes any chunk job still waiting for the same repo
+            self.queue.cancel(CHUNK, repo_path.name, [key])
+
+    def stale(self, job) -> bool:
+        """
+        A chunk job must not write once its lease is lost, or once a newer chunk
+        job for its repo is waiting (enqueue_chunk cancels the older waiting ones).
+        """
+        lease_lost = job.get("lease_lost")
+        if lease_lost is not None and lease_lost.is_set():
+            return True
+        return any(key != job["key"] and state == PENDING for key, state in self.queue.states(CHUNK, job["group"]).items())
+
+    def clone(self, job):
+        url = job["payload"]["url"]
+        self.git.clone_repository(url, self.base_path)
+        self.enqueue_chunk(Path(self.base_path) / repo_name(url))
+
+    def chunk(self, job):
+        repo_path = Path(job["payload"]["repo_path"])
+        if self.stale(job):
+            self.logger.info(f"Skipping stale chunk job: {job['key']}")
+            return
+        with self.telemetry.scope(repo=repo_path.name), self.telemetry.stage("chunk"):
+            self.extractor.processRepoIncremental(repo_path)
+        if self.stale(job):
+            # whoever holds the job now, or the newer job, rechunks and queues the reviews
+            self.logger.info(f"Chunk job went stale while running: {job['key']}")
+            return
+
+        with ChunkStore(repo_path / "chunk_data") as store:
+            # the entry and store version let a review job read its chunk without parsing the whole index
+            reviews = [
+                (review_key(repo_path.name, entry), {"repo_path": str(repo_path), "chunk_id": entry["id"], "hash": entry["hash"],
+                                                     "entry": entry, "store_version": store.version})
+                for entry in store
+            ]
+        keys = [key for key, _ in reviews]
+        added = self.queue.enqueue_many(REVIEW, reviews, group=repo_path.name)
+        # reviews of chunks that no longer exist would only be skipped
+        self.queue.cancel(REVIEW, repo_path.name, keys)
+        generation = hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()[:16]
+        self.queue.enqueue(AGGREGATE, f"{repo_path.name}@{generation}", {"repo_path": str(repo_path)},
+                           group=repo_path.name, after=REVIEW)
+        self.logger.info(f"Queued {added} new reviews of {len(keys)} chunks: {repo_path}")
+
+    def review(self, job):
+        payload = job["payload"]
+        repo_path = payload["repo_path"]
+        output_folder = os.path.join(repo_path, "output_data")
+        os.makedirs(output_folder, exist_ok=True)
+        with ChunkStore(os.path.join(repo_path, "chunk_data")) as store:
+            entry = store.find(payload["chunk_id"], payload.get("entry"), payload.get("store_version"))
+            if entry is None or entry["hash"] != payload["hash"]:
+                # superseded by a later rechunk
+                return
+            manifest = self.analyser.readManifest(output_folder)
+            if self.analyser.reuseReview(entry, repo_path, output_folder, manifest, {}):
+                return
+            with self.telemetry.scope(repo=os.path.basename(repo_path)):
+                if self.analyser.reuseDuplicate(entry, repo_path, output_folder, {}, manifest):
+                    return
+                # raises on failure so the job is retried; a review that succeeded before a
+                # crash is served from the review cache instead of a second API call
+                review = self.analyser.getOutput(self.analyser.reviewInput(store, entry, repo_path), entry)
+            self.analyser.saveOutput(entry, repo_path, review, output_folder, {}, manifest)
+        time.sleep(self.throttle)
+
+    def aggregate(self, job):
+        repo_path = job["payload"]["repo_path"]
+        repo = os.path.basename(repo_path)
+        output_folder = os.path.normpath(os.path.join(repo_path, "output_data"))
+        os.makedirs(output_folder, exist_ok=True)
+
+        # every review of the repo has finished, so no other worker appends to its score log
+        previous = self.analyser.aggregators.pop(output_folder, None)
+        if previous is not None:
+            previous.close()
+        aggregator = self.analyser.aggregators[output_folder] = ScoreAggregator(os.path.join(output_folder, SCORES_LOG))
+
+        states = self.queue.states(REVIEW, repo)
+        manifest = {}
+        with ChunkStore(os.path.join(repo_path, "chunk_data")) as store:
+            for entry in store:
+                if states.get(review_key(repo, entry)) == DONE and str(entry["id"]) in aggregator:
+                    manifest[str(entry["id"])] = self.analyser.reviewFingerprint(entry)
+        # scores of removed, changed or dead-lettered chunks must not count
+        for chunk_id in [chunk_id for chunk_id in aggregator.items if chunk_id not in manifest]:
+            aggregator.remove(chunk_id)
+            output_file = os.path.join(output_folder, f"{chunk_id}.json")
+            if os.path.exists(output_file):
+                os.remove(output_file)
+
+        self.analyser.saveManifest(repo_path, output_folder, manifest)
+        self.analyser.finalScores(repo_path)
+
+
+def run_worker(queue_path: str, base_path: str, cache_path: str = "./review_cache.sqlite3"):
+    queue = JobQueue(queue_path)
+    cache = ReviewCache(cache_path)
+    analyser = CodeAnalyser(cache=cache, static_metrics=True)
+    # object-only, shallow and size-capped, as in the pipeline
+    git = GitHandler(bare=True, depth=1, max_bytes=200 * 1024 * 1024, timeout=120)
+    processed = queue.work(ReviewJobs(queue, base_path, git=git, analyser=analyser).handlers())
+    logging.info(f"Worker {os.getpid()} finished after {processed} jobs")
+    cache.close()
+    queue.close()
+
+
+def run_workers(queue_path: str, base_path: str, workers: int = 4, cache_path: str = "./review_cache.sqlite3"):
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(queue_path, base_path, cache_path))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the code review pipeline from a durable job queue.")
+    parser.add_argument("--base-path", default="./cloned_repos")
+    parser.add_argument("--queue", default="./review_jobs.sqlite3")
+    parser.add_argument("--cache", default="./review_cache.sqlite3", help="Review cache shared by the workers")
+    parser.add_argument("--urls", help="File with one repo URL per line to clone and review")
+    parser.add_argument("--local", action="store_true", help="Review the repos already under --base-path")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--retry-dead", action="store_true", help="Give dead-lettered jobs another round of attempts")
+    parser.add_argument("--status", action="store_true", help="Print job counts and dead letters, then exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    os.makedirs(args.base_path, exist_ok=True)
+    job_queue = JobQueue(args.queue)
+    if args.status:
+        print(job_queue.counts())
+        for letter in job_queue.dead_letters():
+            print(letter)
+    else:
+        jobs = ReviewJobs(job_queue, args.base_path)
+        if args.urls:
+            with open(args.urls) as f:
+                jobs.enqueue_urls(line.strip() for line in f if line.strip())
+        if args.local:
+            jobs.enqueue_local(args.base_path)
+        if args.retry_dead:
+            job_queue.retry_dead()
+        run_workers(args.queue, args.base_path, args.workers, args.cache)
+    job_queue.close()
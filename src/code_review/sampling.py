@@ -0,0 +1,110 @@
+import math
+import re
+import posixpath
+from chunk_packer import entry_sources
+
+ENTRY_POINT_NAMES = {"main", "app", "index", "server", "__main__", "manage", "cli", "run", "wsgi", "asgi", "application"}
+TEST_PATH = re.compile(r"(^|/)(tests?|spec|specs|__tests__)/|(^|/)test_[^/]*$|_test\.\w+$|\.(test|spec)\.\w+$|Tests?\.\w+$")
+MAIN_GUARD = re.compile(r"if\s+__name__\s*==\s*['\"]__main__['\"]|static\s+void\s+main\s*\(|\bfunc\s+main\s*\(|\bfn\s+main\s*\(")
+BRANCHES = re.compile(r"\b(?:if|elif|for|while|case|catch|except|switch)\b|&&|\|\|")
+
+
+def chunk_importance(entry: dict, text: str) -> float:
+    """
+    Heuristic review priority: entry points and dense, branchy non-test source
+    first, tests and trivial chunks last.
+    """
+    sources = entry_sources(entry)
+    score = 0.0
+    if any(posixpath.splitext(posixpath.basename(source))[0].lower() in ENTRY_POINT_NAMES for source in sources):
+        score += 2.0
+    if MAIN_GUARD.search(text):
+        score += 2.0
+    if all(TEST_PATH.search(source) for source in sources):
+        score -= 3.0
+    lines = max(1, text.count("\n") + 1)
+    # branches per line saturates at roughly one branch every four lines
+    score += min(2.0, 8.0 * len(BRANCHES.findall(text)) / lines)
+    score += min(1.0, math.log10(max(10, len(text))) - 1)
+    return score
+
+
+class SamplingPolicy:
+    """
+    Reviews a repo's chunks in priority order and stops early once every
+    category's score is known precisely enough or a review budget runs out.
+
+    Confidence intervals treat the reviewed chunks as a sample of the repo, with
+    a finite population correction, so they shrink to zero once every chunk is
+    reviewed. Because the sample is ordered by importance rather than drawn at
+    random, the interval describes precision, not bias.
+    """
+
+    def __init__(self, max_half_width: float = 0.5, min_reviews: int = 8, max_tokens: int = None,
+                 max_cost: float = None, z: float = 1.96, batch_size: int = 8):
+        """
+        Args:
+            max_half_width (float): Stop once every category's confidence interval is
+                within +/- this many score points.
+            min_reviews (int): Never stop on convergence before this many reviewed chunks.
+            max_tokens (int): Per-repo budget of estimated tokens for new reviews.
+            max_cost (float): Per-repo budget of estimated USD for new reviews.
+            z (float): Normal quantile of the interval, 1.96 for 95%.
+            batch_size (int): Reviews sent between convergence checks in async mode.
+        """
+        self.max_half_width = max_half_width
+        self.min_reviews = min_reviews
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.z = z
+        self.batch_size = batch_size
+
+    def order(self, store, entries):
+        return sorted(entries, key=lambda entry: (-chunk_importance(entry, store.read(entry)), entry["id"]))
+
+    def start(self, population: int):
+        return SamplingRun(self, population)
+
+
+class SamplingRun:
+    """Budget and stopping state of one repo's sampled review."""
+
+    def __init__(self, policy: SamplingPolicy, population: int):
+        self.policy = policy
+        self.population = population
+        self.requests = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.stop_reason = None
+
+    def admit(self, tokens: int, cost: float) -> bool:
+        """Reserve budget for one more review, or record why the budget is exhausted."""
+        if self.policy.max_tokens is not None and self.tokens + tokens > self.policy.max_tokens:
+            self.stop_reason = "token_budget"
+            return False
+        if self.policy.max_cost is not None and self.cost + cost > self.policy.max_cost:
+            self.stop_reason = "cost_budget"
+            return False
+        self.requests += 1
+        self.tokens += tokens
+        self.cost += cost
+        return True
+
+    def converged(self, aggregator) -> bool:
+        if len(aggregator.items) < self.policy.min_reviews:
+            return False
+        intervals = aggregator.intervals(z=self.policy.z, population=self.population)
+        if intervals and all(width is not None and width <= self.policy.max_half_width for width in intervals.values()):
+            self.stop_reason = "converged"
+            return True
+        return False
+
+    def report(self, aggregator) -> dict:
+        return {
+            "population": self.population,
+            "reviewed": len(aggregator.items),
+            "requests": self.requests,
+            "estimated_tokens": self.tokens,
+            "estimated_cost_usd": round(self.cost, 6),
+            "stopped": self.stop_reason or "complete",
+        }
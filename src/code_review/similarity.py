@@ -0,0 +1,199 @@
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# LSH buckets shared by at least two repos, but not so many that they are common template code
+ELIGIBLE_BUCKETS = """
+    SELECT band, bucket FROM buckets GROUP BY band, bucket
+    HAVING COUNT(DISTINCT repo) BETWEEN 2 AND ?
+"""
+
+
+class MinHasher:
+    """MinHash signatures over token shingles, deterministic across processes and runs."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str):
+        tokens = TOKEN_PATTERN.findall(text)
+        if len(tokens) <= self.shingle_size:
+            return {" ".join(tokens)}
+        return {" ".join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in self.shingles(text)],
+            dtype=np.uint64,
+        )
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        return float(np.mean(first == second))
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over the chunks of every submission.
+
+    Used to find exact and near duplicates of a chunk in other teams' repos, so
+    their review can be reused, and to report team-vs-team code overlap.
+    """
+
+    def __init__(self, db_path: str, num_perm: int = 128, bands: int = 16, threshold: float = 0.8,
+                 max_bucket_repos: int = 20):
+        """
+        Args:
+            db_path (str): SQLite file holding signatures and LSH buckets.
+            num_perm (int): MinHash permutations; must be divisible by bands.
+            bands (int): LSH bands; with 128 permutations, 16 bands of 8 rows give
+                a candidate threshold of roughly 0.7 Jaccard.
+            threshold (float): Estimated Jaccard similarity to count as a near duplicate.
+            max_bucket_repos (int): Buckets shared by more repos than this are treated as
+                common template code and left out of the overlap report.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.max_bucket_repos = max_bucket_repos
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                repo TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                PRIMARY KEY (repo, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (hash);
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                repo TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket);
+            CREATE INDEX IF NOT EXISTS buckets_repo ON buckets (repo);
+        """)
+        self.conn.commit()
+
+    def _buckets(self, signature: np.ndarray):
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+
+    def add_repo(self, repo: str, store):
+        """(Re)index every chunk of a repo's ChunkStore."""
+        chunks, buckets = [], []
+        for entry in store:
+            signature = self.hasher.signature(store.read(entry))
+            chunks.append((repo, entry["id"], entry["hash"], signature.tobytes()))
+            buckets.extend((band, bucket, repo, entry["id"]) for band, bucket in self._buckets(signature))
+
+        with self.lock:
+            self.conn.execute("DELETE FROM chunks WHERE repo = ?", (repo,))
+            self.conn.execute("DELETE FROM buckets WHERE repo = ?", (repo,))
+            self.conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", chunks)
+            self.conn.executemany("INSERT INTO buckets VALUES (?, ?, ?, ?)", buckets)
+            self.conn.commit()
+        self.logger.info(f"Indexed {len(chunks)} chunks for similarity: {repo}")
+
+    def _signature(self, repo: str, chunk_id: int):
+        row = self.conn.execute("SELECT signature FROM chunks WHERE repo = ? AND chunk_id = ?", (repo, chunk_id)).fetchone()
+        return np.frombuffer(row[0], dtype=np.uint64) if row else None
+
+    def find_duplicates(self, repo: str, entry: dict):
+        """
+        Return [(repo, chunk_id, similarity)] for chunks in other repos that are exact
+        or near duplicates of this one, best match first.
+        """
+        with self.lock:
+            matches = {
+                (other_repo, chunk_id): 1.0
+                for other_repo, chunk_id in self.conn.execute(
+                    "SELECT repo, chunk_id FROM chunks WHERE hash = ? AND repo != ?", (entry["hash"], repo)
+                )
+            }
+            signature = self._signature(repo, entry["id"])
+            if signature is not None:
+                candidates = set()
+                for band, bucket in self._buckets(signature):
+                    candidates.update(self.conn.execute(
+                        "SELECT repo, chunk_id FROM buckets WHERE band = ? AND bucket = ? AND repo != ?", (band, bucket, repo)
+                    ).fetchall())
+                for candidate in candidates - matches.keys():
+                    similarity = self.hasher.similarity(signature, self._signature(*candidate))
+                    if similarity >= self.threshold:
+                        matches[candidate] = similarity
+        return sorted(((r, c, s) for (r, c), s in matches.items()), key=lambda match: -match[2])
+
+    def overlap_report(self) -> dict:
+        """
+        Count, for every pair of teams, how many of each team's chunks have a near
+        duplicate in the other team's repo.
+        """
+        shared = defaultdict(set)
+        with self.lock:
+            totals = dict(self.conn.execute("SELECT repo, COUNT(*) FROM chunks GROUP BY repo"))
+            signatures = {
+                (repo, chunk_id): np.frombuffer(signature, dtype=np.uint64)
+                for repo, chunk_id, signature in self.conn.execute(
+                    f"""
+                    WITH shared AS ({ELIGIBLE_BUCKETS})
+                    SELECT repo, chunk_id, signature FROM chunks WHERE (repo, chunk_id) IN (
+                        SELECT repo, chunk_id FROM buckets JOIN shared USING (band, bucket)
+                    )
+                    """,
+                    (self.max_bucket_repos,),
+                )
+            }
+            # every cross-team pair of chunks sharing a bucket, once, however many buckets they share
+            candidates = self.conn.execute(
+                f"""
+                WITH shared AS ({ELIGIBLE_BUCKETS})
+                SELECT DISTINCT a.repo, a.chunk_id, b.repo, b.chunk_id FROM shared
+                JOIN buckets AS a ON a.band = shared.band AND a.bucket = shared.bucket
+                JOIN buckets AS b ON b.band = shared.band AND b.bucket = shared.bucket
+                WHERE a.repo < b.repo
+                """,
+                (self.max_bucket_repos,),
+            )
+            for repo_a, chunk_a, repo_b, chunk_b in candidates:
+                if self.hasher.similarity(signatures[(repo_a, chunk_a)], signatures[(repo_b, chunk_b)]) >= self.threshold:
+                    shared[(repo_a, repo_b)].add(("a", chunk_a))
+                    shared[(repo_a, repo_b)].add(("b", chunk_b))
+
+        pairs = []
+        for (team_a, team_b), chunks in shared.items():
+            shared_a = sum(1 for side, _ in chunks if side == "a")
+            shared_b = sum(1 for side, _ in chunks if side == "b")
+            pairs.append({
+                "team_a": team_a,
+                "team_b": team_b,
+                "shared_chunks_a": shared_a,
+                "shared_chunks_b": shared_b,
+                "overlap_a": round(shared_a / totals[team_a], 4),
+                "overlap_b": round(shared_b / totals[team_b], 4),
+            })
+        pairs.sort(key=lambda pair: (-max(pair["overlap_a"], pair["overlap_b"]), pair["team_a"], pair["team_b"]))
+        return {"threshold": self.threshold, "pairs": pairs}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,204 @@
+import re
+import json
+from pathlib import Path
+from sampling import BRANCHES, TEST_PATH
+
+METRICS_FILE = "metrics.json"
+
+# categories of CodeReviewModel that are measured here instead of asked of the model
+STATIC_CATEGORIES = ("commenting", "test_coverage", "consistency", "complexity_score")
+
+# node types shared by most tree-sitter grammars
+FUNCTION_TYPES = {
+    "function_definition", "function_declaration", "function_item", "function_expression", "arrow_function",
+    "method_definition", "method_declaration", "constructor_declaration", "func_literal", "method",
+    "singleton_method", "lambda_expression", "local_function_statement",
+}
+DECISION_TYPES = {
+    "if_statement", "elif_clause", "else_if_clause", "if_expression", "if", "elsif", "unless",
+    "for_statement", "for_in_statement", "enhanced_for_statement", "foreach_statement", "for_expression", "for",
+    "while_statement", "while_expression", "while", "until", "do_statement",
+    "case_clause", "switch_case", "switch_section", "match_arm", "when", "catch_clause", "except_clause",
+    "rescue", "conditional_expression", "ternary_expression", "boolean_operator",
+}
+BOOLEAN_OPERATORS = {"&&", "||", "and", "or"}
+TYPE_DEFINITIONS = ("class", "struct", "interface", "enum", "trait", "type", "module", "namespace")
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "--", ";", '"""', "'''")
+FUNCTION_START = re.compile(r"^\s*(?:async\s+)?(?:def|function|func|fn|sub)\s+\w+", re.MULTILINE)
+
+NAMING_STYLES = {
+    "snake_case": re.compile(r"^_*[a-z][a-z0-9]*(_[a-z0-9]+)+$"),
+    "camelCase": re.compile(r"^_*[a-z][a-z0-9]*([A-Z][a-z0-9]*)+$"),
+    "PascalCase": re.compile(r"^_*[A-Z][a-z0-9]+([A-Z][a-z0-9]*)*$"),
+}
+
+# one parser per language, per process; None where tree-sitter has no grammar
+_parsers = {}
+
+
+def get_parser(language):
+    if language not in _parsers:
+        try:
+            import tree_sitter_languages
+            _parsers[language] = tree_sitter_languages.get_parser(language)
+        except Exception:
+            _parsers[language] = None
+    return _parsers[language]
+
+
+def naming_style(name: str):
+    for style, pattern in NAMING_STYLES.items():
+        if pattern.match(name):
+            return style
+    return None
+
+
+def file_metrics(text: str, language: str, source: str) -> dict:
+    """
+    Comment lines, function sizes, cyclomatic complexity and naming styles of
+    one file, from its syntax tree or, without a grammar, from line heuristics.
+    """
+    lines = text.count("\n") + 1 if text else 0
+    parser = get_parser(language)
+    if parser is None:
+        metrics = line_metrics(text)
+    else:
+        metrics = tree_metrics(parser.parse(text.encode("utf-8")).root_node)
+    metrics["lines"] = lines
+    metrics["blank_lines"] = sum(1 for line in text.splitlines() if not line.strip())
+    metrics["test"] = bool(TEST_PATH.search(source))
+    return metrics
+
+
+def tree_metrics(root) -> dict:
+    comment_rows = set()
+    functions = []
+    decisions = 0
+    names = {}
+    stack = [(root, None)]
+    while stack:
+        node, owner = stack.pop()
+        if node.is_named:
+            kind = node.type
+            if kind.endswith("comment") or (kind == "expression_statement" and node.named_child_count == 1
+                                            and node.named_children[0].type == "string"):
+                # docstrings count as comments
+                comment_rows.update(range(node.start_point[0], node.end_point[0] + 1))
+                continue
+            if kind in FUNCTION_TYPES:
+                functions.append([node.end_point[0] - node.start_point[0] + 1, 1])
+                owner = len(functions) - 1
+            if kind in DECISION_TYPES or (kind == "binary_expression" and is_boolean_operator(node)):
+                decisions += 1
+                if owner is not None:
+                    functions[owner][1] += 1
+            if not any(word in kind for word in TYPE_DEFINITIONS):
+                name = node.child_by_field_name("name") or node.child_by_field_name("left")
+                if name is not None and name.type.endswith("identifier"):
+                    style = naming_style(name.text.decode("utf-8", "replace"))
+                    if style is not None:
+                        names[style] = names.get(style, 0) + 1
+        stack.extend((child, owner) for child in node.children)
+    return {
+        "comment_lines": len(comment_rows),
+        "functions": len(functions),
+        "function_lines": sum(length for length, _ in functions),
+        "max_function_lines": max((length for length, _ in functions), default=0),
+        "decisions": decisions,
+        "max_function_complexity": max((complexity for _, complexity in functions), default=0),
+        "names": names,
+        "parsed": True,
+    }
+
+
+def is_boolean_operator(node) -> bool:
+    operator = node.child_by_field_name("operator")
+    return operator is not None and operator.type in BOOLEAN_OPERATORS
+
+
+def line_metrics(text: str) -> dict:
+    return {
+        "comment_lines": sum(1 for line in text.splitlines() if line.strip().startswith(COMMENT_PREFIXES)),
+        "functions": len(FUNCTION_START.findall(text)),
+        "function_lines": 0,
+        "max_function_lines": 0,
+        "decisions": len(BRANCHES.findall(text)),
+        "max_function_complexity": 0,
+        "names": {},
+        "parsed": False,
+    }
+
+
+def repo_metrics(files: dict) -> dict:
+    """Combine per-file metrics into repo totals and ratios."""
+    total = {key: sum(metrics[key] for metrics in files.values())
+             for key in ("lines", "blank_lines", "comment_lines", "functions", "function_lines", "decisions")}
+    names = {}
+    for metrics in files.values():
+        for style, count in metrics["names"].items():
+            names[style] = names.get(style, 0) + count
+    test_lines = sum(metrics["lines"] for metrics in files.values() if metrics["test"])
+    code_lines = total["lines"] - total["blank_lines"]
+    dominant = max(names, key=names.get) if names else None
+    return {
+        "files": len(files),
+        "test_files": sum(1 for metrics in files.values() if metrics["test"]),
+        "lines": total["lines"],
+        "comment_density": total["comment_lines"] / code_lines if code_lines else 0.0,
+        "test_line_ratio": test_lines / total["lines"] if total["lines"] else 0.0,
+        "functions": total["functions"],
+        "mean_function_lines": total["function_lines"] / total["functions"] if total["functions"] else None,
+        "max_function_lines": max((metrics["max_function_lines"] for metrics in files.values()), default=0),
+        # McCabe: one path per function plus one per decision point
+        "mean_function_complexity": (total["functions"] + total["decisions"]) / total["functions"] if total["functions"] else None,
+        "max_function_complexity": max((metrics["max_function_complexity"] for metrics in files.values()), default=0),
+        "naming_style": dominant,
+        "naming_consistency": names[dominant] / sum(names.values()) if names else None,
+    }
+
+
+def scale(value, low, high) -> float:
+    """Map low..high linearly onto the 1..10 score range, clamped."""
+    return round(1 + 9 * min(1.0, max(0.0, (value - low) / (high - low))), 2)
+
+
+def static_scores(repo: dict) -> dict:
+    """Scores for STATIC_CATEGORIES on the review scale; categories without data are left out."""
+    scores = {}
+    if repo["lines"]:
+        scores["commenting"] = scale(repo["comment_density"], 0.0, 0.2)
+        scores["test_coverage"] = scale(repo["test_line_ratio"], 0.0, 0.3)
+    if repo["naming_consistency"] is not None:
+        scores["consistency"] = scale(repo["naming_consistency"], 0.5, 1.0)
+    if repo["mean_function_complexity"] is not None:
+        # the prompt scores sophistication: straight-line code is "too simple"
+        scores["complexity_score"] = scale(repo["mean_function_complexity"], 1.0, 5.0)
+    return scores
+
+
+def describe(source: str, metrics: dict) -> str:
+    """One line of context for the reviewer."""
+    code_lines = metrics["lines"] - metrics["blank_lines"]
+    parts = [f"{source}: {metrics['lines']} lines", f"{metrics['comment_lines'] / code_lines if code_lines else 0:.0%} comments"]
+    if metrics["functions"]:
+        complexity = (metrics["functions"] + metrics["decisions"]) / metrics["functions"]
+        parts.append(f"{metrics['functions']} functions (longest {metrics['max_function_lines']} lines, "
+                     f"complexity {complexity:.1f} mean / {metrics['max_function_complexity']} max)")
+    if metrics["names"]:
+        style = max(metrics["names"], key=metrics["names"].get)
+        parts.append(f"naming {metrics['names'][style] / sum(metrics['names'].values()):.0%} {style}")
+    if metrics["test"]:
+        parts.append("test file")
+    return ", ".join(parts)
+
+
+def load_metrics(chunk_folder) -> dict:
+    metrics_path = Path(chunk_folder) / METRICS_FILE
+    if not metrics_path.is_file():
+        return {}
+    return json.loads(metrics_path.read_text(encoding="utf-8")).get("files", {})
+
+
+def save_metrics(chunk_folder, files: dict):
+    state = {"repo": repo_metrics(files), "files": files}
+    Path(chunk_folder, METRICS_FILE).write_text(json.dumps(state, indent=2), encoding="utf-8")
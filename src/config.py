@@ -0,0 +1,63 @@
+"""
+Runtime configuration shared by the evaluation modules.
+
+Every value can be overridden through an environment variable of the same name.
+"""
+
+import os
+import json
+
+# Groq credentials and endpoint
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL")
+
+# HTTP connection pool shared by every LLM request
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 32))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", 16))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60))
+
+# per-request timeouts in seconds
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 10))
+
+# retries performed by the Groq SDK itself for sync requests; async requests are paced and
+# retried by the analysers' rate limiter, which has to see every 429
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+# attempts at a response that validates against the response model
+LLM_VALIDATION_ATTEMPTS = int(os.environ.get("LLM_VALIDATION_ATTEMPTS", 3))
+
+# USD per million (prompt, completion) tokens, for cost estimates in the run report;
+# override with a JSON object such as {"llama-3.1-70b-versatile": [0.59, 0.79]}
+LLM_PRICING = {
+    "llama-3.1-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama3-70b-8192": (0.59, 0.79),
+    "llama3-8b-8192": (0.05, 0.08),
+    "mixtral-8x7b-32768": (0.24, 0.24),
+}
+LLM_PRICING.update({model: tuple(prices) for model, prices in json.loads(os.environ.get("LLM_PRICING", "{}")).items()})
+
+# largest presentation accepted at ingestion, and the cap on presentation downloads
+MAX_PRESENTATION_BYTES = int(os.environ.get("MAX_PRESENTATION_BYTES", 10 * 1024 * 1024))
+
+# presentation downloads: concurrent fetches (and pooled connections), timeouts in seconds, retries
+DOWNLOAD_MAX_BYTES = int(os.environ.get("DOWNLOAD_MAX_BYTES", MAX_PRESENTATION_BYTES))
+DOWNLOAD_MAX_WORKERS = int(os.environ.get("DOWNLOAD_MAX_WORKERS", 8))
+DOWNLOAD_TIMEOUT = float(os.environ.get("DOWNLOAD_TIMEOUT", 60))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.environ.get("DOWNLOAD_CONNECT_TIMEOUT", 10))
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", 3))
+
+# presentation parsing in worker processes: pool size, wall-clock seconds and address space per deck
+PARSE_MAX_WORKERS = int(os.environ.get("PARSE_MAX_WORKERS", max(1, min(4, os.cpu_count() or 1))))
+PARSE_TIMEOUT = float(os.environ.get("PARSE_TIMEOUT", 60))
+PARSE_MAX_MEMORY = int(os.environ.get("PARSE_MAX_MEMORY", 2 * 1024 * 1024 * 1024))
+
+# submission storage: a postgres:// DSN or a SQLite path, submissions per transaction,
+# seconds a partial batch waits for more, and submissions validated and stored at once
+STORAGE_DSN = os.environ.get("STORAGE_DSN", "./submissions.sqlite3")
+STORAGE_BATCH_SIZE = int(os.environ.get("STORAGE_BATCH_SIZE", 100))
+STORAGE_FLUSH_INTERVAL = float(os.environ.get("STORAGE_FLUSH_INTERVAL", 0.05))
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", 100))
+
+# where streamed presentation uploads are kept once validated
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "./uploads")
@@ -5,13 +5,39 @@ This module contains the DataValidator class, which is responsible for
 validating the structure and content of hackathon submissions.
 """
 
+import os
 import re
+import hashlib
 import logging
-from typing import Dict, Any
+import tempfile
+from typing import Dict, Any, AsyncIterable, Optional
 from urllib.parse import urlparse
+import config
 
 logger = logging.getLogger(__name__)
 
+# bytes read before a presentation's format is decided
+SNIFF_BYTES = 4096
+
+# the format each accepted extension must actually contain
+EXTENSION_KINDS = {'.pptx': 'ooxml', '.ppt': 'ole', '.pdf': 'pdf'}
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# an OOXML package is a ZIP whose first entries are its content types and relationships
+OOXML_MARKERS = (b'[Content_Types].xml', b'_rels/', b'ppt/')
+
+
+def sniff(prefix: bytes) -> Optional[str]:
+    """The format of a file from its first bytes: 'pdf', 'ooxml', 'ole', or None if it is none of them."""
+    # PDF readers accept a header anywhere in the first kilobyte
+    if b'%PDF-' in prefix[:1024]:
+        return 'pdf'
+    if prefix.startswith(ZIP_MAGIC) and any(marker in prefix for marker in OOXML_MARKERS):
+        return 'ooxml'
+    if prefix.startswith(OLE_MAGIC):
+        return 'ole'
+    return None
+
 class DataValidator:
     """
     Validates hackathon submission data.
@@ -48,7 +74,15 @@ class DataValidator:
             if not self._validate_github_url(data['github_url']):
                 return False
 
-            if not self._validate_presentation_file(data['presentation_file']):
+            file_data = data['presentation_file']
+            if 'stream' in file_data:
+                upload = await self.validate_presentation_stream(file_data.get('name', ''), file_data['stream'],
+                                                                 file_data.get('size'))
+                if upload is None:
+                    return False
+                # the accepted upload is on disk now; the submission carries its metadata instead of the stream
+                data['presentation_file'] = upload
+            elif not self._validate_presentation_file(file_data):
                 return False
 
             logger.info(f"Submission validated successfully: {data.get('id', 'Unknown ID')}")
@@ -78,14 +112,94 @@ class DataValidator:
 
     def _validate_presentation_file(self, file_data: Dict[str, Any]) -> bool:
         """Validate the presentation file data."""
-        allowed_extensions = ['.ppt', '.pptx', '.pdf']
         if 'name' not in file_data or 'content' not in file_data:
             logger.warning("Missing name or content in presentation file data")
             return False
-        if not any(file_data['name'].lower().endswith(ext) for ext in allowed_extensions):
-            logger.warning(f"Invalid presentation file type: {file_data['name']}")
+        if self._expected_kind(file_data['name']) is None:
             return False
-        if len(file_data['content']) > 10 * 1024 * 1024:  # 10 MB limit
+        if len(file_data['content']) > config.MAX_PRESENTATION_BYTES:
             logger.warning(f"Presentation file too large: {file_data['name']}")
             return False
-        return True
\ No newline at end of file
+        content = file_data['content']
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            return self._validate_format(file_data['name'], bytes(content[:SNIFF_BYTES]))
+        return True
+
+    def _expected_kind(self, name: str) -> Optional[str]:
+        """The format a presentation's extension promises, or None if the extension is not accepted."""
+        kind = EXTENSION_KINDS.get(os.path.splitext(name.lower())[1])
+        if kind is None:
+            logger.warning(f"Invalid presentation file type: {name}")
+        return kind
+
+    def _validate_format(self, name: str, prefix: bytes) -> bool:
+        """Check that a presentation's first bytes match its extension."""
+        expected = self._expected_kind(name)
+        kind = sniff(prefix)
+        if kind != expected:
+            logger.warning(f"Presentation content does not match its extension: {name} "
+                           f"(expected {expected}, found {kind or 'unknown'})")
+            return False
+        return True
+
+    async def validate_presentation_stream(self, name: str, stream: AsyncIterable[bytes], size: int = None,
+                                           upload_dir: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Validate a presentation while it is being received.
+
+        The upload is hashed and spooled to disk chunk by chunk, so memory stays
+        bounded by the chunk size. A declared size over the limit is rejected
+        before reading, a file whose first SNIFF_BYTES do not match its extension
+        after reading only those, and an oversized file as soon as it passes the
+        limit. Rejected uploads leave nothing behind.
+
+        Args:
+            name (str): The file name of the presentation.
+            stream (AsyncIterable[bytes]): The file content.
+            size (int): The size declared by the client, if any.
+            upload_dir (str): Where accepted files are kept, named by their SHA-256.
+
+        Returns:
+            Optional[Dict[str, Any]]: The name, path, size, sha256 and kind of an accepted file, or None.
+        """
+        if self._expected_kind(name) is None:
+            return None
+        if size is not None and size > config.MAX_PRESENTATION_BYTES:
+            logger.warning(f"Presentation file too large: {name} ({size} bytes declared)")
+            return None
+
+        upload_dir = upload_dir or config.UPLOAD_DIR
+        os.makedirs(upload_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        received = 0
+        prefix = b''
+        fd, partial = tempfile.mkstemp(dir=upload_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in stream:
+                    received += len(chunk)
+                    if received > config.MAX_PRESENTATION_BYTES:
+                        logger.warning(f"Presentation file too large: {name} (over {config.MAX_PRESENTATION_BYTES} bytes)")
+                        return None
+                    if len(prefix) < SNIFF_BYTES:
+                        prefix += chunk[:SNIFF_BYTES - len(prefix)]
+                        if len(prefix) == SNIFF_BYTES and not self._validate_format(name, prefix):
+                            return None
+                    digest.update(chunk)
+                    f.write(chunk)
+            if len(prefix) < SNIFF_BYTES and not self._validate_format(name, prefix):
+                return None
+
+            sha256 = digest.hexdigest()
+            path = os.path.join(upload_dir, sha256 + os.path.splitext(name.lower())[1])
+            os.replace(partial, path)
+            partial = None
+            logger.info(f"Received presentation {name}: {received} bytes, sha256 {sha256}")
+            return {"name": name, "path": path, "size": received, "sha256": sha256, "kind": sniff(prefix)}
+        finally:
+            if partial is not None and os.path.exists(partial):
+                os.remove(partial)
+            # stop the producer of a rejected upload instead of leaving it suspended
+            close = getattr(stream, 'aclose', None)
+            if close is not None:
+                await close()
\ No newline at end of file
@@ -0,0 +1,258 @@
+"""
+Storage Service Module
+
+This module contains the StorageService class, which persists validated
+hackathon submissions. Concurrent writes are grouped into batched
+transactions against SQLite, for local runs, or Postgres through asyncpg.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from typing import Dict, Any, List, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id TEXT PRIMARY KEY,
+        team_name TEXT NOT NULL,
+        github_url TEXT NOT NULL,
+        presentation_name TEXT,
+        presentation BLOB,
+        data TEXT NOT NULL,
+        submitted_at REAL NOT NULL
+    )
+"""
+
+SQLITE_UPSERT = """
+    INSERT INTO submissions (id, team_name, github_url, presentation_name, presentation, data, submitted_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        team_name = excluded.team_name, github_url = excluded.github_url,
+        presentation_name = excluded.presentation_name, presentation = excluded.presentation,
+        data = excluded.data, submitted_at = excluded.submitted_at
+"""
+
+POSTGRES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id TEXT PRIMARY KEY,
+        team_name TEXT NOT NULL,
+        github_url TEXT NOT NULL,
+        presentation_name TEXT,
+        presentation BYTEA,
+        data JSONB NOT NULL,
+        submitted_at DOUBLE PRECISION NOT NULL
+    )
+"""
+
+POSTGRES_UPSERT = """
+    INSERT INTO submissions (id, team_name, github_url, presentation_name, presentation, data, submitted_at)
+    VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
+    ON CONFLICT (id) DO UPDATE SET
+        team_name = excluded.team_name, github_url = excluded.github_url,
+        presentation_name = excluded.presentation_name, presentation = excluded.presentation,
+        data = excluded.data, submitted_at = excluded.submitted_at
+"""
+
+
+class SQLiteBackend:
+    """Writes batches to a local SQLite file from a worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+
+    def _connect(self):
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SQLITE_SCHEMA)
+        self.conn.commit()
+
+    def _write(self, rows: List[Tuple]):
+        with self.conn:
+            self.conn.executemany(SQLITE_UPSERT, rows)
+
+    async def connect(self):
+        await asyncio.to_thread(self._connect)
+
+    async def write(self, rows: List[Tuple]):
+        await asyncio.to_thread(self._write, rows)
+
+    async def close(self):
+        if self.conn is not None:
+            await asyncio.to_thread(self.conn.close)
+            self.conn = None
+
+
+class PostgresBackend:
+    """Writes batches to Postgres through an asyncpg connection pool."""
+
+    def __init__(self, dsn: str, pool_size: int = 4):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.pool = None
+
+    async def connect(self):
+        # only needed when a Postgres DSN is configured
+        import asyncpg
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        async with self.pool.acquire() as conn:
+            await conn.execute(POSTGRES_SCHEMA)
+
+    async def write(self, rows: List[Tuple]):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(POSTGRES_UPSERT, rows)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+class StorageService:
+    """
+    Stores validated submissions.
+
+    Each call to store waits until its submission is committed, but the writes
+    of concurrent callers are collected by a single writer task and committed
+    together, up to batch_size per transaction. A failed batch is retried one
+    submission at a time, so only the offending submissions fail. Submissions
+    are keyed by their id, or by team name without one; storing the same key
+    again replaces the earlier submission.
+    """
+
+    def __init__(self, dsn: str = None, batch_size: int = None, flush_interval: float = None):
+        """
+        Initialize the StorageService.
+
+        Args:
+            dsn (str): A postgres:// or postgresql:// DSN, or the path of a SQLite file.
+            batch_size (int): The most submissions written in one transaction.
+            flush_interval (float): Seconds to wait for more submissions before writing a partial batch.
+        """
+        self.dsn = dsn or config.STORAGE_DSN
+        self.batch_size = batch_size or config.STORAGE_BATCH_SIZE
+        self.flush_interval = config.STORAGE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        if self.dsn.startswith(("postgres://", "postgresql://")):
+            self.backend = PostgresBackend(self.dsn)
+        else:
+            self.backend = SQLiteBackend(self.dsn)
+        self.queue = None
+        self.writer = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        """Connect to the backend and start the writer task in the running event loop."""
+        if self.writer is None:
+            await self.backend.connect()
+            self.queue = asyncio.Queue()
+            self.writer = asyncio.create_task(self._write_batches())
+
+    async def store(self, submission_data: Dict[str, Any]):
+        """
+        Store a submission.
+
+        Args:
+            submission_data (Dict[str, Any]): A validated submission.
+
+        Raises:
+            Exception: If the backend rejected the submission.
+        """
+        await self.open()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((self._to_row(submission_data), future))
+        await future
+
+    async def close(self):
+        """Write the queued submissions and disconnect."""
+        if self.writer is not None:
+            await self.queue.put(None)
+            await self.writer
+            self.writer = None
+        await self.backend.close()
+
+    @staticmethod
+    def _to_row(submission_data: Dict[str, Any]) -> Tuple:
+        presentation = dict(submission_data.get('presentation_file') or {})
+        content = presentation.pop('content', None)
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        data = {key: value for key, value in submission_data.items() if key != 'presentation_file'}
+        data['presentation_file'] = presentation
+        return (
+            str(submission_data.get('id') or submission_data['team_name']),
+            submission_data['team_name'],
+            submission_data['github_url'],
+            presentation.get('name'),
+            content,
+            json.dumps(data, default=str),
+            time.time(),
+        )
+
+    async def _write_batches(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            await self.backend.write([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch[0][1], e)
+                return
+            logger.warning(f"Batch of {len(batch)} submissions failed ({str(e)}), retrying one at a time")
+            for row, future in batch:
+                try:
+                    await self.backend.write([row])
+                except Exception as e:
+                    self._resolve(future, e)
+                else:
+                    self._resolve(future)
+            return
+        for _, future in batch:
+            self._resolve(future)
+        logger.info(f"Stored a batch of {len(batch)} submissions")
+
+    @staticmethod
+    def _resolve(future, error: Exception = None):
+        # the caller may have given up on the submission in the meantime
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
@@ -5,11 +5,15 @@ This module contains the SubmissionHandler class, which manages the process
 of accepting and processing hackathon submissions.
 """
 
+import json
+import asyncio
 import logging
+import argparse
 from typing import Dict, Any
 from .data_validator import DataValidator
-from storage_service import StorageService
+from .storage_service import StorageService
 from typing import List
+import config
 
 logger = logging.getLogger(__name__)
 
@@ -44,41 +48,75 @@ class SubmissionHandler:
         Returns:
             bool: True if the submission was successfully processed and stored, False otherwise.
         """
+        return (await self._process(submission_data))["status"] == "stored"
+
+    async def _process(self, submission_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and store one submission, returning its per-item result."""
+        submission_id = submission_data.get('id', 'Unknown ID')
+        result = {"id": submission_id, "status": "stored", "error": None}
         try:
             if await self.validator.validate(submission_data):
                 await self.storage.store(submission_data)
-                logger.info(f"Submission processed successfully: {submission_data.get('id', 'Unknown ID')}")
-                return True
+                logger.info(f"Submission processed successfully: {submission_id}")
             else:
-                logger.warning(f"Invalid submission: {submission_data.get('id', 'Unknown ID')}")
-                return False
+                logger.warning(f"Invalid submission: {submission_id}")
+                result["status"] = "invalid"
         except Exception as e:
             logger.error(f"Error processing submission: {str(e)}")
-            return False
+            result.update(status="failed", error=str(e))
+        return result
 
-    async def bulk_process_submissions(self, submissions: List[Dict[str, Any]]) -> Dict[str, int]:
+    async def bulk_process_submissions(self, submissions: List[Dict[str, Any]], concurrency: int = None) -> Dict[str, Any]:
         """
         Process multiple submissions in bulk.
 
-        This method attempts to process each submission in the provided list.
+        Submissions are validated and stored concurrently, at most `concurrency`
+        at a time, so the storage service can batch their writes.
 
         Args:
             submissions (List[Dict[str, Any]]): A list of submission data to process.
+            concurrency (int): The most submissions in flight at once.
 
         Returns:
-            Dict[str, int]: A dictionary containing counts of successful, failed, and total processed submissions.
+            Dict[str, Any]: Counts of successful, failed, and total processed submissions, and under "items"
+                the result of each submission in input order: its id, a status of "stored", "invalid" or
+                "failed", and the error of a failed one.
         """
+        semaphore = asyncio.Semaphore(concurrency or config.INGEST_CONCURRENCY)
+
+        async def process(submission):
+            async with semaphore:
+                return await self._process(submission)
+
+        items = await asyncio.gather(*(process(submission) for submission in submissions))
+        successful = sum(1 for item in items if item["status"] == "stored")
         results = {
-            "successful": 0,
-            "failed": 0,
-            "total": len(submissions)
+            "successful": successful,
+            "failed": len(items) - successful,
+            "total": len(submissions),
         }
 
-        for submission in submissions:
-            if await self.process_submission(submission):
-                results["successful"] += 1
-            else:
-                results["failed"] += 1
-
         logger.info(f"Bulk processing complete. Results: {results}")
-        return results
\ No newline at end of file
+        results["items"] = items
+        return results
+
+
+async def main(input_file: str, dsn: str = None, concurrency: int = None):
+    with open(input_file, "r", encoding="utf-8") as f:
+        submissions = json.load(f)
+    async with StorageService(dsn) as storage:
+        return await SubmissionHandler(DataValidator(), storage).bulk_process_submissions(submissions, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate and store a JSON list of submissions.")
+    parser.add_argument("input_file")
+    parser.add_argument("--dsn", help="Postgres DSN or SQLite path (default: STORAGE_DSN)")
+    parser.add_argument("--concurrency", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    results = asyncio.run(main(args.input_file, args.dsn, args.concurrency))
+    for item in results["items"]:
+        if item["status"] != "stored":
+            print(item)
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+Downloader Module
+
+A pooled HTTP downloader shared by the presentation modules. Files are
+streamed to disk in chunks, capped at the ingestion size limit, retried on
+transient failures and revalidated with conditional GETs so unchanged decks
+are not fetched again.
+"""
+
+import os
+import json
+import logging
+import threading
+import posixpath
+from urllib.parse import urlparse, unquote
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+from telemetry import Telemetry, get_telemetry
+
+logger = logging.getLogger(__name__)
+
+# status codes worth another attempt; anything else is the server's final answer
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class DownloadTooLarge(Exception):
+    pass
+
+
+def filename_from_url(url: str) -> str:
+    return posixpath.basename(unquote(urlparse(url).path)) or "download"
+
+
+class Downloader:
+    """
+    Downloads through one pooled requests session. Each file is written to a
+    temporary .part file and only moved into place once complete, and the
+    validators of the response (ETag, Last-Modified) are kept in a hidden
+    sidecar file so the next download of the same URL can be conditional.
+    """
+
+    def __init__(self, max_bytes: int = None, max_workers: int = None, timeout: float = None,
+                 connect_timeout: float = None, retries: int = None, chunk_size: int = 64 * 1024,
+                 telemetry: Telemetry = None):
+        """
+        Args:
+            max_bytes (int): Abort a download larger than this, the ingestion limit by default.
+            max_workers (int): Concurrent downloads in download_many, also the pool size.
+            retries (int): Retries of connection errors and RETRY_STATUSES, with backoff.
+        """
+        self.max_bytes = max_bytes or config.DOWNLOAD_MAX_BYTES
+        self.max_workers = max_workers or config.DOWNLOAD_MAX_WORKERS
+        self.timeout = (connect_timeout or config.DOWNLOAD_CONNECT_TIMEOUT, timeout or config.DOWNLOAD_TIMEOUT)
+        self.chunk_size = chunk_size
+        self.telemetry = telemetry or get_telemetry()
+
+        retry = Retry(
+            total=config.DOWNLOAD_RETRIES if retries is None else retries,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=("GET", "HEAD"),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def validators_path(path: str) -> str:
+        directory, name = os.path.split(path)
+        return os.path.join(directory, f".{name}.download.json")
+
+    def load_validators(self, url: str, path: str) -> dict:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(self.validators_path(path), "r") as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return validators if validators.get("url") == url else {}
+
+    def download(self, url: str, path: str) -> bool:
+        """
+        Download url to path.
+
+        Returns:
+            bool: True if new content was written, False if the file at path is
+                still current (the server answered 304 Not Modified).
+
+        Raises:
+            DownloadTooLarge: If the file exceeds max_bytes; nothing is written.
+            requests.RequestException: If the download fails after all retries.
+        """
+        headers = {}
+        validators = self.load_validators(url, path)
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        partial = f"{path}.part"
+        try:
+            with self.telemetry.stage("download"), \
+                    self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304:
+                    self.telemetry.inc("downloads_total", outcome="not_modified")
+                    logger.info(f"Unchanged since last download: {url}")
+                    return False
+                response.raise_for_status()
+
+                length = response.headers.get("Content-Length")
+                if length is not None and length.isdigit() and int(length) > self.max_bytes:
+                    raise DownloadTooLarge(f"{url} is {int(length)} bytes, over the {self.max_bytes} byte limit")
+
+                written = 0
+                with open(partial, "wb") as f:
+                    # the declared length can be missing or wrong, so the cap is enforced on the stream too
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise DownloadTooLarge(f"{url} exceeded the {self.max_bytes} byte limit")
+                        f.write(chunk)
+                os.replace(partial, path)
+                self.telemetry.inc("download_bytes_total", written)
+                validators = {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+        except DownloadTooLarge:
+            self.telemetry.inc("downloads_total", outcome="too_large")
+            raise
+        except requests.RequestException:
+            self.telemetry.inc("downloads_total", outcome="failed")
+            raise
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        with open(self.validators_path(path), "w") as f:
+            json.dump(validators, f)
+        self.telemetry.inc("downloads_total", outcome="downloaded")
+        logger.info(f"Downloaded {written} bytes to {path}")
+        return True
+
+    def download_many(self, items) -> dict:
+        """
+        Download (url, path) pairs with at most max_workers in flight.
+
+        Returns:
+            dict: url -> result of download, or the exception that aborted it.
+        """
+        def fetch(item):
+            url, path = item
+            try:
+                return self.download(url, path)
+            except Exception as e:
+                logger.error(f"Error downloading {url}: {str(e)}")
+                return e
+
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return dict(zip((url for url, _ in items), pool.map(fetch, items)))
+
+    def close(self):
+        self.session.close()
+
+
+_shared_downloader = None
+_shared_lock = threading.Lock()
+
+
+def get_downloader() -> Downloader:
+    """Return the process-wide Downloader, creating it on first use."""
+    global _shared_downloader
+    with _shared_lock:
+        if _shared_downloader is None:
+            _shared_downloader = Downloader()
+        return _shared_downloader
@@ -0,0 +1,352 @@
+"""
+Job Queue Module
+
+A durable SQLite job queue for the evaluation pipeline. Every unit of work
+(cloning a repo, chunking it, reviewing one chunk, aggregating its scores,
+screening one presentation) is a job that worker processes lease, run and
+complete, so an interrupted run resumes where it stopped.
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+CANCELLED = "cancelled"
+
+
+# a job cancelled as superseded comes back when the same work is queued again
+INSERT_JOB = f"""
+    INSERT INTO jobs (kind, key, grp, after, payload, state, available_at, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (kind, key) DO UPDATE SET
+        state = excluded.state, attempts = 0, payload = excluded.payload,
+        available_at = excluded.available_at, updated_at = excluded.updated_at
+    WHERE jobs.state = '{CANCELLED}'
+"""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """
+    Jobs are unique per (kind, key), so enqueueing the same work twice, e.g. when a
+    run is restarted, is a no-op. A leased job belongs to one worker until it
+    completes, fails or its lease expires; failures are retried with exponential
+    backoff and parked as dead letters after max_attempts.
+
+    A job can wait for every job of another kind in the same group to finish
+    (e.g. a repo's aggregate job waits for all of its review jobs), or, naming
+    its own kind, run only while no other job of that kind in the group does.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 5, backoff_base: float = 5.0, backoff_max: float = 600.0):
+        """
+        Args:
+            db_path (str): SQLite file shared by every worker process.
+            max_attempts (int): Attempts, including expired leases, before a job is dead.
+            backoff_base (float): Delay in seconds before the first retry; doubles per attempt.
+            backoff_max (float): Upper bound on the retry delay.
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.telemetry = get_telemetry()
+        self.lock = threading.Lock()
+        # autocommit; writes take the database lock explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                grp TEXT,
+                after TEXT,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (kind, key)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at);
+            CREATE INDEX IF NOT EXISTS jobs_group ON jobs (grp, kind, state);
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    @staticmethod
+    def _job(row) -> dict:
+        job_id, kind, key, group, payload, attempts = row
+        return {"id": job_id, "kind": kind, "key": key, "group": group, "payload": json.loads(payload), "attempts": attempts}
+
+    def enqueue(self, kind: str, key: str, payload: dict = None, group: str = None, after: str = None,
+                delay: float = 0) -> bool:
+        """
+        Add a job unless one with the same kind and key already exists (and was not cancelled).
+
+        Args:
+            group (str): Unit the job belongs to, e.g. a repo or team name.
+            after (str): Only lease this job once no job of that kind in the same
+                group is pending or leased. With the job's own kind, only once no
+                other job of that kind in the group is leased.
+
+        Returns:
+            bool: True if the job was added.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(INSERT_JOB, (kind, key, group, after, json.dumps(payload or {}), PENDING, now + delay, now, now))
+        return cursor.rowcount == 1
+
+    def enqueue_many(self, kind: str, jobs, group: str = None, after: str = None) -> int:
+        """Add (key, payload) jobs in one transaction; returns how many were new or revived."""
+        now = time.time()
+        rows = [(kind, key, group, after, json.dumps(payload or {}), PENDING, now, now, now) for key, payload in jobs]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(INSERT_JOB, rows)
+            return conn.total_changes - before
+
+    def lease(self, kinds, owner: str, lease_seconds: float = 600) -> dict:
+        """Lease the next ready job of one of the given kinds, or return None."""
+        kinds = list(kinds)
+        now = time.time()
+        with self._transaction() as conn:
+            # workers that died mid-job leave expired leases; past max_attempts they are dead letters
+            conn.execute(
+                f"UPDATE jobs SET state = ?, lease_owner = NULL, last_error = COALESCE(last_error, 'lease expired'), "
+                f"updated_at = ? WHERE state = ? AND lease_expires < ? AND attempts >= ? "
+                f"AND kind IN ({','.join('?' * len(kinds))})",
+                (DEAD, now, LEASED, now, self.max_attempts, *kinds),
+            )
+            row = conn.execute(
+                f"""
+                SELECT id, kind, key, grp, payload, attempts FROM jobs AS j
+                WHERE kind IN ({','.join('?' * len(kinds))})
+                AND ((state = ? AND available_at <= ?) OR (state = ? AND lease_expires < ?))
+                AND (after IS NULL OR NOT EXISTS (
+                    SELECT 1 FROM jobs AS d WHERE d.grp = j.grp AND d.kind = j.after AND d.id != j.id
+                    AND (d.state = ? OR (d.state = ? AND d.kind != j.kind))
+                ))
+                ORDER BY available_at, id LIMIT 1
+                """,
+                (*kinds, PENDING, now, LEASED, now, LEASED, PENDING),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                (LEASED, owner, now + lease_seconds, now, row[0]),
+            )
+        job = self._job(row)
+        job["attempts"] += 1
+        return job
+
+    def extend(self, job: dict, owner: str, lease_seconds: float = 600) -> bool:
+        """Keep a long-running job's lease alive. Returns False if the lease was lost."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (time.time() + lease_seconds, time.time(), job["id"], LEASED, owner),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job: dict, owner: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, last_error = NULL, updated_at = ? "
+                "WHERE id = ? AND state = ? AND lease_owner = ?",
+                (DONE, time.time(), job["id"], LEASED, owner),
+            )
+        if cursor.rowcount != 1:
+            # the lease expired and the job was handed to another worker (or cancelled); its outcome is theirs
+            self.telemetry.inc("jobs_total", kind=job["kind"], outcome="lease_lost")
+            logger.warning(f"{job['kind']} job {job['key']} finished after its lease was lost")
+            return False
+        self.telemetry.inc("jobs_total", kind=job["kind"], outcome="done")
+        return True
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def fail(self, job: dict, owner: str, error: str) -> str:
+        """
+        Schedule a retry, or park the job as a dead letter. Returns the new state,
+        or None if the lease was lost and the job's state was left alone.
+        """
+        state = DEAD if job["attempts"] >= self.max_attempts else PENDING
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, available_at = ?, last_error = ?, updated_at = ? "
+                "WHERE id = ? AND state = ? AND lease_owner = ?",
+                (state, now + (self.backoff(job["attempts"]) if state == PENDING else 0), error, now,
+                 job["id"], LEASED, owner),
+            )
+        if cursor.rowcount != 1:
+            self.telemetry.inc("jobs_total", kind=job["kind"], outcome="lease_lost")
+            logger.warning(f"{job['kind']} job {job['key']} failed after its lease was lost: {error}")
+            return None
+        self.telemetry.inc("jobs_total", kind=job["kind"], outcome="dead" if state == DEAD else "retry")
+        return state
+
+    def cancel(self, kind: str, group: str, keep_keys=()) -> int:
+        """
+        Cancel a group's pending jobs of one kind, except keep_keys (e.g. superseded reviews).
+        Leased jobs are left to finish, since their worker would not notice; handlers that
+        must not write stale results check for a newer job themselves.
+        """
+        keep_keys = set(keep_keys)
+        with self._transaction() as conn:
+            ids = [
+                (CANCELLED, time.time(), job_id)
+                for job_id, key in conn.execute(
+                    "SELECT id, key FROM jobs WHERE kind = ? AND grp = ? AND state = ?", (kind, group, PENDING)
+                )
+                if key not in keep_keys
+            ]
+            conn.executemany("UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?", ids)
+        return len(ids)
+
+    def state(self, kind: str, key: str) -> str:
+        with self.lock:
+            row = self.conn.execute("SELECT state FROM jobs WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        return row[0] if row else None
+
+    def states(self, kind: str, group: str) -> dict:
+        """key -> state for every job of one kind in a group."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT key, state FROM jobs WHERE kind = ? AND grp = ?", (kind, group)))
+
+    def outstanding(self, kinds=None) -> int:
+        """Jobs that are pending (including waiting for a retry) or leased."""
+        query = "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)"
+        params = [PENDING, LEASED]
+        if kinds is not None:
+            kinds = list(kinds)
+            query += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        with self.lock:
+            return self.conn.execute(query, params).fetchone()[0]
+
+    def counts(self) -> dict:
+        counts = {}
+        with self.lock:
+            for kind, state, count in self.conn.execute("SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state"):
+                counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def dead_letters(self, kind: str = None) -> list:
+        query = "SELECT id, kind, key, grp, attempts, last_error, updated_at FROM jobs WHERE state = ?"
+        params = [DEAD]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self.lock:
+            return [
+                {"id": job_id, "kind": kind, "key": key, "group": group, "attempts": attempts, "error": error, "failed_at": failed_at}
+                for job_id, kind, key, group, attempts, error, failed_at in self.conn.execute(query + " ORDER BY id", params)
+            ]
+
+    def retry_dead(self, kind: str = None) -> int:
+        """Move dead letters back to pending with a fresh attempt budget."""
+        query = "UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated_at = ? WHERE state = ?"
+        params = [PENDING, time.time(), time.time(), DEAD]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def work(self, handlers: dict, owner: str = None, lease_seconds: float = 600, poll_interval: float = 1.0,
+             stop_when_idle: bool = True) -> int:
+        """
+        Lease and run jobs until none of the handled kinds are outstanding.
+
+        The lease of a running job is renewed every third of lease_seconds, so
+        lease_seconds bounds how long a dead worker holds a job rather than how
+        long a job may run. If a renewal fails, the job's "lease_lost" event is
+        set and handlers should stop before writing anything.
+
+        Args:
+            handlers (dict): kind -> callable(job); raising fails the job.
+            stop_when_idle (bool): Return once nothing is pending or leased, instead of polling forever.
+
+        Returns:
+            int: Number of jobs this worker ran.
+        """
+        owner = owner or default_owner()
+        processed = 0
+        while True:
+            job = self.lease(handlers, owner, lease_seconds)
+            if job is None:
+                if stop_when_idle and not self.outstanding(handlers):
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            job["lease_lost"] = threading.Event()
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job, owner, lease_seconds, done),
+                                         name="job-heartbeat", daemon=True)
+            heartbeat.start()
+            try:
+                handlers[job["kind"]](job)
+            except Exception as e:
+                state = self.fail(job, owner, f"{type(e).__name__}: {e}")
+                if state is not None:
+                    logger.warning(f"{job['kind']} job {job['key']} failed on attempt {job['attempts']} ({state}): {e}")
+            else:
+                self.complete(job, owner)
+            finally:
+                done.set()
+                heartbeat.join()
+            processed += 1
+
+    def _heartbeat(self, job: dict, owner: str, lease_seconds: float, done: threading.Event):
+        while not done.wait(lease_seconds / 3):
+            try:
+                renewed = self.extend(job, owner, lease_seconds)
+            except sqlite3.Error as e:
+                # a busy database is retried at the next beat, well before the lease runs out
+                logger.warning(f"Could not renew the lease of {job['kind']} job {job['key']}: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Lost the lease of {job['kind']} job {job['key']}")
+                job["lease_lost"].set()
+                return
+
+    def close(self):
+        self.conn.close()
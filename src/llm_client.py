@@ -0,0 +1,155 @@
+"""
+LLM Client Module
+
+A single long-lived, connection-pooled Groq client shared by the code and
+presentation analysers, with both a sync and an async facade.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from json import JSONDecodeError
+import httpx
+import instructor
+from pydantic import ValidationError
+from tenacity import Retrying, AsyncRetrying, stop_after_attempt, retry_if_exception_type
+from groq import Groq, AsyncGroq, RateLimitError, APITimeoutError
+import config
+from telemetry import Telemetry, get_telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClient:
+    """
+    Wraps pooled Groq clients with instructor for structured output.
+
+    The sync client and its HTTP pool live for the whole process so keep-alive
+    connections and TLS sessions are reused across requests. The async client is
+    bound to the event loop it was first used in and is rebuilt if a new loop
+    (e.g. a later asyncio.run) uses it.
+
+    Only responses that fail validation are asked for again here. API errors are
+    raised as the SDK's own exceptions; the sync client retries them max_retries
+    times, the async client not at all, since its callers retry through a RateLimiter.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, timeout: float = None,
+                 max_connections: int = None, max_keepalive_connections: int = None,
+                 max_retries: int = None, telemetry: Telemetry = None):
+        self.api_key = api_key or config.GROQ_API_KEY
+        if not self.api_key:
+            raise ValueError("No Groq API key configured, set GROQ_API_KEY")
+        self.base_url = base_url or config.GROQ_BASE_URL
+        self.max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.timeout = httpx.Timeout(timeout or config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(
+            max_connections=max_connections or config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+        )
+
+        self.http_client = httpx.Client(limits=self.limits, timeout=self.timeout)
+        self.client = instructor.from_groq(
+            Groq(api_key=self.api_key, base_url=self.base_url, http_client=self.http_client,
+                 timeout=self.timeout, max_retries=self.max_retries),
+            mode=instructor.Mode.TOOLS,
+        )
+        self.async_http_client = None
+        self.async_client = None
+        self.async_loop = None
+        self.telemetry = telemetry or get_telemetry()
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if self.async_client is None or self.async_loop is not loop:
+            self.async_http_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            self.async_client = instructor.from_groq(
+                AsyncGroq(api_key=self.api_key, base_url=self.base_url, http_client=self.async_http_client,
+                          timeout=self.timeout, max_retries=0),
+                mode=instructor.Mode.TOOLS,
+            )
+            self.async_loop = loop
+        return self.async_client
+
+    @staticmethod
+    def _validation_retries(retrying=Retrying):
+        # instructor would otherwise retry every error, and wrap 429s where is_throttle_error cannot see them
+        return retrying(
+            stop=stop_after_attempt(config.LLM_VALIDATION_ATTEMPTS),
+            retry=retry_if_exception_type((ValidationError, JSONDecodeError)),
+            reraise=True,
+        )
+
+    @staticmethod
+    def _request_status(e: Exception) -> str:
+        return "throttled" if getattr(e, "status_code", None) == 429 else "error"
+
+    @staticmethod
+    def is_throttle_error(e: Exception) -> bool:
+        """Whether e means the provider is overloaded, so the request should be paced and retried."""
+        if isinstance(e, (RateLimitError, APITimeoutError)):
+            return True
+        return getattr(e, "status_code", None) in (429, 503)
+
+    @staticmethod
+    def retry_after(e: Exception):
+        response = getattr(e, "response", None)
+        if response is None:
+            return None
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    def create(self, model: str, messages: list, response_model, timeout: float = None):
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        started = time.perf_counter()
+        try:
+            output, completion = self.client.chat.completions.create_with_completion(
+                model=model, messages=messages, response_model=response_model,
+                max_retries=self._validation_retries(), **kwargs
+            )
+        except Exception as e:
+            self.telemetry.record_request(model, time.perf_counter() - started, self._request_status(e))
+            raise
+        self.telemetry.record_request(model, time.perf_counter() - started, usage=getattr(completion, "usage", None))
+        return output
+
+    async def acreate(self, model: str, messages: list, response_model, timeout: float = None):
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        started = time.perf_counter()
+        try:
+            output, completion = await self._get_async_client().chat.completions.create_with_completion(
+                model=model, messages=messages, response_model=response_model,
+                max_retries=self._validation_retries(AsyncRetrying), **kwargs
+            )
+        except Exception as e:
+            self.telemetry.record_request(model, time.perf_counter() - started, self._request_status(e))
+            raise
+        self.telemetry.record_request(model, time.perf_counter() - started, usage=getattr(completion, "usage", None))
+        return output
+
+    async def aclose(self):
+        if self.async_http_client is not None:
+            await self.async_http_client.aclose()
+            self.async_http_client = None
+            self.async_client = None
+
+    def close(self):
+        self.http_client.close()
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """Return the process-wide LLMClient, creating it on first use."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient()
+            logger.info("Created shared LLM client")
+        return _shared_client
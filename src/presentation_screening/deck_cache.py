@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from file_parser import PARSER_VERSION
+
+
+class DeckCache:
+    """
+    Persistent cache of parsed decks.
+
+    Entries are keyed by the SHA-256 of the file bytes, its format and the
+    parser version, so an unchanged deck is never parsed twice, whatever its
+    name or the review prompt. Each entry holds the per-slide text and the
+    hashes of the deck's distinct images as compressed JSON. The cache is
+    bounded by age and by total stored bytes, least recently used first.
+
+    As in ReviewCache, the stored size is a running total, recounted every
+    RECOUNT_PUTS puts, and a full cache is evicted down to LOW_WATER of max_bytes.
+    """
+
+    RECOUNT_PUTS = 256
+    LOW_WATER = 0.9
+
+    def __init__(self, db_path: str = "./deck_cache.sqlite3", max_bytes: int = 256 * 1024 * 1024,
+                 max_age: float = 30 * 24 * 3600):
+        """
+        Args:
+            max_bytes (int): Total size of the compressed entries.
+            max_age (float): Seconds since an entry was last used before it is dropped; None to keep it.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.keys = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS decks (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS decks_last_access ON decks (last_access)")
+        self.conn.commit()
+        self.total = self._stored_bytes()
+        self.puts = 0
+
+    def file_key(self, file_path: str) -> str:
+        # hashed once per version of the file seen by this process
+        stat = os.stat(file_path)
+        memo = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        key = self.keys.get(memo)
+        if key is None:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            kind = "pdf" if file_path.lower().endswith(".pdf") else "pptx"
+            key = self.keys[memo] = f"{digest.hexdigest()}:{kind}:{PARSER_VERSION}"
+        return key
+
+    def contains(self, key: str) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM decks WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str):
+        """The cached {"text", "image_hashes"} of a deck, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM decks WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE decks SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        try:
+            deck = json.loads(zlib.decompress(row[0]))
+        except (zlib.error, ValueError):
+            self.logger.warning(f"Dropping unreadable deck cache entry: {key}")
+            self.delete(key)
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return deck
+
+    def put(self, key: str, deck: dict):
+        value = zlib.compress(json.dumps(
+            {"text": deck["text"], "image_hashes": deck["image_hashes"]}, separators=(",", ":")
+        ).encode("utf-8"))
+        with self.lock:
+            replaced = self._size(key)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO decks (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self.conn.commit()
+            self.total += len(value) - replaced
+            self.puts += 1
+            if self.puts % self.RECOUNT_PUTS == 0:
+                self.total = self._stored_bytes()
+            self._evict(self.max_age, self.max_bytes, self.max_bytes * self.LOW_WATER)
+
+    def delete(self, key: str):
+        with self.lock:
+            size = self._size(key)
+            self.conn.execute("DELETE FROM decks WHERE key = ?", (key,))
+            self.conn.commit()
+            self.total -= size
+
+    def _size(self, key: str) -> int:
+        row = self.conn.execute("SELECT size FROM decks WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _stored_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM decks").fetchone()[0]
+
+    def evict(self, max_age: float = None, max_bytes: int = None) -> int:
+        """
+        Drop entries unused for more than max_age seconds, then the least recently
+        used ones until at most max_bytes remain. Both default to the cache's limits.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self.lock:
+            return self._evict(self.max_age if max_age is None else max_age,
+                               self.max_bytes if max_bytes is None else max_bytes)
+
+    def _evict(self, max_age, max_bytes, target=None) -> int:
+        evicted = 0
+        if max_age is not None:
+            cutoff = time.time() - max_age
+            # a range of the last_access index, empty unless entries have expired
+            expired, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM decks WHERE last_access < ?", (cutoff,)
+            ).fetchone()
+            if expired:
+                self.conn.execute("DELETE FROM decks WHERE last_access < ?", (cutoff,))
+                self.total -= size
+                evicted += expired
+        if self.total > max_bytes:
+            target = max_bytes if target is None else target
+            keys = []
+            # oldest first, read only as far as needed to get under the target
+            for key, size in self.conn.execute("SELECT key, size FROM decks ORDER BY last_access ASC"):
+                if self.total <= target:
+                    break
+                keys.append((key,))
+                self.total -= size
+            self.conn.executemany("DELETE FROM decks WHERE key = ?", keys)
+            evicted += len(keys)
+        if evicted:
+            self.conn.commit()
+            self.logger.info(f"Evicted {evicted} cached decks")
+        return evicted
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM decks").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -1,51 +1,27 @@
 import os
 import json
 import time
+import asyncio
 import logging
-from collections import defaultdict
-from groq import Groq
-import instructor
-from ppt_eval_model import PresentationReviewModel
-from pptx import Presentation
-import requests
-from io import BytesIO
-from pathlib import Path
+from ppt_eval_model import EvaluationModel
+from file_parser import parse_deck
+from llm_client import LLMClient, get_client
+from rate_limiter import RateLimiter
+from downloader import Downloader, filename_from_url, get_downloader
+from score_aggregator import ScoreAggregator
+from parse_service import ParseService, ParseFailed, OK, ERROR, failure
+from deck_cache import DeckCache
+from review_cache import ReviewCache
+from telemetry import Telemetry, get_telemetry
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
 
-class PresentationAnalyser:
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-
-    def extract_ppt_content(self, file_path: str):
-        try:
-            prs = Presentation(file_path)
-        except Exception as e:
-            self.logger.error(f"Error opening presentation file {file_path}: {str(e)}")
-            return []
+MODEL = "llama-3.1-70b-versatile"
+# decks accepted at ingestion; PDFs are read page by page, presentations slide by slide
+DECK_EXTENSIONS = ('.ppt', '.pptx', '.pdf')
+COMPLETION_TOKENS_ESTIMATE = 1200
 
-        content = {}
-        for i, slide in enumerate(prs.slides):
-            slide_content = [
-                shape.text for shape in slide.shapes if hasattr(shape, 'text')
-            ]
-            content[f"Slide {i + 1}"] = '\n'.join(slide_content)
-
-        return content
-    
-    def save_file(self, file_url, download_dir):
-        try:
-            response = requests.get(file_url)
-            response.raise_for_status()
-            with open(Path(download_dir + f"/{file_url.split("/")[-1]}"), 'wb') as f:
-                f.write(response.content)
-            self.logger.info(f"File downloaded and saved to {download_dir}")
-        except requests.RequestException as e:
-            self.logger.error(f"Error downloading file from {file_url}: {str(e)}")
-        
-
-    def getOutput(self, filePath: str):
-        sys_prompt = """
+SYS_PROMPT = """
 You are an expert presentation reviewer tasked with evaluating project pitches for a prestigious hackathon. Your mission is to provide comprehensive, insightful, and impartial reviews that will assist the judges in their final evaluation. Analyze the given presentation content meticulously, considering the unique context of a hackathon environment.
 
 ## Core Evaluation Criteria:
@@ -100,25 +76,156 @@ Follow the provided model structure for your review. Ensure all fields are compl
 Remember, your evaluation could be the deciding factor in selecting groundbreaking projects. Approach this task with the utmost diligence and expertise.
         """
 
-        client = Groq(api_key="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")
-        client = instructor.from_groq(client, mode=instructor.Mode.TOOLS)
-
-        output = client.chat.completions.create(
-            model="llama-3.1-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": sys_prompt
-                },
-                {
-                    "role": "user",
-                    "content": self.extract_ppt_content(filePath),
-                }
-            ],
-            response_model=PresentationReviewModel,
+class PresentationAnalyser:
+    def __init__(self, llm: LLMClient = None, telemetry: Telemetry = None, downloader: Downloader = None,
+                 parser: ParseService = None, deck_cache: DeckCache = None, review_cache: ReviewCache = None):
+        self.logger = logging.getLogger(__name__)
+        self.llm = llm or get_client()
+        self.downloader = downloader
+        # with a parse service, decks are parsed in worker processes under a timeout and memory cap
+        self.parser = parser
+        # parsed decks keyed by content, so unchanged decks are not parsed again on re-runs
+        self.deckCache = deck_cache
+        # reviews keyed by deck content, prompt and model, so a deck is not sent to the model twice
+        self.reviewCache = review_cache
+        self.aggregators = {}
+        self.telemetry = telemetry or get_telemetry()
+        # job workers share score logs with other processes, so they only append
+        self.compactScores = True
+
+    @staticmethod
+    def isDeck(file_name: str) -> bool:
+        return file_name.lower().endswith(DECK_EXTENSIONS)
+
+    @staticmethod
+    def contentLabel(file_path: str) -> str:
+        return "Page" if file_path.lower().endswith(".pdf") else "Slide"
+
+    def extract_content(self, file_path: str, parsed=None):
+        """
+        Text of a .pptx or .pdf deck as {"Slide n"/"Page n": text}; images are never loaded for the review.
+        Raises ParseFailed for a deck that cannot be read or has no text, so it is never reviewed.
+        """
+        key = self.deckCache.file_key(file_path) if self.deckCache is not None else None
+        # a parse already submitted to the service means the cache was checked
+        deck = self.deckCache.get(key) if key is not None and parsed is None else None
+        if deck is None:
+            deck = self.parseDeck(file_path, parsed)
+            if key is not None:
+                self.deckCache.put(key, deck)
+        if not any(text and text.strip() for text in deck["text"]):
+            # every empty deck would share one review cache key, and one review
+            raise ParseFailed(failure(file_path, ERROR, "no text to review"))
+        label = self.contentLabel(file_path)
+        return {f"{label} {number}": text for number, text in enumerate(deck["text"], 1)}
+
+    def parseDeck(self, file_path: str, parsed=None):
+        if self.parser is not None:
+            result = (parsed or self.submitParse(file_path)).result()
+            if result["status"] != OK:
+                raise ParseFailed(result)
+            return result
+        try:
+            return parse_deck(file_path, image_hashes=self.deckCache is not None)
+        except Exception as e:
+            raise ParseFailed(failure(file_path, ERROR, f"{type(e).__name__}: {str(e)}")) from e
+
+    def submitParse(self, file_path: str):
+        # image hashes are only worth extracting when they are cached
+        return self.parser.submit(file_path, image_hashes=self.deckCache is not None)
+
+    def isCached(self, file_path: str) -> bool:
+        return self.deckCache is not None and self.deckCache.contains(self.deckCache.file_key(file_path))
+
+    async def extractContentAsync(self, file_path: str):
+        if self.parser is None or await asyncio.to_thread(self.isCached, file_path):
+            return await asyncio.to_thread(self.extract_content, file_path)
+        parsed = self.submitParse(file_path)
+        await asyncio.wrap_future(parsed)
+        # storing the parse in the deck cache is a SQLite write, kept off the event loop
+        return await asyncio.to_thread(self.extract_content, file_path, parsed)
+    
+    def save_file(self, file_url, download_dir):
+        try:
+            (self.downloader or get_downloader()).download(file_url, os.path.join(download_dir, filename_from_url(file_url)))
+            self.logger.info(f"File downloaded and saved to {download_dir}")
+        except Exception as e:
+            self.logger.error(f"Error downloading file from {file_url}: {str(e)}")
+
+    def save_files(self, file_urls, download_dir):
+        """Download several decks into download_dir concurrently; failures are logged and skipped."""
+        return (self.downloader or get_downloader()).download_many(
+            (file_url, os.path.join(download_dir, filename_from_url(file_url))) for file_url in file_urls
         )
+
+
+    def buildMessages(self, content):
+        return [
+            {
+                "role": "system",
+                "content": SYS_PROMPT
+            },
+            {
+                "role": "user",
+                "content": json.dumps(content, indent=2),
+            }
+        ]
+
+    def estimateTokens(self, content) -> int:
+        # ~4 characters per token is close enough to pace the tokens/minute bucket
+        return (len(SYS_PROMPT) + len(json.dumps(content, indent=2))) // 4 + COMPLETION_TOKENS_ESTIMATE
+
+    def reviewKey(self, content):
+        if self.reviewCache is None:
+            return None
+        return self.reviewCache.make_key(json.dumps(content, sort_keys=True), SYS_PROMPT, MODEL, EvaluationModel)
+
+    def cachedReview(self, key):
+        return self.reviewCache.get(key, EvaluationModel) if key is not None else None
+
+    def cacheReview(self, key, review):
+        if key is not None:
+            self.reviewCache.put(key, review, SYS_PROMPT, MODEL)
+
+    def getOutput(self, filePath: str, parsed=None):
+
+        with self.telemetry.stage("extract"):
+            content = self.extract_content(filePath, parsed)
+        key = self.reviewKey(content)
+        output = self.cachedReview(key)
+        if output is not None:
+            return output
+        output = self.llm.create(
+            model=MODEL,
+            messages=self.buildMessages(content),
+            response_model=EvaluationModel,
+        )
+        self.cacheReview(key, output)
         return output
 
+    async def getOutputAsync(self, filePath: str, limiter: RateLimiter, max_retries=5):
+        with self.telemetry.stage("extract"):
+            content = await self.extractContentAsync(filePath)
+        key = self.reviewKey(content)
+        # cache hits never touch the rate limiter
+        output = await asyncio.to_thread(self.cachedReview, key)
+        if output is not None:
+            return output
+        for attempt in range(max_retries + 1):
+            with self.telemetry.stage("rate_limit_wait"):
+                await limiter.acquire(self.estimateTokens(content))
+            try:
+                with self.telemetry.inflight("llm_requests_in_flight"):
+                    output = await self.llm.acreate(model=MODEL, messages=self.buildMessages(content), response_model=EvaluationModel)
+            except Exception as e:
+                if self.llm.is_throttle_error(e) and attempt < max_retries:
+                    limiter.on_throttle(self.llm.retry_after(e))
+                    continue
+                raise
+            limiter.on_success()
+            await asyncio.to_thread(self.cacheReview, key, output)
+            return output
+
     def processPresentations(self, root_folder):
         mapping = {}
         
@@ -126,8 +233,10 @@ Remember, your evaluation could be the deciding factor in selecting groundbreaki
             teamPath = os.path.join(root_folder, teamName)
             if os.path.isdir(teamPath):
                 logging.info(f"Processing team presentation: {teamPath}")
-                self.processPresentation(teamPath, mapping)
-                self.finalScores(teamPath)
+                with self.telemetry.scope(team=teamName):
+                    with self.telemetry.stage("presentation"):
+                        self.processPresentation(teamPath, mapping)
+                    self.finalScores(teamPath)
 
         with open(os.path.join(root_folder, "presentation_output_mapping.json"), "w") as f:
             json.dump(mapping, f, indent=2)
@@ -135,54 +244,119 @@ Remember, your evaluation could be the deciding factor in selecting groundbreaki
     def processPresentation(self, teamPath, mapping):
         outputFolder = os.path.join(teamPath, "output_data")
         os.makedirs(outputFolder, exist_ok=True)
-        for file in os.listdir(teamPath):
-            if file.endswith(('.ppt', '.pptx')):
-                filePath = os.path.join(teamPath, file)
-                logging.info(f"\tProcessing presentation: {filePath}")
-                self.processPPT(filePath, outputFolder, mapping)
-            time.sleep(0.75)
-
-    def processPPT(self, filePath, outputFolder, mapping):
+        files = [file for file in os.listdir(teamPath) if self.isDeck(file)]
+        # the team's decks are parsed ahead while earlier ones are being reviewed
+        parsed = {
+            file: self.submitParse(os.path.join(teamPath, file))
+            for file in files if not self.isCached(os.path.join(teamPath, file))
+        } if self.parser is not None else {}
+        for file in files:
+            filePath = os.path.join(teamPath, file)
+            logging.info(f"\tProcessing presentation: {filePath}")
+            self.processPPT(filePath, outputFolder, mapping, parsed.get(file))
+            with self.telemetry.stage("throttle_sleep"):
+                time.sleep(0.75)
+
+    def processPPT(self, filePath, outputFolder, mapping, parsed=None):
         try:
-            output = self.getOutput(filePath).model_dump_json(indent=2)
-            outputFilePath = os.path.join(outputFolder, f"{os.path.splitext(os.path.basename(filePath))[0]}_evaluation.json")
-            
-            with open(outputFilePath, "w", encoding="utf-8") as f:
-                f.write(output)
-            
-            mapping[filePath] = outputFilePath
+            self.evaluatePPT(filePath, outputFolder, mapping, parsed)
+        except ParseFailed as e:
+            # nothing to review; the other decks carry on
+            self.telemetry.inc("presentations_total", outcome="unparseable")
+            self.logger.warning(f"Skipping presentation {filePath}: {e.result['status']} ({e.result['error']})")
         except Exception as e:
+            self.telemetry.inc("presentations_total", outcome="failed")
             self.logger.info(f"Error processing file {filePath}: {str(e)}")
 
-    def finalScores(self, teamPath):
-        directory = os.path.join(teamPath, "output_data")
-        score_aggregation = defaultdict(int)
-        files = 0
+    def evaluatePPT(self, filePath, outputFolder, mapping, parsed=None):
+        review = self.getOutput(filePath, parsed)
+        self.saveReview(filePath, outputFolder, mapping, review)
+
+    def saveReview(self, filePath, outputFolder, mapping, review):
+        outputFilePath = self.outputPath(filePath, outputFolder)
+
+        with open(outputFilePath, "w", encoding="utf-8") as f:
+            f.write(review.model_dump_json(indent=2))
+
+        mapping[filePath] = outputFilePath
+        self.aggregator(outputFolder).add(os.path.basename(filePath), review)
+        self.telemetry.inc("presentations_total", outcome="reviewed")
 
-        for filename in os.listdir(directory):
-            if filename.endswith('_evaluation.json'):
-                with open(os.path.join(directory, filename), 'r') as file:
-                    data = json.load(file)
+    def processPresentationsAsync(self, root_folder, concurrency=8, requests_per_minute=30, tokens_per_minute=6000, max_retries=5):
+        """
+        Evaluate every team's decks with up to `concurrency` requests in flight,
+        all paced by one rate limiter, writing each review as soon as it arrives.
+        """
+        limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+        return asyncio.run(self._processPresentationsAsync(root_folder, limiter, concurrency, max_retries))
+
+    async def _processPresentationsAsync(self, root_folder, limiter, concurrency, max_retries):
+        mapping = {}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def reviewTeam(teamPath):
+            logging.info(f"Processing team presentation: {teamPath}")
+            # each team runs in its own task, so the scope covers only its decks
+            with self.telemetry.scope(team=os.path.basename(teamPath)):
+                with self.telemetry.stage("presentation"):
+                    await self.processPresentationAsync(teamPath, mapping, limiter, semaphore, max_retries)
+                self.finalScores(teamPath)
+
+        teamPaths = [os.path.join(root_folder, teamName) for teamName in os.listdir(root_folder)]
+        await asyncio.gather(*(reviewTeam(teamPath) for teamPath in teamPaths if os.path.isdir(teamPath)))
+        await self.llm.aclose()
+
+        with open(os.path.join(root_folder, "presentation_output_mapping.json"), "w") as f:
+            json.dump(mapping, f, indent=2)
 
-                for key, value in data.items():
-                    if isinstance(value, dict) and 'score' in value:
-                        score_aggregation[key] += value['score']
-            files += 1
+        if self.deckCache is not None:
+            self.logger.info(f"Deck cache stats: {self.deckCache.stats()}")
+        if self.reviewCache is not None:
+            self.logger.info(f"Review cache stats: {self.reviewCache.stats()}")
+
+    async def processPresentationAsync(self, teamPath, mapping, limiter, semaphore, max_retries=5):
+        outputFolder = os.path.join(teamPath, "output_data")
+        os.makedirs(outputFolder, exist_ok=True)
+        await asyncio.gather(*(
+            self.processPPTAsync(os.path.join(teamPath, file), outputFolder, mapping, limiter, semaphore, max_retries)
+            for file in os.listdir(teamPath) if self.isDeck(file)
+        ))
 
-        for category in score_aggregation:
-            score_aggregation[category] = round(score_aggregation[category]/files)
+    async def processPPTAsync(self, filePath, outputFolder, mapping, limiter, semaphore, max_retries=5):
+        self.telemetry.add("presentation_queue_depth", 1)
+        async with semaphore:
+            self.telemetry.add("presentation_queue_depth", -1)
+            logging.info(f"\tProcessing presentation: {filePath}")
+            try:
+                # decks are only parsed once a slot is free, so memory stays bounded
+                review = await self.getOutputAsync(filePath, limiter, max_retries)
+                self.saveReview(filePath, outputFolder, mapping, review)
+            except ParseFailed as e:
+                self.telemetry.inc("presentations_total", outcome="unparseable")
+                self.logger.warning(f"Skipping presentation {filePath}: {e.result['status']} ({e.result['error']})")
+            except Exception as e:
+                self.telemetry.inc("presentations_total", outcome="failed")
+                self.logger.info(f"Error processing file {filePath}: {str(e)}")
 
-        output_data = {
-            "scores_by_category": dict(score_aggregation)
-        }
+    def outputPath(self, filePath, outputFolder):
+        return os.path.join(outputFolder, f"{os.path.splitext(os.path.basename(filePath))[0]}_evaluation.json")
 
-        output_file = os.path.join(teamPath, "output_data/scores_summary.json")
-        with open(output_file, 'w') as file:
-            json.dump(output_data, file, indent=2)
+    def aggregator(self, outputFolder) -> ScoreAggregator:
+        outputFolder = os.path.normpath(outputFolder)
+        if outputFolder not in self.aggregators:
+            self.aggregators[outputFolder] = ScoreAggregator(os.path.join(outputFolder, "scores.log"), compact=self.compactScores)
+        return self.aggregators[outputFolder]
 
-        self.logger.info(f"Scores summary saved to: {output_file}")
+    def finalScores(self, teamPath):
+        outputFolder = os.path.join(teamPath, "output_data")
+        os.makedirs(outputFolder, exist_ok=True)
+        with self.telemetry.stage("aggregate"):
+            self.aggregator(outputFolder).write_summary(os.path.join(outputFolder, "scores_summary.json"))
+        # the team is done; a later run replays the score log again
+        self.aggregators.pop(os.path.normpath(outputFolder)).close()
 
 if __name__ == "__main__":
     base_path = "./team_presentations"
-    presentation_analyser = PresentationAnalyser()
-    presentation_analyser.extract_ppt_content(base_path)
\ No newline at end of file
+    presentation_analyser = PresentationAnalyser(deck_cache=DeckCache("./deck_cache.sqlite3"),
+                                                 review_cache=ReviewCache("./presentation_review_cache.sqlite3"))
+    presentation_analyser.processPresentationsAsync(base_path)
\ No newline at end of file
@@ -1,45 +1,31 @@
-import requests
-from pptx import Presentation
 from PIL import Image
 from io import BytesIO
+from downloader import get_downloader
+from file_parser import iter_slides, iter_images
 
 class PresentationPreprocesser:
     def __init__(self, url, file_path) -> None:
         self.url = url
+        self.file_path = file_path
     
     def _download_content(self):
-        response = requests.get(self.url)
-        response.raise_for_status()
-        return response
-    
-    def _save_content(self, content, file_path):
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        # streamed straight to file_path; skipped if the copy there is still current
+        get_downloader().download(self.url, self.file_path)
+        return self.file_path
 
-    def _data_extractor(self):
-        prs = Presentation(self.file_path)
-        text_runs = []
-        img_runs = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text_runs.append(shape.text)
-                if shape.shape_type == 13:
-                    image = shape.image
-                    image_bytes = image.blob
-                    img_runs.append(image_bytes)
-        return {"text" : "\n".join(text_runs),
-                "images" : img_runs}
+    def _data_extractor(self, images=True, max_image_size=None):
+        # each distinct image once, optionally downscaled; none at all when only the text is needed
+        return {"text" : "\n".join(text for _, text in iter_slides(self.file_path)),
+                "images" : [data for _, data in iter_images(self.file_path, max_size=max_image_size)] if images else []}
     
     # def _save_data(self, image_bytes, file_path):
     #     im = Image.open(BytesIO(image_bytes))
     #     im.save(file_path)
     #     im.show()
 
-    def process(self):
-        response = self._download_content()
-        self._save_content(response.content)
-        data = self._data_extractor()
+    def process(self, images=True, max_image_size=None):
+        self._download_content()
+        data = self._data_extractor(images, max_image_size)
         return data
     
 
@@ -1,45 +1,171 @@
-import requests
+import os
+import hashlib
+import tempfile
 from io import BytesIO
 from pptx import Presentation
-from PyPDF2 import PdfReader
+from pypdf import PdfReader
+from pypdf.generic import StreamObject
 from PIL import Image
+from downloader import filename_from_url, get_downloader
 
-def parse_file(file_url):
-    response = requests.get(file_url)
-    file_content = BytesIO(response.content)
-    
-    if file_url.endswith('.pptx') or file_url.endswith('.ppt'):
-        return parse_ppt(file_content)
-    elif file_url.endswith('.pdf'):
-        return parse_pdf(file_content)
-    else:
-        raise ValueError("Unsupported file format")
-
-def parse_ppt(file_content):
-    prs = Presentation(file_content)
-    text_content = []
-    image_bytes = []
-    
+# bump whenever extraction changes, so cached parses are not reused
+PARSER_VERSION = 4
+
+def parse_file(file_url, images=True, max_image_size=None, cache=None):
+    file_name = filename_from_url(file_url)
+    parser_for(file_name)
+
+    # streamed to disk rather than buffered, and parsed from there
+    with tempfile.TemporaryDirectory() as download_dir:
+        file_path = os.path.join(download_dir, file_name)
+        get_downloader().download(file_url, file_path)
+        if cache is None:
+            return parse_path(file_path, images, max_image_size)
+        # the cache keeps text and image hashes, not the images themselves
+        key = cache.file_key(file_path)
+        deck = None if images else cache.get(key)
+        if deck is None:
+            deck = parse_deck(file_path, images, max_image_size)
+            cache.put(key, deck)
+        return deck["text"], deck.get("images", [])
+
+def parser_for(file_name):
+    if file_name.lower().endswith(('.pptx', '.ppt')):
+        return parse_ppt
+    elif file_name.lower().endswith('.pdf'):
+        return parse_pdf
+    raise ValueError("Unsupported file format")
+
+def parse_path(file_path, images=True, max_image_size=None):
+    return parser_for(file_path)(file_path, images, max_image_size)
+
+def parse_deck(file_path, images=False, max_image_size=None, image_hashes=True):
+    """
+    Text per slide or page, the hashes of the deck's distinct images and, only
+    if asked for, the images themselves: {"text", "image_hashes", "images"}.
+    """
+    parser_for(file_path)
+    pdf = file_path.lower().endswith('.pdf')
+    # the deck is read once for both its text and its images
+    deck = open_deck(file_path, pdf)
+    text_content = [text for _, text in (iter_pages(deck) if pdf else iter_slides(deck))]
+    hashes, image_bytes = [], []
+    if not (images or image_hashes):
+        return {"text": text_content, "image_hashes": hashes, "images": image_bytes}
+    for digest, data in iter_images(deck, pdf=pdf, max_size=max_image_size, load=images):
+        hashes.append(digest)
+        if images:
+            image_bytes.append(data)
+    return {"text": text_content, "image_hashes": hashes, "images": image_bytes}
+
+def open_deck(file_content, pdf=False):
+    """A Presentation or PdfReader for a path or stream; an already opened deck is returned as is."""
+    if isinstance(file_content, PdfReader) or hasattr(file_content, 'slides'):
+        return file_content
+    return PdfReader(file_content) if pdf else Presentation(file_content)
+
+def slide_text(slide):
+    return '\n'.join(shape.text for shape in slide.shapes if hasattr(shape, 'text'))
+
+def iter_slides(file_content):
+    """Yield (slide number, text) of a .pptx deck, one slide at a time."""
+    prs = open_deck(file_content)
+    for number, slide in enumerate(prs.slides, 1):
+        yield number, slide_text(slide)
+
+def iter_pages(file_content):
+    """Yield (page number, text) of a PDF, one page at a time."""
+    reader = open_deck(file_content, pdf=True)
+    for number, page in enumerate(reader.pages, 1):
+        yield number, page.extract_text()
+
+def iter_text(file_path):
+    if file_path.lower().endswith('.pdf'):
+        return iter_pages(file_path)
+    return iter_slides(file_path)
+
+def iter_images(file_content, pdf=False, max_size=None, seen=None, load=True):
+    """
+    Yield (sha1, image bytes) for every distinct image of a deck, one at a time.
+
+    Repeated images such as logos and backgrounds are yielded once, also across
+    calls that share the same seen set. With max_size, images are downscaled to
+    fit within max_size x max_size pixels. With load=False only the hashes are
+    yielded, as (sha1, None).
+    """
+    seen = set() if seen is None else seen
+    for digest, read in (_pdf_images(file_content) if pdf else _ppt_images(file_content)):
+        if digest in seen:
+            continue
+        seen.add(digest)
+        if not load:
+            yield digest, None
+            continue
+        data = read()
+        yield digest, data if max_size is None else downscale(data, max_size)
+
+def _ppt_images(file_content):
+    prs = open_deck(file_content)
     for slide in prs.slides:
         for shape in slide.shapes:
-            if hasattr(shape, 'text'):
-                text_content.append(shape.text)
             if shape.shape_type == 13:
+                # pptx keeps one part per distinct image and knows its hash without copying the blob
                 image = shape.image
-                image_bytes.append(image.blob)
-    
-    return text_content, image_bytes
+                yield image.sha1, lambda image=image: image.blob
 
-def parse_pdf(file_content):
-    reader = PdfReader(file_content)
-    text_content = []
-    image_bytes = []
-    
+def _pdf_image_streams(resources, path=(), visited=None):
+    """Yield (name path, stream) of the image XObjects under a page's or form's resources."""
+    visited = set() if visited is None else visited
+    xobjects = resources.get_object().get('/XObject') if resources is not None else None
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in xobjects:
+        stream = xobjects[name]
+        if not isinstance(stream, StreamObject):
+            continue
+        if stream.get('/Subtype') == '/Image':
+            yield (*path, name), stream
+        elif id(stream) not in visited:
+            # forms can hold images of their own, and can reference each other
+            visited.add(id(stream))
+            yield from _pdf_image_streams(stream.get('/Resources'), (*path, name), visited)
+
+def _pdf_images(file_content):
+    reader = open_deck(file_content, pdf=True)
     for page in reader.pages:
-        text_content.append(page.extract_text())
-        for image_file_object in page.images:
-            image_bytes.append(image_file_object.data)
-    
+        for path, stream in _pdf_image_streams(page.get('/Resources')):
+            # hashed from the stream's data, so the image itself is only decoded if it is loaded
+            digest = hashlib.sha1(stream.get_data()).hexdigest()
+            yield digest, lambda page=page, path=path: page.images[path[0] if len(path) == 1 else list(path)].data
+        # inline images live in the content stream rather than the resources, and are small
+        inline = dict.fromkeys(name for name in page.images.keys() if isinstance(name, str) and name.startswith('~'))
+        for name in inline:
+            data = page.images[name].data
+            yield hashlib.sha1(data).hexdigest(), lambda data=data: data
+
+def downscale(data, max_size):
+    with Image.open(BytesIO(data)) as image:
+        if max(image.size) <= max_size:
+            return data
+        image_format = image.format if image.format in ('JPEG', 'PNG', 'GIF', 'WEBP') else 'PNG'
+        image.thumbnail((max_size, max_size))
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = BytesIO()
+        image.save(output, format=image_format)
+        return output.getvalue()
+
+def parse_ppt(file_content, images=True, max_image_size=None):
+    prs = open_deck(file_content)
+    text_content = [text for _, text in iter_slides(prs)]
+    image_bytes = [data for _, data in iter_images(prs, max_size=max_image_size)] if images else []
+    return text_content, image_bytes
+
+def parse_pdf(file_content, images=True, max_image_size=None):
+    reader = open_deck(file_content, pdf=True)
+    text_content = [text for _, text in iter_pages(reader)]
+    image_bytes = [data for _, data in iter_images(reader, pdf=True, max_size=max_image_size)] if images else []
     return text_content, image_bytes
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+"""
+Parse Service
+
+Parses presentations in a pool of worker processes. Every deck gets a
+wall-clock timeout and a memory cap; a worker that exceeds either, or
+crashes, is killed and replaced and the deck is reported as a structured
+failure, while the other decks keep flowing.
+"""
+
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+import config
+from telemetry import Telemetry, get_telemetry
+from file_parser import parse_deck
+
+try:
+    import resource
+except ImportError:
+    # no address-space limits outside Unix; timeouts and crash isolation still apply
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+TIMEOUT = "timeout"
+MEMORY = "memory"
+CRASHED = "crashed"
+ERROR = "error"
+
+
+class ParseFailed(Exception):
+    def __init__(self, result: dict):
+        super().__init__(f"{result['file']}: {result['status']} ({result['error']})")
+        self.result = result
+
+
+def failure(file_path: str, status: str, error: str, seconds: float = 0.0) -> dict:
+    return {"file": file_path, "status": status, "text": None, "image_hashes": None, "images": None,
+            "error": error, "seconds": seconds}
+
+
+def limit_memory(max_bytes: int):
+    if resource is None or not max_bytes:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+def _worker(conn, max_memory):
+    limit_memory(max_memory)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        file_path, images, max_image_size, image_hashes = task
+        try:
+            conn.send((OK, parse_deck(file_path, images, max_image_size, image_hashes)))
+        except MemoryError:
+            # the heap may be in any state after this, so the worker is replaced
+            conn.send((MEMORY, "memory limit exceeded"))
+            return
+        except Exception as e:
+            conn.send((ERROR, f"{type(e).__name__}: {str(e)}"))
+
+
+class ParseService:
+    """
+    Decks are parsed by parse_deck in up to max_workers processes, so the text
+    and images are exactly those of the in-process parsers. submit returns a
+    Future that resolves to a result dict, never to an exception:
+
+        {"file", "status", "text", "image_hashes", "images", "error", "seconds"}
+
+    where status is OK, or TIMEOUT, MEMORY, CRASHED or ERROR with the reason in
+    error. Workers are started on first use and reused across decks.
+    """
+
+    def __init__(self, max_workers: int = None, timeout: float = None, max_memory: int = None,
+                 telemetry: Telemetry = None):
+        """
+        Args:
+            max_workers (int): Worker processes, i.e. decks parsed at once.
+            timeout (float): Wall-clock seconds a deck may take before its worker is killed.
+            max_memory (int): Address space of a worker in bytes; 0 for no limit.
+        """
+        self.max_workers = max_workers or config.PARSE_MAX_WORKERS
+        self.timeout = timeout or config.PARSE_TIMEOUT
+        self.max_memory = config.PARSE_MAX_MEMORY if max_memory is None else max_memory
+        self.telemetry = telemetry or get_telemetry()
+        # workers start from a fresh interpreter rather than a fork of this threaded process
+        self.context = multiprocessing.get_context("spawn")
+        self.tasks = queue.Queue()
+        self.wake_reader, self.wake_writer = multiprocessing.Pipe(duplex=False)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, file_path: str, images: bool = False, max_image_size: int = None, image_hashes: bool = True) -> Future:
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("ParseService is closed")
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._dispatch, name="parse-service", daemon=True)
+                self.thread.start()
+            self.tasks.put((future, (file_path, images, max_image_size, image_hashes)))
+            self.wake_writer.send_bytes(b"")
+        return future
+
+    def parse(self, file_path: str, images: bool = False, max_image_size: int = None) -> dict:
+        return self.submit(file_path, images, max_image_size).result()
+
+    def parse_many(self, file_paths, images: bool = False, max_image_size: int = None):
+        """Yield (file_path, result) in the given order while later decks are still being parsed."""
+        futures = [(file_path, self.submit(file_path, images, max_image_size)) for file_path in file_paths]
+        for file_path, future in futures:
+            yield file_path, future.result()
+
+    def close(self):
+        """Finish the submitted decks and stop the workers."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self.thread
+            self.wake_writer.send_bytes(b"")
+        if thread is not None:
+            thread.join()
+        self.wake_reader.close()
+        self.wake_writer.close()
+
+    def _spawn(self):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker, args=(child_conn, self.max_memory), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    @staticmethod
+    def _stop(worker, kill=False):
+        process, conn = worker
+        if kill:
+            process.kill()
+        else:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        conn.close()
+
+    def _finish(self, task, status, started, payload=None, error=None):
+        future, (file_path, *_) = task
+        seconds = time.monotonic() - started
+        self.telemetry.inc("parse_total", outcome=status)
+        self.telemetry.observe("parse_seconds", seconds, outcome=status)
+        if status != OK:
+            logger.warning(f"Could not parse {file_path}: {status} ({error})")
+            future.set_result(failure(file_path, status, error, seconds))
+            return
+        future.set_result({"file": file_path, "status": status, **payload, "error": error, "seconds": seconds})
+
+    def _dispatch(self):
+        idle = []
+        busy = {}
+        pending = deque()
+        while True:
+            while self.wake_reader.poll():
+                self.wake_reader.recv_bytes()
+            while True:
+                try:
+                    pending.append(self.tasks.get_nowait())
+                except queue.Empty:
+                    break
+            if self.closed and not pending and not busy:
+                break
+
+            while pending and len(busy) < self.max_workers:
+                task = pending.popleft()
+                if not task[0].set_running_or_notify_cancel():
+                    continue
+                worker = idle.pop() if idle else self._spawn()
+                try:
+                    worker[1].send(task[1])
+                except OSError:
+                    # the worker died while idle; the deck goes to a fresh one
+                    self._stop(worker, kill=True)
+                    worker = self._spawn()
+                    worker[1].send(task[1])
+                busy[worker[1]] = (worker, task, time.monotonic())
+            self.telemetry.set("parse_queue_depth", len(pending))
+
+            deadline = min((started + self.timeout for _, _, started in busy.values()), default=None)
+            sentinels = {worker[0].sentinel: conn for conn, (worker, _, _) in busy.items()}
+            ready = wait([self.wake_reader, *busy, *sentinels],
+                         None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+            # a result that arrived just before its worker exited still counts
+            done = {conn for conn in ready if conn in busy}
+            done.update(sentinels[sentinel] for sentinel in ready if sentinel in sentinels)
+            for conn in done:
+                worker, task, started = busy.pop(conn)
+                try:
+                    status, payload = conn.recv()
+                except (EOFError, OSError):
+                    self._stop(worker, kill=True)
+                    self._finish(task, CRASHED, started, error=f"worker exited with code {worker[0].exitcode}")
+                    continue
+                if status == OK:
+                    self._finish(task, OK, started, payload)
+                else:
+                    self._finish(task, status, started, error=payload)
+                if status == MEMORY or not worker[0].is_alive():
+                    self._stop(worker, kill=True)
+                else:
+                    idle.append(worker)
+
+            now = time.monotonic()
+            for conn in [conn for conn, (_, _, started) in busy.items() if now - started >= self.timeout]:
+                worker, task, started = busy.pop(conn)
+                self._stop(worker, kill=True)
+                self._finish(task, TIMEOUT, started, error=f"no result after {self.timeout:g}s")
+
+        for worker in idle:
+            self._stop(worker)
@@ -0,0 +1,132 @@
+"""
+Presentation Jobs
+
+Screens pitch decks through the durable JobQueue: one job per (team, deck) and
+one aggregate job per team that waits for all of the team's decks.
+"""
+
+import os
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from job_queue import JobQueue, DONE
+from evaluate_pitch import PresentationAnalyser, DECK_EXTENSIONS
+from parse_service import ParseService
+from deck_cache import DeckCache
+from review_cache import ReviewCache
+from score_aggregator import ScoreAggregator
+
+PRESENTATION = "presentation"
+PRESENTATION_AGGREGATE = "presentation_aggregate"
+
+
+class PresentationJobs:
+    def __init__(self, queue: JobQueue, analyser: PresentationAnalyser = None):
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue
+        self.analyser = analyser or PresentationAnalyser()
+        self.analyser.compactScores = False
+
+    def handlers(self) -> dict:
+        if self.analyser.reviewCache is None:
+            # a deck job can crash after its API call; only the cache keeps the retry from repeating it
+            raise ValueError("Presentation jobs need a PresentationAnalyser with a review cache")
+        return {PRESENTATION: self.presentation, PRESENTATION_AGGREGATE: self.aggregate}
+
+    @staticmethod
+    def deck_key(team: str, file_path: str) -> str:
+        # a re-uploaded deck gets a new job
+        stat = os.stat(file_path)
+        return f"{team}/{os.path.basename(file_path)}@{stat.st_size}-{stat.st_mtime_ns}"
+
+    def enqueue_teams(self, root_folder):
+        for team in sorted(os.listdir(root_folder)):
+            team_path = os.path.join(root_folder, team)
+            if not os.path.isdir(team_path):
+                continue
+            decks = [
+                (self.deck_key(team, os.path.join(team_path, file)), {"team_path": team_path, "file": file})
+                for file in sorted(os.listdir(team_path)) if file.lower().endswith(DECK_EXTENSIONS)
+            ]
+            keys = [key for key, _ in decks]
+            self.queue.enqueue_many(PRESENTATION, decks, group=team)
+            self.queue.cancel(PRESENTATION, team, keys)
+            generation = hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()[:16]
+            self.queue.enqueue(PRESENTATION_AGGREGATE, f"{team}@{generation}", {"team_path": team_path},
+                               group=team, after=PRESENTATION)
+
+    def presentation(self, job):
+        team_path, file = job["payload"]["team_path"], job["payload"]["file"]
+        output_folder = os.path.join(team_path, "output_data")
+        os.makedirs(output_folder, exist_ok=True)
+        with self.analyser.telemetry.scope(team=os.path.basename(team_path)):
+            # raises on failure so the job is retried; a review that succeeded before a
+            # crash is served from the review cache instead of a second API call
+            self.analyser.evaluatePPT(os.path.join(team_path, file), output_folder, {})
+
+    def aggregate(self, job):
+        team_path = job["payload"]["team_path"]
+        team = os.path.basename(team_path)
+        output_folder = os.path.normpath(os.path.join(team_path, "output_data"))
+        os.makedirs(output_folder, exist_ok=True)
+
+        # every deck of the team has finished, so no other worker appends to its score log
+        previous = self.analyser.aggregators.pop(output_folder, None)
+        if previous is not None:
+            previous.close()
+        aggregator = self.analyser.aggregators[output_folder] = ScoreAggregator(os.path.join(output_folder, "scores.log"))
+
+        current = {
+            key.split("/", 1)[1].rsplit("@", 1)[0]
+            for key, state in self.queue.states(PRESENTATION, team).items() if state == DONE
+        }
+        current &= set(os.listdir(team_path))
+        for item in [item for item in aggregator.items if item not in current]:
+            aggregator.remove(item)
+        self.analyser.finalScores(team_path)
+
+
+def run_worker(queue_path: str, deck_cache_path: str = None,
+               review_cache_path: str = "./presentation_review_cache.sqlite3"):
+    queue = JobQueue(queue_path)
+    deck_cache = DeckCache(deck_cache_path) if deck_cache_path else None
+    review_cache = ReviewCache(review_cache_path)
+    # a deck that hangs the parser fails its job instead of holding the worker's lease forever
+    with ParseService(max_workers=1) as parser:
+        analyser = PresentationAnalyser(parser=parser, deck_cache=deck_cache, review_cache=review_cache)
+        processed = queue.work(PresentationJobs(queue, analyser).handlers())
+    logging.info(f"Worker {os.getpid()} finished after {processed} jobs")
+    if deck_cache is not None:
+        deck_cache.close()
+    review_cache.close()
+    queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen team presentations from a durable job queue.")
+    parser.add_argument("--base-path", default="./team_presentations")
+    parser.add_argument("--queue", default="./presentation_jobs.sqlite3")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--deck-cache", default="./deck_cache.sqlite3", help="Parsed-deck cache; empty to disable")
+    parser.add_argument("--review-cache", default="./presentation_review_cache.sqlite3", help="Review cache shared by the workers")
+    parser.add_argument("--retry-dead", action="store_true")
+    parser.add_argument("--status", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    job_queue = JobQueue(args.queue)
+    if args.status:
+        print(job_queue.counts())
+        for letter in job_queue.dead_letters():
+            print(letter)
+    else:
+        PresentationJobs(job_queue).enqueue_teams(args.base_path)
+        if args.retry_dead:
+            job_queue.retry_dead()
+        workers = [multiprocessing.Process(target=run_worker, args=(args.queue, args.deck_cache, args.review_cache)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    job_queue.close()
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import logging
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, scale: float = 1.0):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, scale: float = 1.0) -> float:
+        # a request larger than the whole bucket would never fit, so let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.refill_per_second * scale)
+
+
+class RateLimiter:
+    """
+    Paces API calls with a requests/minute and a tokens/minute bucket and
+    backs off adaptively (AIMD) when the provider throttles or times out.
+    """
+
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 6000,
+                 min_scale: float = 0.1, recovery_step: float = 0.05, max_backoff: float = 60.0):
+        self.logger = logging.getLogger(__name__)
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.scale = 1.0
+        self.min_scale = min_scale
+        self.recovery_step = recovery_step
+        self.max_backoff = max_backoff
+        self.paused_until = 0.0
+        self.consecutive_throttles = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.requests.refill(self.scale)
+                self.tokens.refill(self.scale)
+                wait = max(self.requests.wait_time(1, self.scale), self.tokens.wait_time(tokens, self.scale))
+                if wait <= 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                    return
+                await asyncio.sleep(wait)
+
+    def on_success(self):
+        self.consecutive_throttles = 0
+        self.scale = min(1.0, self.scale + self.recovery_step)
+
+    def on_throttle(self, retry_after: float = None) -> float:
+        self.consecutive_throttles += 1
+        self.scale = max(self.min_scale, self.scale / 2)
+        backoff = min(self.max_backoff, 2 ** self.consecutive_throttles)
+        if retry_after is not None:
+            backoff = max(backoff, retry_after)
+        self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+        self.logger.warning(f"Throttled by provider, backing off {backoff:.1f}s (rate scale {self.scale:.2f})")
+        return backoff
@@ -0,0 +1,156 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pydantic import BaseModel
+
+
+class ReviewCache:
+    """
+    Persistent, content-addressed cache of validated reviews, of code chunks or decks.
+
+    Entries are keyed by a hash of (content, system prompt, model, response
+    schema) so identical content is never sent to the model twice. The cache is
+    bounded by total stored bytes and evicts least recently used entries first.
+
+    The stored size is tracked as a running total rather than summed on every
+    put; it is recounted every RECOUNT_PUTS puts to pick up entries written by
+    other processes sharing the file. A full cache is evicted down to LOW_WATER
+    of max_bytes, so the puts that follow do not evict again straight away.
+    """
+
+    RECOUNT_PUTS = 256
+    LOW_WATER = 0.9
+
+    def __init__(self, db_path: str = "./review_cache.sqlite3", max_bytes: int = 512 * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                key TEXT PRIMARY KEY,
+                prompt_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS reviews_last_access ON reviews (last_access)")
+        self.conn.commit()
+        self.total = self._stored_bytes()
+        self.puts = 0
+
+    @staticmethod
+    def hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def make_key(self, content: str, prompt: str, model: str, response_model: type[BaseModel]) -> str:
+        schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+        return self.hash("\0".join([self.hash(content), self.hash(prompt), model, self.hash(schema)]))
+
+    def get(self, key: str, response_model: type[BaseModel]):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM reviews WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE reviews SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        try:
+            review = response_model.model_validate_json(row[0])
+        except ValueError:
+            self.logger.warning(f"Dropping cache entry that no longer validates: {key}")
+            self.delete(key)
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return review
+
+    def put(self, key: str, review: BaseModel, prompt: str, model: str):
+        value = review.model_dump_json()
+        with self.lock:
+            replaced = self._size(key)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reviews (key, prompt_hash, model, value, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.hash(prompt), model, value, len(value), time.time()),
+            )
+            self.conn.commit()
+            self.total += len(value) - replaced
+            self.puts += 1
+            if self.puts % self.RECOUNT_PUTS == 0:
+                self.total = self._stored_bytes()
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        with self.lock:
+            size = self._size(key)
+            self.conn.execute("DELETE FROM reviews WHERE key = ?", (key,))
+            self.conn.commit()
+            self.total -= size
+
+    def _size(self, key: str) -> int:
+        row = self.conn.execute("SELECT size FROM reviews WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _stored_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM reviews").fetchone()[0]
+
+    def invalidate(self, prompt: str = None, keep_current: bool = False) -> int:
+        """
+        Drop cached reviews.
+
+        Args:
+            prompt (str): If given, only entries produced with this prompt are dropped,
+                or, with keep_current=True, every entry produced with any other prompt.
+            keep_current (bool): Invert the prompt filter to prune stale prompts.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self.lock:
+            if prompt is None:
+                cursor = self.conn.execute("DELETE FROM reviews")
+            elif keep_current:
+                cursor = self.conn.execute("DELETE FROM reviews WHERE prompt_hash != ?", (self.hash(prompt),))
+            else:
+                cursor = self.conn.execute("DELETE FROM reviews WHERE prompt_hash = ?", (self.hash(prompt),))
+            self.conn.commit()
+            self.total = self._stored_bytes()
+            return cursor.rowcount
+
+    def _evict(self):
+        target = self.max_bytes * self.LOW_WATER
+        evicted = []
+        # oldest first, read only as far as needed to get under the low-water mark
+        for key, size in self.conn.execute("SELECT key, size FROM reviews ORDER BY last_access ASC"):
+            if self.total <= target:
+                break
+            evicted.append((key,))
+            self.total -= size
+        self.conn.executemany("DELETE FROM reviews WHERE key = ?", evicted)
+        self.conn.commit()
+        self.logger.info(f"Evicted {len(evicted)} cached reviews to stay under {self.max_bytes} bytes")
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,166 @@
+"""
+Score Aggregator Module
+
+Incrementally aggregates per-category review scores for one repo or team, so a
+summary is always available without re-reading every review output.
+"""
+
+import os
+import json
+import math
+import logging
+from collections import defaultdict
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreAggregator:
+    """
+    Running, optionally weighted, per-category score sums, plus the sums of
+    squares needed for a confidence interval on each category's mean.
+
+    Every update is appended to a JSON-lines log next to the outputs, so a crashed
+    or partial run can be summarised instantly by replaying it. Re-adding an item
+    replaces its earlier contribution and removed items stop counting.
+    """
+
+    def __init__(self, state_path: str, compact: bool = True):
+        """
+        Args:
+            compact (bool): Rewrite the log with one line per item after replaying it.
+                Pass False while other processes may be appending to the same log.
+        """
+        self.state_path = state_path
+        self.compact = compact
+        self.items = {}
+        self.sums = defaultdict(float)
+        self.weights = defaultdict(float)
+        self.squares = defaultdict(float)
+        self.weight_squares = defaultdict(float)
+        if os.path.exists(state_path):
+            self._replay()
+        self.log = open(state_path, "a", encoding="utf-8")
+
+    def _replay(self):
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a run killed mid-write leaves a truncated last line
+                    continue
+                if record.get("removed"):
+                    self._remove(record["item"])
+                else:
+                    self._add(record["item"], record["scores"], record["weight"])
+        if not self.compact:
+            return
+        # rewrite the log with one line per live item, next to it and swapped in whole,
+        # so a run killed mid-rewrite still leaves the full log behind
+        compacted = self.state_path + ".tmp"
+        with open(compacted, "w", encoding="utf-8") as f:
+            for item, (scores, weight) in self.items.items():
+                f.write(json.dumps({"item": item, "scores": scores, "weight": weight}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(compacted, self.state_path)
+
+    @staticmethod
+    def extract_scores(review) -> dict:
+        data = review.model_dump() if isinstance(review, BaseModel) else review
+        return {key: value["score"] for key, value in data.items() if isinstance(value, dict) and "score" in value}
+
+    def _add(self, item: str, scores: dict, weight: float):
+        self._remove(item)
+        self.items[item] = (scores, weight)
+        for category, score in scores.items():
+            self.sums[category] += score * weight
+            self.weights[category] += weight
+            self.squares[category] += score * score * weight
+            self.weight_squares[category] += weight * weight
+
+    def _remove(self, item: str):
+        previous = self.items.pop(item, None)
+        if previous is None:
+            return
+        scores, weight = previous
+        for category, score in scores.items():
+            self.sums[category] -= score * weight
+            self.weights[category] -= weight
+            self.squares[category] -= score * score * weight
+            self.weight_squares[category] -= weight * weight
+
+    def add(self, item: str, review, weight: float = 1.0):
+        scores = self.extract_scores(review)
+        self._add(item, scores, weight)
+        self.log.write(json.dumps({"item": item, "scores": scores, "weight": weight}) + "\n")
+        self.log.flush()
+
+    def remove(self, item: str):
+        if item in self.items:
+            self._remove(item)
+            self.log.write(json.dumps({"item": item, "removed": True}) + "\n")
+            self.log.flush()
+
+    def __contains__(self, item: str):
+        return item in self.items
+
+    def interval(self, category: str, z: float = 1.96, population: int = None):
+        """
+        Half-width of the confidence interval on a category's weighted mean, or None
+        with fewer than two (effective) samples. population is the total number of
+        items the scored ones were drawn from, for the finite population correction.
+        """
+        weight = self.weights[category]
+        weight_squares = self.weight_squares[category]
+        if weight <= 0 or weight_squares <= 0:
+            return None
+        effective = weight * weight / weight_squares
+        if effective < 1.5:
+            return None
+        mean = self.sums[category] / weight
+        variance = max(0.0, self.squares[category] / weight - mean * mean) * effective / (effective - 1)
+        standard_error = variance / effective
+        if population is not None and population > 1:
+            standard_error *= max(0.0, (population - len(self.items)) / (population - 1))
+        return z * math.sqrt(standard_error)
+
+    def intervals(self, z: float = 1.96, population: int = None) -> dict:
+        return {category: self.interval(category, z, population) for category in self.sums if self.weights[category] > 0}
+
+    def summary(self, ndigits: int = None, population: int = None, fixed_scores: dict = None) -> dict:
+        """
+        Args:
+            fixed_scores (dict): Category scores measured for the whole item set
+                rather than per item (e.g. by static analysis); they replace the
+                aggregated score of the same category and carry no uncertainty.
+        """
+        def rounded(value):
+            return value if value is None or ndigits is None else round(value, ndigits)
+
+        fixed_scores = fixed_scores or {}
+        return {
+            "scores_by_category": {
+                **{
+                    category: rounded(self.sums[category] / self.weights[category])
+                    for category in self.sums if self.weights[category] > 0
+                },
+                **{category: rounded(score) for category, score in fixed_scores.items()},
+            },
+            # 95% confidence half-widths, e.g. a score of 6.2 with 0.4 means 5.8 to 6.6
+            "uncertainty_by_category": {
+                **{category: rounded(width) for category, width in self.intervals(population=population).items()},
+                **{category: 0.0 for category in fixed_scores},
+            },
+            "items": len(self.items),
+            "total_weight": sum(weight for _, weight in self.items.values()),
+        }
+
+    def write_summary(self, output_file: str, population: int = None, fixed_scores: dict = None, **extra):
+        with open(output_file, "w") as f:
+            json.dump({**self.summary(population=population, fixed_scores=fixed_scores), **extra}, f, indent=2)
+        logger.info(f"Scores summary saved to: {output_file}")
+
+    def close(self):
+        self.log.close()
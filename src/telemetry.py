@@ -0,0 +1,248 @@
+"""
+Telemetry Module
+
+In-process counters, gauges and histograms for the evaluation pipeline: stage
+wall times, queue depths, LLM request latencies, token usage and estimated
+cost. Metrics can be exported as Prometheus text or as a JSON run report.
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+logger = logging.getLogger(__name__)
+
+# seconds; covers sub-millisecond tree-sitter splits up to multi-minute clones
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# labels (e.g. repo or team) attached to usage and stage totals recorded in the current context
+_scope = contextvars.ContextVar("telemetry_scope", default={})
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Telemetry:
+    """
+    Thread-safe metric registry.
+
+    Updates are a lock and a dict lookup, cheap enough to leave on for every
+    request and chunk. Series are keyed by metric name and sorted label pairs.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, pricing: dict = None):
+        self.buckets = tuple(buckets)
+        self.pricing = config.LLM_PRICING if pricing is None else pricing
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+        self.server = None
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def add(self, name: str, delta: float, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def scope(self, **labels):
+        """Attach labels (e.g. repo=..., team=...) to usage and stage totals recorded inside."""
+        token = _scope.set({**_scope.get(), **labels})
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Time a pipeline stage into a histogram, and into per-repo/team totals when scoped."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe("stage_duration_seconds", elapsed, stage=stage)
+            self.inc("stage_seconds_total", elapsed, stage=stage, **_scope.get())
+
+    @contextmanager
+    def inflight(self, name: str, **labels):
+        """Count work in progress in a gauge, e.g. requests waiting on the provider."""
+        self.add(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.add(name, -1, **labels)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        input_price, output_price = self.pricing.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    def record_request(self, model: str, seconds: float, status: str = "ok", usage=None):
+        """Record one LLM request; usage is the provider's usage object, if any."""
+        self.observe("llm_request_duration_seconds", seconds, model=model, status=status)
+        self.inc("llm_requests_total", model=model, status=status)
+        if usage is None:
+            return
+        labels = _scope.get()
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        self.inc("llm_prompt_tokens_total", prompt_tokens, model=model, **labels)
+        self.inc("llm_completion_tokens_total", completion_tokens, model=model, **labels)
+        self.inc("llm_cost_usd_total", self.cost(model, prompt_tokens, completion_tokens), model=model, **labels)
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                declared = set()
+                for (name, labels), value in sorted(series.items()):
+                    if name not in declared:
+                        lines.append(f"# TYPE {name} {kind}")
+                        declared.add(name)
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+            declared = set()
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} histogram")
+                    declared.add(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> dict:
+        def series(items, render):
+            result = {}
+            for (name, labels), value in sorted(items, key=lambda item: item[0]):
+                result.setdefault(name, []).append({"labels": dict(labels), **render(value)})
+            return result
+
+        with self.lock:
+            return {
+                "started": self.started,
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "counters": series(self.counters.items(), lambda value: {"value": value}),
+                "gauges": series(self.gauges.items(), lambda value: {"value": value}),
+                "histograms": series(self.histograms.items(), lambda h: {
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                }),
+            }
+
+    def write_report(self, output_file: str):
+        with open(output_file, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+        logger.info(f"Run report saved to: {output_file}")
+
+    def write_prometheus(self, output_file: str):
+        """Write a node_exporter textfile-collector compatible snapshot."""
+        with open(output_file + ".tmp", "w") as f:
+            f.write(self.to_prometheus())
+        # rename so the collector never reads a half-written file
+        os.replace(output_file + ".tmp", output_file)
+
+    def serve(self, port: int, host: str = "0.0.0.0"):
+        """Expose /metrics over HTTP from a daemon thread for Prometheus to scrape."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = telemetry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+
+_shared_telemetry = None
+_shared_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """Return the process-wide Telemetry registry, creating it on first use."""
+    global _shared_telemetry
+    with _shared_lock:
+        if _shared_telemetry is None:
+            _shared_telemetry = Telemetry()
+        return _shared_telemetry
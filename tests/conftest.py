@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT / "src", ROOT / "src" / "code_review", ROOT / "src" / "presentation_screening"):
+    sys.path.insert(0, str(path))
@@ -0,0 +1,31 @@
+from chunk_store import ChunkStore, ChunkStoreWriter
+
+
+def write(folder, chunks):
+    with ChunkStoreWriter(folder, staging=True) as writer:
+        for chunk_id, text in chunks:
+            writer.append(chunk_id, text, f"{chunk_id}.py", "python", 1, 1)
+
+
+def test_find_reads_a_known_entry_without_parsing_the_index(tmp_path):
+    write(tmp_path, [(0, "a = 1\n"), (1, "b = 2\n")])
+    with ChunkStore(tmp_path) as store:
+        entry, version = store.entries[1], store.version
+    with ChunkStore(tmp_path) as store:
+        assert store.find(1, entry, version) == entry
+        assert store._entries is None
+        assert store.read(entry) == "b = 2\n"
+
+
+def test_find_looks_the_chunk_up_again_after_a_rechunk(tmp_path):
+    write(tmp_path, [(0, "a = 1\n"), (1, "b = 2\n")])
+    with ChunkStore(tmp_path) as store:
+        entry, version = store.entries[1], store.version
+    # chunk 0 grew, so chunk 1 moved
+    write(tmp_path, [(0, "a = 10\n"), (1, "b = 2\n")])
+    with ChunkStore(tmp_path) as store:
+        assert store.version != version
+        found = store.find(1, entry, version)
+        assert found["offset"] != entry["offset"]
+        assert store.read(found) == "b = 2\n"
+        assert store.find(2, entry, version) is None
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("pptx")
+pytest.importorskip("llm_client")
+from evaluate_pitch import PresentationAnalyser
+from parse_service import ParseFailed, ERROR
+from review_cache import ReviewCache
+from test_parse_service import make_deck
+
+
+class NoLLM:
+    def create(self, **kwargs):
+        raise AssertionError("an unreadable deck must not be sent to the model")
+
+
+@pytest.fixture
+def analyser(tmp_path):
+    cache = ReviewCache(str(tmp_path / "reviews.sqlite3"))
+    yield PresentationAnalyser(llm=NoLLM(), review_cache=cache)
+    cache.close()
+
+
+def test_a_corrupt_deck_is_not_reviewed(analyser, tmp_path):
+    deck = tmp_path / "broken.pptx"
+    deck.write_bytes(b"not a zip file")
+    with pytest.raises(ParseFailed) as failed:
+        analyser.getOutput(str(deck))
+    assert failed.value.result["status"] == ERROR
+    assert analyser.reviewCache.stats()["entries"] == 0
+
+
+def test_a_deck_without_text_is_not_reviewed(analyser, tmp_path):
+    deck = make_deck(tmp_path / "empty.pptx", "", " ")
+    with pytest.raises(ParseFailed) as failed:
+        analyser.getOutput(deck)
+    assert failed.value.result["error"] == "no text to review"
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("pptx")
+pytest.importorskip("requests")
+pypdf = pytest.importorskip("pypdf")
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+from file_parser import iter_images, parse_deck
+
+
+def image(writer, width, rgb, flate=False):
+    stream = DecodedStreamObject()
+    stream.set_data(bytes(rgb) * (width * width))
+    stream.update({
+        NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(width), NameObject("/Height"): NumberObject(width),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"), NameObject("/BitsPerComponent"): NumberObject(8),
+    })
+    return writer._add_object(stream.flate_encode() if flate else stream)
+
+
+def make_pdf(path):
+    """Two pages, each with the same logo, an image inside a form and an inline image."""
+    writer = PdfWriter()
+    logo = image(writer, 4, (255, 0, 0), flate=True)
+    for number in range(2):
+        page = writer.add_blank_page(100, 100)
+        form = DecodedStreamObject()
+        form.set_data(b"q 5 0 0 5 0 0 cm /Im1 Do Q")
+        form.update({
+            NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(10), NumberObject(10)]),
+            NameObject("/Resources"): DictionaryObject({NameObject("/XObject"): DictionaryObject({
+                NameObject("/Im1"): image(writer, 3, (0, number * 100, 255)),
+            })}),
+        })
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): DictionaryObject({
+            NameObject("/Im0"): logo, NameObject("/Fm0"): writer._add_object(form),
+        })})
+        content = DecodedStreamObject()
+        content.set_data(b"q 10 0 0 10 0 0 cm /Im0 Do Q q /Fm0 Do Q q 10 0 0 10 50 50 cm "
+                         b"BI /W 2 /H 2 /BPC 8 /CS /RGB ID " + bytes((0, 255, number)) * 4 + b" EI Q")
+        page[NameObject("/Contents")] = writer._add_object(content)
+    writer.write(path)
+    return str(path)
+
+
+def test_pdf_images_match_page_images_apart_from_duplicates(tmp_path):
+    deck = make_pdf(tmp_path / "deck.pdf")
+    expected = list(dict.fromkeys(image.data for page in PdfReader(deck).pages for image in page.images))
+    images = [data for _, data in iter_images(deck, pdf=True)]
+    # the logo once, both form images and both inline images
+    assert len(images) == 5
+    assert sorted(images) == sorted(expected)
+    assert len(parse_deck(deck)["image_hashes"]) == 5
@@ -0,0 +1,140 @@
+import pytest
+from job_queue import JobQueue, PENDING, LEASED, DONE, DEAD, CANCELLED
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=3, backoff_base=0)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue("review", "a")
+    assert not queue.enqueue("review", "a")
+    assert queue.counts() == {"review": {PENDING: 1}}
+
+
+def test_expired_lease_goes_to_another_worker(queue):
+    queue.enqueue("review", "a")
+    first = queue.lease(["review"], "one", lease_seconds=-1)
+    second = queue.lease(["review"], "two")
+    assert second["id"] == first["id"]
+    assert second["attempts"] == 2
+    # the first worker finishing late must not mark the job done for the second one
+    assert not queue.complete(first, "one")
+    assert queue.state("review", "a") == LEASED
+    assert queue.complete(second, "two")
+    assert queue.state("review", "a") == DONE
+
+
+def test_expired_lease_past_max_attempts_is_a_dead_letter(queue):
+    queue.enqueue("review", "a")
+    for _ in range(3):
+        assert queue.lease(["review"], "worker", lease_seconds=-1) is not None
+    assert queue.lease(["review"], "worker") is None
+    [letter] = queue.dead_letters()
+    assert letter["key"] == "a"
+    assert letter["error"] == "lease expired"
+
+
+def test_failed_job_is_retried_then_dead_lettered(queue):
+    queue.enqueue("review", "a")
+    for attempt in range(1, 4):
+        job = queue.lease(["review"], "worker")
+        assert job["attempts"] == attempt
+        state = queue.fail(job, "worker", "boom")
+    assert state == DEAD
+    assert queue.lease(["review"], "worker") is None
+    assert queue.dead_letters("review")[0]["error"] == "boom"
+
+    assert queue.retry_dead() == 1
+    assert queue.lease(["review"], "worker")["attempts"] == 1
+
+
+def test_failing_after_the_lease_was_lost_changes_nothing(queue):
+    queue.enqueue("review", "a")
+    first = queue.lease(["review"], "one", lease_seconds=-1)
+    second = queue.lease(["review"], "two")
+    assert queue.fail(first, "one", "boom") is None
+    assert queue.state("review", "a") == LEASED
+    assert queue.complete(second, "two")
+
+
+def test_cancel_leaves_leased_jobs_running(queue):
+    queue.enqueue("review", "a", group="team")
+    queue.enqueue("review", "b", group="team")
+    queue.enqueue("review", "c", group="team")
+    leased = queue.lease(["review"], "worker")
+    assert queue.cancel("review", "team", keep_keys=["c"]) == 1
+    assert queue.states("review", "team") == {"a": LEASED, "b": CANCELLED, "c": PENDING}
+    assert queue.complete(leased, "worker")
+
+
+def test_enqueue_revives_a_cancelled_job(queue):
+    queue.enqueue("review", "a", {"n": 1}, group="team")
+    queue.cancel("review", "team")
+    assert queue.enqueue("review", "a", {"n": 2}, group="team")
+    job = queue.lease(["review"], "worker")
+    assert job["payload"] == {"n": 2}
+    assert job["attempts"] == 1
+
+
+def test_after_waits_for_the_group(queue):
+    queue.enqueue("review", "a", group="team")
+    queue.enqueue("aggregate", "team", group="team", after="review")
+    queue.enqueue("aggregate", "other", group="other", after="review")
+    assert queue.lease(["aggregate"], "worker")["key"] == "other"
+    assert queue.lease(["aggregate"], "worker") is None
+
+    review = queue.lease(["review"], "worker")
+    assert queue.lease(["aggregate"], "worker") is None
+    queue.complete(review, "worker")
+    assert queue.lease(["aggregate"], "worker")["key"] == "team"
+
+
+def test_after_own_kind_runs_one_job_per_group_at_a_time(queue):
+    queue.enqueue("chunk", "repo@1", group="repo", after="chunk")
+    running = queue.lease(["chunk"], "one")
+    queue.enqueue("chunk", "repo@2", group="repo", after="chunk")
+    queue.enqueue("chunk", "other@1", group="other", after="chunk")
+    assert queue.lease(["chunk"], "two")["key"] == "other@1"
+    assert queue.lease(["chunk"], "two") is None
+    queue.complete(running, "one")
+    assert queue.lease(["chunk"], "two")["key"] == "repo@2"
+
+
+def test_work_renews_the_lease_of_a_long_job(queue):
+    queue.enqueue("chunk", "a")
+    lost = []
+
+    def handler(job):
+        # outlives its lease several times over
+        assert not job["lease_lost"].wait(0.5)
+        lost.append(job["lease_lost"].is_set())
+        assert queue.lease(["chunk"], "other") is None
+
+    assert queue.work({"chunk": handler}, owner="worker", lease_seconds=0.15) == 1
+    assert lost == [False]
+    assert queue.state("chunk", "a") == DONE
+
+
+def test_work_flags_a_lost_lease(queue, tmp_path, monkeypatch):
+    queue.enqueue("chunk", "a")
+    other = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    lost, completed = [], []
+    complete = queue.complete
+    monkeypatch.setattr(queue, "complete", lambda job, owner: completed.append(complete(job, owner)))
+
+    def handler(job):
+        # the worker stalls past its lease and a second worker takes the job over and finishes it
+        other.conn.execute("UPDATE jobs SET lease_expires = 0 WHERE id = ?", (job["id"],))
+        taken = other.lease(["chunk"], "other")
+        lost.append(job["lease_lost"].wait(2))
+        assert other.complete(taken, "other")
+
+    assert queue.work({"chunk": handler}, owner="worker", lease_seconds=0.15) == 1
+    assert lost == [True]
+    assert completed == [False]
+    assert queue.state("chunk", "a") == DONE
+    other.close()
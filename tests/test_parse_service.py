@@ -0,0 +1,68 @@
+import os
+import pytest
+from io import BytesIO
+
+pytest.importorskip("pptx")
+pytest.importorskip("pypdf")
+from pptx import Presentation
+from pptx.util import Inches
+from PIL import Image
+from parse_service import ParseService, OK, TIMEOUT, MEMORY, CRASHED
+
+
+def make_deck(path, *texts, image_size=None):
+    prs = Presentation()
+    for text in texts:
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        slide.shapes.add_textbox(Inches(1), Inches(1), Inches(4), Inches(1)).text = text
+    if image_size:
+        # noise does not compress, so the picture takes image_size^2 * 3 bytes to hold
+        image = BytesIO()
+        Image.frombytes("RGB", (image_size, image_size), os.urandom(image_size * image_size * 3)).save(image, "PNG")
+        image.seek(0)
+        prs.slides[0].shapes.add_picture(image, Inches(1), Inches(2))
+    prs.save(path)
+    return str(path)
+
+
+def test_parses_a_deck(tmp_path):
+    deck = make_deck(tmp_path / "deck.pptx", "hello", "world")
+    with ParseService(max_workers=1, timeout=30, max_memory=0) as service:
+        result = service.parse(deck)
+    assert result["status"] == OK
+    assert result["text"] == ["hello", "world"]
+    assert result["image_hashes"] == []
+    assert result["error"] is None
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs a FIFO to block on")
+def test_a_deck_that_never_finishes_times_out(tmp_path):
+    # opening a FIFO blocks until something writes to it, which nothing does
+    stuck = tmp_path / "stuck.pptx"
+    os.mkfifo(stuck)
+    deck = make_deck(tmp_path / "deck.pptx", "after")
+    with ParseService(max_workers=1, timeout=3, max_memory=0) as service:
+        results = dict(service.parse_many([str(stuck), deck]))
+    assert results[str(stuck)]["status"] == TIMEOUT
+    assert results[str(stuck)]["text"] is None
+    # the killed worker is replaced and the next deck still parses
+    assert results[deck]["status"] == OK
+    assert results[deck]["text"] == ["after"]
+
+
+def test_a_deck_over_the_memory_cap_fails_without_taking_the_service_down(tmp_path):
+    deck = make_deck(tmp_path / "deck.pptx", "hello", image_size=2000)
+    with ParseService(max_workers=1, timeout=30, max_memory=1) as service:
+        result = service.parse(deck, images=True)
+    assert result["status"] in (MEMORY, CRASHED)
+    assert result["text"] is None
+
+    with ParseService(max_workers=1, timeout=30, max_memory=0) as service:
+        assert service.parse(deck)["status"] == OK
+
+
+def test_submit_after_close_is_refused(tmp_path):
+    service = ParseService(max_workers=1, timeout=30, max_memory=0)
+    service.close()
+    with pytest.raises(RuntimeError):
+        service.submit(str(tmp_path / "deck.pptx"))
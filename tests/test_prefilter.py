@@ -0,0 +1,85 @@
+import pytest
+
+pygit2 = pytest.importorskip("pygit2")
+from prefilter import Prefilter, IgnoreRules
+
+FILES = {
+    ".gitignore": "*.log\n/secrets.py\ngenerated_src/\n!keep.log\ndocs/**/*.py\n",
+    "app.py": "print('app')\n",
+    "debug.log": "log\n",
+    "keep.log": "kept\n",
+    "secrets.py": "KEY = 1\n",
+    "lib/secrets.py": "KEY = 2\n",
+    "generated_src/models.py": "x = 1\n",
+    "docs/a/b/example.py": "x = 2\n",
+    "docs/readme.py": "x = 3\n",
+    "web/.gitignore": "*.js\n!main.js\n",
+    "web/main.js": "main()\n",
+    "web/util.js": "util()\n",
+    "web/big.py": "x = 1\n" * 1000,
+}
+
+
+@pytest.fixture
+def repos(tmp_path):
+    worktree = tmp_path / "worktree"
+    repo = pygit2.init_repository(str(worktree))
+    for name, text in FILES.items():
+        (worktree / name).parent.mkdir(parents=True, exist_ok=True)
+        (worktree / name).write_text(text)
+    # committed despite the .gitignore, as teams do; the prefilter still skips them
+    for name in FILES:
+        repo.index.add(name)
+    repo.index.write()
+    signature = pygit2.Signature("test", "test@example.com")
+    repo.create_commit("HEAD", signature, signature, "init", repo.index.write_tree(), [])
+    bare = pygit2.clone_repository(str(worktree), str(tmp_path / "bare"), bare=True)
+    return worktree, tmp_path / "bare", bare
+
+
+def relative(kept, root):
+    return sorted(path.relative_to(root).as_posix() for path, _ in kept)
+
+
+def test_bare_clone_honours_gitignore_like_the_worktree(repos):
+    worktree, bare_path, _ = repos
+    prefilter = Prefilter(max_file_bytes=1024)
+    worktree_kept, worktree_report = prefilter.scan(worktree)
+    bare_kept, bare_report = prefilter.scan(bare_path)
+    assert relative(bare_kept, bare_path) == relative(worktree_kept, worktree) == [
+        ".gitignore", "app.py", "keep.log", "lib/secrets.py", "web/.gitignore", "web/main.js",
+    ]
+    assert sorted(bare_report["skipped_paths"]["gitignored"]) == sorted(worktree_report["skipped_paths"]["gitignored"]) == [
+        "debug.log", "docs/a/b/example.py", "docs/readme.py", "generated_src/", "secrets.py", "web/util.js",
+    ]
+    assert bare_report["skipped_paths"]["too_large"] == ["web/big.py"]
+
+
+def test_check_path_reads_gitignore_along_the_path(repos):
+    _, bare_path, bare = repos
+    prefilter = Prefilter()
+    blobs = {path: entry.id for path, entry in walk(bare, bare.head.peel(pygit2.Commit).tree)}
+    assert prefilter.check_path(bare_path, "web/util.js", bare, blobs["web/util.js"]) == "gitignored"
+    assert prefilter.check_path(bare_path, "web/main.js", bare, blobs["web/main.js"]) is None
+    assert prefilter.check_path(bare_path, "generated_src/models.py", bare, blobs["generated_src/models.py"]) == "gitignored"
+
+
+def walk(repo, tree, prefix=""):
+    for entry in tree:
+        if entry.type_str == "tree":
+            yield from walk(repo, repo[entry.id], f"{prefix}{entry.name}/")
+        else:
+            yield f"{prefix}{entry.name}", entry
+
+
+def test_ignore_rules_patterns():
+    rules = IgnoreRules().extend("", "build/\n**/tmp\n/*.txt\n\\#notes\nsrc/**/gen_*.py\n")
+    assert rules.ignored("build/")
+    assert not rules.ignored("build")
+    assert rules.ignored("a/b/tmp")
+    assert rules.ignored("notes.txt")
+    assert not rules.ignored("sub/notes.txt")
+    assert rules.ignored("#notes")
+    assert rules.ignored("src/gen_a.py")
+    assert rules.ignored("src/x/y/gen_a.py")
+    assert not rules.ignored("lib/gen_a.py")
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_throttle_halves_the_rate_and_backs_off_exponentially(clock):
+    limiter = RateLimiter(min_scale=0.1, max_backoff=10)
+    assert limiter.on_throttle() == 2
+    assert limiter.scale == 0.5
+    assert limiter.paused_until == clock.now + 2
+    assert limiter.on_throttle() == 4
+    assert limiter.scale == 0.25
+    for _ in range(5):
+        backoff = limiter.on_throttle()
+    assert backoff == 10
+    assert limiter.scale == 0.1
+    assert limiter.consecutive_throttles == 7
+
+
+def test_throttle_honours_a_longer_retry_after(clock):
+    limiter = RateLimiter()
+    assert limiter.on_throttle(retry_after=30) == 30
+    assert limiter.paused_until == clock.now + 30
+    # a shorter Retry-After never brings the pause forward
+    assert limiter.on_throttle(retry_after=1) == 4
+    assert limiter.paused_until == clock.now + 30
+
+
+def test_success_recovers_the_rate_step_by_step(clock):
+    limiter = RateLimiter(recovery_step=0.25)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.scale == 0.25
+    limiter.on_success()
+    assert limiter.consecutive_throttles == 0
+    assert limiter.scale == 0.5
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.scale == 1.0
+    # the backoff starts over after a success
+    assert limiter.on_throttle() == 2
+
+
+def test_acquire_waits_out_a_pause(clock, monkeypatch):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", sleep)
+    limiter.on_throttle(retry_after=5)
+    asyncio.run(limiter.acquire(100))
+    assert slept == [5]
+    assert limiter.requests.tokens == 59
+
+
+def test_acquire_paces_to_the_reduced_rate(clock, monkeypatch):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    limiter.requests.tokens = 0
+    limiter.scale = 0.5
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", sleep)
+    asyncio.run(limiter.acquire(10))
+    # one request per second at full rate, one per two seconds at half
+    assert slept == [2]
+
+
+def test_retry_after_is_read_from_the_response():
+    llm_client = pytest.importorskip("llm_client")
+
+    class Response:
+        def __init__(self, headers):
+            self.headers = headers
+
+    class Throttled(Exception):
+        status_code = 429
+
+        def __init__(self, headers):
+            super().__init__("rate limited")
+            self.response = Response(headers)
+
+    assert llm_client.LLMClient.retry_after(Throttled({"retry-after": "7"})) == 7.0
+    assert llm_client.LLMClient.retry_after(Throttled({})) is None
+    assert llm_client.LLMClient.retry_after(ValueError()) is None
+    assert llm_client.LLMClient.is_throttle_error(Throttled({}))
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pydantic")
+from pydantic import BaseModel
+from review_cache import ReviewCache
+
+
+class Review(BaseModel):
+    text: str
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ReviewCache(str(tmp_path / "reviews.sqlite3"), max_bytes=1000)
+    yield cache
+    cache.close()
+
+
+def test_running_total_matches_the_stored_bytes(cache):
+    cache.put("a", Review(text="a" * 50), "prompt", "model")
+    cache.put("b", Review(text="b" * 50), "prompt", "model")
+    cache.put("a", Review(text="a" * 10), "prompt", "model")
+    cache.delete("b")
+    assert cache.total == cache.stats()["bytes"] == len(Review(text="a" * 10).model_dump_json())
+
+
+def test_a_full_cache_evicts_the_least_recently_used_down_to_the_low_water_mark(cache):
+    for i in range(10):
+        cache.put(f"k{i}", Review(text="x" * 90), "prompt", "model")
+    # every entry is 101 bytes, so the tenth put goes over 1000 bytes and two entries make room
+    assert cache.get("k0", Review) is None
+    assert cache.get("k1", Review) is None
+    assert cache.get("k2", Review) is not None
+    assert cache.total == cache.stats()["bytes"] == 808
@@ -0,0 +1,81 @@
+import json
+import asyncio
+import sqlite3
+import pytest
+from data_ingestion.storage_service import StorageService
+
+
+def submission(team, **extra):
+    return {"team_name": team, "github_url": f"https://github.com/{team}/app", **extra}
+
+
+def stored(path):
+    conn = sqlite3.connect(path)
+    rows = {row[0]: json.loads(row[1]) for row in conn.execute("SELECT id, data FROM submissions")}
+    conn.close()
+    return rows
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    service = StorageService(str(tmp_path / "submissions.sqlite3"), batch_size=4, flush_interval=0.05)
+    batches = service.batches = []
+    write = service.backend.write
+
+    async def record(rows):
+        batches.append(len(rows))
+        await write(rows)
+
+    monkeypatch.setattr(service.backend, "write", record)
+    return service
+
+
+def test_concurrent_stores_are_written_in_batches(service):
+    async def run():
+        async with service:
+            await asyncio.gather(*(service.store(submission(f"team{i}")) for i in range(10)))
+
+    asyncio.run(run())
+    assert service.batches == [4, 4, 2]
+    assert len(stored(service.dsn)) == 10
+
+
+def test_storing_a_team_again_replaces_its_submission(service):
+    async def run():
+        async with service:
+            await service.store(submission("team", round=1))
+            await service.store(submission("team", round=2))
+
+    asyncio.run(run())
+    assert stored(service.dsn) == {"team": {**submission("team", round=2), "presentation_file": {}}}
+
+
+def test_close_writes_the_queued_submissions(service):
+    async def run():
+        await service.open()
+        stores = [asyncio.create_task(service.store(submission(f"team{i}"))) for i in range(6)]
+        # let every store reach the queue, then shut down before the flush interval is up
+        await asyncio.sleep(0)
+        await service.close()
+        return await asyncio.gather(*stores)
+
+    asyncio.run(run())
+    assert sum(service.batches) == 6
+    assert len(stored(service.dsn)) == 6
+
+
+def test_a_failed_batch_only_fails_the_offending_submission(service):
+    async def run():
+        async with service:
+            return await asyncio.gather(
+                service.store(submission("good")),
+                service.store({"team_name": "bad", "github_url": None}),
+                service.store(submission("also good")),
+                return_exceptions=True,
+            )
+
+    good, bad, also_good = asyncio.run(run())
+    assert good is None and also_good is None
+    assert isinstance(bad, sqlite3.IntegrityError)
+    assert service.batches == [3, 1, 1, 1]
+    assert set(stored(service.dsn)) == {"good", "also good"}